@@ -1,16 +1,72 @@
+import time
+# First, so the import stage of the start-up timings covers the imports below
+from app import startup
 from flask import Flask
 from app.models import db, bcrypt
 from flask_cors import CORS
 from app.config import Config
 
 def create_app(test_config=None):
+    startup.record_import()
+    started = time.perf_counter()
     app = Flask(__name__, static_folder='../docs', static_url_path='/static')
     if test_config:
         app.config.from_mapping(test_config)
     else:
         app.config.from_object(Config)
+    # Before init_routing, whose request hook routes reads by the token's subject
+    from app.auth import init_auth
+    init_auth(app)
+
+    # Read replicas and shards become binds of db, so this comes before db.init_app
+    from app.routing import init_routing
+    init_routing(app, db)
     db.init_app(app)
+    with app.app_context():
+        from app.database import configure_engine
+        for engine in db.engines.values():
+            configure_engine(app, engine)
     bcrypt.init_app(app)
-    CORS(app, origins=["http://localhost:5173", "https://deployment.com"], supports_credentials=True) 
+
+    from app.passwords import init_passwords
+    init_passwords(app)
+
+    CORS(app, origins=["http://localhost:5173", "https://deployment.com"], supports_credentials=True,
+         expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed"])
+
+    # After init_auth: keys are scoped to the authenticated user
+    from app.api.idempotency import init_idempotency
+    init_idempotency(app)
+
+    from app.api.coalescing import init_coalescing
+    init_coalescing(app)
+
+    from app.api.cache import init_cache
+    init_cache(app)
+
+    from app.api.sync import init_sync
+    init_sync(app)
+
+    from app.api.events import init_events
+    init_events(app)
+
+    from app.api.activity import init_activity
+    init_activity(app)
+
+    from app.api.resources import api
+    api.init_app(app)
+
+    from app.metrics import init_metrics
+    with app.app_context():
+        init_metrics(app, *db.engines.values())
+
+    from app.commands import register_commands
+    register_commands(app)
+
+    # The outbox workers and reminder scheduler are started by the serving entry points,
+    # after the schema check (see app/startup.py)
+    startup.record_stage('create_app', started)
+    if app.config.get('WARM_UP', False):
+        startup.warm_up(app)
 
     return app
\ No newline at end of file
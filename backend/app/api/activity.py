@@ -0,0 +1,205 @@
+"""
+Team and project activity feeds, from an append-only log of changes.
+
+Write handlers call `record_activity()` for every change: tasks created,
+updated and deleted (also in bulk), projects created, updated and deleted,
+teams created and deleted, members added and removed. Entries are collected
+on the session and written with one multi-row INSERT just before the
+transaction commits, so they commit or roll back with the change they
+describe. An entry holds the team, project and task IDs, the user who made
+the change, the action, and the changed fields as compact JSON
+({"status": ["TO-DO", "DONE"]} for an update, a few identifying fields for
+a create or delete), so history needs no diffing of task rows.
+
+The log of a team is kept with its projects (in its shard, with sharding).
+Feeds are read newest first by keyset on (team_id, id) or (project_id, id).
+
+`flask db compact-activity` bounds the log: consecutive updates of a task by
+the same user, older than ACTIVITY_COMPACT_DAYS and less than
+ACTIVITY_COMPACT_WINDOW_MINUTES apart, are merged into one entry, and
+entries older than ACTIVITY_RETENTION_DAYS are deleted.
+"""
+import json
+from datetime import timedelta
+from flask import current_app, has_app_context, has_request_context
+from sqlalchemy import delete, event, func, insert, select, update
+from app.models.models import db, Activity, utcnow
+from app.api.pagination import apply_in_filter, apply_int_filter, decode_cursor, encode_cursor, parse_limit
+from app.api.serializers import activity_schema, dumps
+from app.auth import current_identity
+from app.routing import get_session, shard_for_team, use_shard
+
+# Session.info key of the entries waiting for the commit
+ACTIVITY_KEY = 'activity'
+
+def activity_enabled():
+    return has_app_context() and current_app.config.get('ACTIVITY_ENABLED', False)
+
+def current_actor_id():
+    identity = current_identity() if has_request_context() else None
+    return identity.user_id if identity else None
+
+def record_activity(action, team_id, project_id=None, task_id=None, changes=None, session=None):
+    """
+    Log a change when the current transaction commits
+
+    Args:
+        team_id, project_id, task_id: IDs, or the Team, Project or Task
+                                      instances of rows not flushed yet
+        changes: Dict of changed fields, {name: [old, new]} for updates
+    """
+    if not activity_enabled():
+        return
+    get_session(session).info.setdefault(ACTIVITY_KEY, []).append({
+        'created_at': utcnow(), 'team_id': team_id, 'project_id': project_id, 'task_id': task_id,
+        'actor_id': current_actor_id(), 'action': action, 'changes': changes,
+    })
+
+def field_changes(old, new):
+    """
+    {name: [old, new]} for the values of `new` that differ from `old`
+    """
+    return {name: [old.get(name), value] for name, value in new.items() if old.get(name) != value}
+
+def entry_row(entry):
+    row = dict(entry)
+    for name in ('team_id', 'project_id', 'task_id'):
+        # Instances got their IDs in the flush
+        row[name] = getattr(row[name], 'id', row[name])
+    row['changes'] = dumps(row['changes']).decode() if row['changes'] else None
+    return row
+
+def write_activity(session):
+    entries = session.info.pop(ACTIVITY_KEY, None)
+    if not entries:
+        return
+    session.flush()
+    shards = {}
+    for entry in entries:
+        row = entry_row(entry)
+        shards.setdefault(shard_for_team(row['team_id']), []).append(row)
+    for shard, rows in shards.items():
+        with use_shard(shard, session):
+            session.execute(insert(Activity), rows)
+
+def forget_activity(session, transaction):
+    # Entries of a rolled back transaction
+    if transaction.parent is None:
+        session.info.pop(ACTIVITY_KEY, None)
+
+def activity_page(condition, args):
+    """
+    One page of an activity feed, newest first
+
+    Query-string arguments:
+        limit: Entries per page (PAGE_SIZE_DEFAULT, capped at PAGE_SIZE_MAX)
+        cursor: Opaque value returned in the X-Next-Cursor header
+        action: Comma-separated actions to include
+        actor_id: Only changes made by this user
+
+    Returns:
+        tuple: (list of entries, next cursor or None)
+    """
+    limit = parse_limit(args)
+    statement = activity_schema.select().where(condition)
+    if args.get('action'):
+        statement = apply_in_filter(statement, Activity.action, args['action'])
+    if args.get('actor_id'):
+        statement = apply_int_filter(statement, Activity.actor_id, args['actor_id'], 'actor_id')
+    if args.get('cursor'):
+        statement = statement.where(Activity.id < decode_cursor(args['cursor'])['id'])
+    rows = db.session.execute(statement.order_by(Activity.id.desc()).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor({'id': rows[-1].id})
+    entries = activity_schema.dump_rows(rows)
+    for entry in entries:
+        if entry['changes'] is not None:
+            entry['changes'] = json.loads(entry['changes'])
+    return entries, next_cursor
+
+def merge_changes(entries):
+    # The first old and the last new value of every field; fields changed back are dropped
+    merged = {}
+    for changes in entries:
+        for name, (old, new) in changes.items():
+            merged[name] = [merged[name][0] if name in merged else old, new]
+    return {name: values for name, values in merged.items() if values[0] != values[1]}
+
+def write_group(connection, group):
+    # Keep the last entry of the group with the merged changes
+    ids, changes = group['ids'], merge_changes(group['changes'])
+    if changes:
+        connection.execute(update(Activity).where(Activity.id == ids[-1]).values(changes=dumps(changes).decode()))
+        ids = ids[:-1]
+    connection.execute(delete(Activity).where(Activity.id.in_(ids)))
+    return len(ids)
+
+def compact_activity(engine, compact_days, window_minutes, retention_days, batch_size=5000):
+    """
+    Merge runs of old task updates and delete expired entries, committing
+    after every batch
+
+    Returns:
+        tuple: (entries removed by merging, entries deleted as expired)
+    """
+    now = utcnow()
+    expired = 0
+    if retention_days:
+        with engine.begin() as connection:
+            expired = connection.execute(
+                delete(Activity).where(Activity.created_at < now - timedelta(days=retention_days))
+            ).rowcount
+
+    merged = 0
+    if not compact_days:
+        return merged, expired
+    window = timedelta(minutes=window_minutes)
+    with engine.begin() as connection:
+        last_id = connection.execute(
+            select(func.max(Activity.id)).where(Activity.created_at < now - timedelta(days=compact_days))
+        ).scalar()
+    # Open groups by task: consecutive updates by one user within the window of the first
+    groups = {}
+    position = 0
+    while last_id is not None and position < last_id:
+        with engine.begin() as connection:
+            rows = connection.execute(
+                select(Activity.id, Activity.task_id, Activity.actor_id, Activity.created_at, Activity.changes)
+                .where(Activity.id > position, Activity.id <= last_id, Activity.action == 'task.updated')
+                .order_by(Activity.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for row in rows:
+                group = groups.get(row.task_id)
+                if group is not None and (group['actor_id'] != row.actor_id
+                                          or row.created_at - group['started_at'] > window):
+                    if len(group['ids']) > 1:
+                        merged += write_group(connection, group)
+                    group = None
+                if group is None:
+                    group = groups[row.task_id] = {'actor_id': row.actor_id, 'started_at': row.created_at,
+                                                   'ids': [], 'changes': []}
+                group['ids'].append(row.id)
+                group['changes'].append(json.loads(row.changes) if row.changes else {})
+            position = rows[-1].id
+            # Groups that can no longer grow are written, so only recent ones stay in memory
+            for task_id, group in list(groups.items()):
+                if rows[-1].created_at - group['started_at'] > window:
+                    if len(group['ids']) > 1:
+                        merged += write_group(connection, group)
+                    del groups[task_id]
+    with engine.begin() as connection:
+        for group in groups.values():
+            if len(group['ids']) > 1:
+                merged += write_group(connection, group)
+    return merged, expired
+
+def init_activity(app):
+    # db.session is shared by every app, so the listeners are installed once
+    if not event.contains(db.session, 'before_commit', write_activity):
+        event.listen(db.session, 'before_commit', write_activity)
+        event.listen(db.session, 'after_transaction_end', forget_activity)
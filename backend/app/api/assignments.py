@@ -0,0 +1,106 @@
+"""
+Tasks assigned to a user across every project and team ("my tasks").
+
+A page is read in due-date order from the covering index
+ix_task_assignee_id_due_date_covering (assignee_id, due_date, id, status,
+project_id, title): tasks with a due date first, then the ones without, each
+by ID. The project and team names come from the same query, joined on their
+primary keys, so a page costs one index range scan whatever the number of
+tasks assigned. Tasks are returned grouped by project, the groups ordered by their
+earliest due date on the page.
+"""
+from sqlalchemy import and_, or_, select
+from app.models.models import db, Project, Task, Team
+from app.api.pagination import (QueryArgumentError, apply_in_filter, apply_range_filter, decode_cursor,
+                                encode_cursor, parse_datetime, parse_limit, serialize_value)
+from app.api.serializers import task_schema
+from app.routing import shard_rows, sharded
+
+# Task columns held by the covering index
+ASSIGNED_FIELDS = ('id', 'title', 'status', 'due_date', 'project_id')
+
+def assigned_select(user_id, args, team_ids=None):
+    statement = (
+        task_schema.select(ASSIGNED_FIELDS)
+        .add_columns(Project.name.label('project_name'), Project.team_id)
+        .join(Project, Project.id == Task.project_id)
+        .where(Task.assignee_id == user_id)
+    )
+    # Teams stay in the primary database when projects are sharded
+    if not sharded():
+        statement = statement.add_columns(Team.name.label('team_name')).join(Team, Team.id == Project.team_id)
+    if args.get('status'):
+        statement = apply_in_filter(statement, Task.status, args['status'])
+    statement = apply_range_filter(statement, Task.due_date, args.get('due_after'), args.get('due_before'))
+    if team_ids is not None:
+        statement = statement.where(Project.team_id.in_(team_ids))
+    return statement
+
+def fetch_rows(statement, key, limit):
+    return shard_rows(statement.limit(limit), key)[:limit]
+
+def assigned_rows(statement, position, limit, dated_only):
+    # Tasks with a due date, then (unless a due date range is given) the rest
+    rows = []
+    if position is None or position['due_date'] is not None:
+        dated = statement.where(Task.due_date.is_not(None))
+        if position is not None:
+            due_date = parse_datetime(position['due_date'])
+            dated = dated.where(or_(Task.due_date > due_date,
+                                    and_(Task.due_date == due_date, Task.id > position['id'])))
+        rows = fetch_rows(dated.order_by(Task.due_date, Task.id), lambda row: (row.due_date, row.id), limit + 1)
+    if len(rows) <= limit and not dated_only:
+        undated = statement.where(Task.due_date.is_(None))
+        if position is not None and position['due_date'] is None:
+            undated = undated.where(Task.id > position['id'])
+        rows += fetch_rows(undated.order_by(Task.id), lambda row: row.id, limit + 1 - len(rows))
+    return rows
+
+def assigned_tasks(user_id, args, team_ids=None):
+    """
+    One page of the tasks assigned to a user, grouped by project
+
+    Query-string arguments:
+        limit: Tasks per page (PAGE_SIZE_DEFAULT, capped at PAGE_SIZE_MAX)
+        cursor: Opaque value returned in the X-Next-Cursor header
+        status: Comma-separated statuses to include
+        due_after, due_before: Due date range (excludes tasks without one)
+
+    Args:
+        team_ids: Only include projects of these teams (None for all)
+
+    Returns:
+        tuple: (list of project groups, next cursor or None)
+    """
+    limit = parse_limit(args)
+    position = None
+    if args.get('cursor'):
+        position = decode_cursor(args['cursor'])
+        if 'due_date' not in position:
+            raise QueryArgumentError('Cursor does not match sort order')
+    dated_only = bool(args.get('due_after') or args.get('due_before'))
+    rows = assigned_rows(assigned_select(user_id, args, team_ids), position, limit, dated_only)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor({'due_date': serialize_value(last.due_date), 'id': last.id})
+
+    team_names = None
+    if sharded() and rows:
+        team_names = dict(db.session.execute(
+            select(Team.id, Team.name).where(Team.id.in_({row.team_id for row in rows}))
+        ).all())
+    dump_values = task_schema.compile(ASSIGNED_FIELDS)[0]
+    groups = {}
+    for row in rows:
+        group = groups.get(row.project_id)
+        if group is None:
+            group = groups[row.project_id] = {
+                'project_id': row.project_id, 'project_name': row.project_name, 'team_id': row.team_id,
+                'team_name': row.team_name if team_names is None else team_names.get(row.team_id),
+                'tasks': [],
+            }
+        group['tasks'].append(dump_values(row))
+    return list(groups.values()), next_cursor
@@ -0,0 +1,304 @@
+from datetime import datetime
+from sqlalchemy import delete, insert, select, update
+from app.models.models import db, Project, ReminderLog, Task, User, TASK_STATUSES
+from app.api.notifications import notify_task_digest
+from app.api.stats import record_task_changes, stats_key
+from app.api.activity import activity_enabled, field_changes, record_activity
+from app.api.events import events_enabled, publish_event
+from app.api.sync import add_tombstones, next_revision, revisions_enabled
+from app.auth import team_access_denied
+from app.routing import assign_ids, shard_of
+
+# Fields a bulk operation may set on a task
+TASK_WRITABLE_FIELDS = ('title', 'description', 'status', 'due_date', 'assignee_id')
+# Values of fields a create operation leaves out
+TASK_DEFAULTS = {'description': '', 'status': 'TO-DO', 'due_date': None, 'assignee_id': None}
+
+class BulkValidationError(Exception):
+    """
+    Raised when one or more operations in a bulk request are invalid
+
+    `results` holds one entry per operation, with an 'error' key on the
+    operations that failed validation.
+    """
+
+    def __init__(self, results):
+        super().__init__('Bulk request contains invalid operations')
+        self.results = results
+
+def parse_task_fields(item):
+    values = {}
+    for name in TASK_WRITABLE_FIELDS:
+        if name not in item:
+            continue
+        value = item[name]
+        if name == 'due_date':
+            value = datetime.fromisoformat(value) if value else None
+        elif name == 'status' and value not in TASK_STATUSES:
+            raise ValueError(f"Invalid status: {value}")
+        elif name == 'assignee_id' and value is not None and not isinstance(value, int):
+            raise ValueError("'assignee_id' must be an integer")
+        elif name == 'title' and not value:
+            raise ValueError("'title' cannot be empty")
+        values[name] = value
+    return values
+
+def operation_shards(operations):
+    """
+    The shards of the projects and tasks a bulk request refers to (empty
+    without sharding)
+    """
+    shards = set()
+    for item in operations:
+        if not isinstance(item, dict):
+            continue
+        row_id = item.get('project_id') if item.get('op') == 'create' else item.get('id')
+        if isinstance(row_id, int):
+            shards.add(shard_of(row_id))
+    shards.discard(None)
+    return shards
+
+def validate_operations(operations):
+    """
+    Validate a list of bulk task operations in one pass
+
+    Referenced projects, assignees and tasks are looked up with one query
+    each rather than once per operation. Operations on the projects of teams
+    the caller is not a member of are invalid too.
+
+    Returns:
+        tuple: (parsed operations, existing task rows keyed by id,
+                {project_id: team_id} of every project they concern)
+
+    Raises:
+        BulkValidationError: If any operation is invalid
+    """
+    parsed = []
+    errors = {}
+    for index, item in enumerate(operations):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Operation must be an object')
+            op = item.get('op')
+            if op not in ('create', 'update', 'delete'):
+                raise ValueError("'op' must be one of: create, update, delete")
+            entry = {'op': op}
+            if op == 'create':
+                if not item.get('title'):
+                    raise ValueError("'title' is required")
+                if not isinstance(item.get('project_id'), int):
+                    raise ValueError("'project_id' is required")
+                entry['project_id'] = item['project_id']
+            else:
+                if not isinstance(item.get('id'), int):
+                    raise ValueError("'id' is required")
+                entry['id'] = item['id']
+            if op != 'delete':
+                entry['values'] = parse_task_fields(item)
+            parsed.append(entry)
+        except (ValueError, TypeError) as e:
+            errors[index] = str(e)
+            parsed.append(None)
+
+    entries = [entry for entry in parsed if entry]
+    project_ids = {entry['project_id'] for entry in entries if entry['op'] == 'create'}
+    assignee_ids = {entry['values']['assignee_id'] for entry in entries
+                    if entry['op'] != 'delete' and entry['values'].get('assignee_id')}
+    task_ids = {entry['id'] for entry in entries if entry['op'] != 'create'}
+
+    project_teams = dict(db.session.execute(
+        select(Project.id, Project.team_id).where(Project.id.in_(project_ids))
+    ).all()) if project_ids else {}
+    known_users = set(db.session.scalars(select(User.id).where(User.id.in_(assignee_ids)))) if assignee_ids else set()
+    existing = {}
+    if task_ids:
+        rows = db.session.execute(
+            select(Task.id, Task.title, Task.description, Task.status, Task.assignee_id, Task.project_id,
+                   Task.due_date, Project.team_id)
+            .join(Project, Project.id == Task.project_id)
+            .where(Task.id.in_(task_ids))
+        )
+        existing = {row.id: row for row in rows}
+
+    seen_ids = set()
+    for index, entry in enumerate(parsed):
+        if entry is None:
+            continue
+        if entry['op'] == 'create' and entry['project_id'] not in project_teams:
+            errors[index] = 'Project not found'
+        elif entry['op'] != 'create' and entry['id'] not in existing:
+            errors[index] = 'Task not found'
+        elif team_access_denied(project_teams[entry['project_id']] if entry['op'] == 'create'
+                                else existing[entry['id']].team_id):
+            errors[index] = 'Not a member of this team'
+        elif entry['op'] != 'create' and entry['id'] in seen_ids:
+            errors[index] = 'Task appears more than once in this request'
+        elif entry['op'] != 'delete' and entry['values'].get('assignee_id') and entry['values']['assignee_id'] not in known_users:
+            errors[index] = 'Assignee not found'
+        if entry['op'] != 'create':
+            seen_ids.add(entry['id'])
+
+    if errors:
+        results = []
+        for index, item in enumerate(operations):
+            result = {'index': index, 'op': item.get('op') if isinstance(item, dict) else None}
+            if index in errors:
+                result['error'] = errors[index]
+            results.append(result)
+        raise BulkValidationError(results)
+
+    teams = dict(project_teams)
+    teams.update((row.project_id, row.team_id) for row in existing.values())
+    return parsed, existing, teams
+
+def apply_operations(parsed, existing, teams):
+    """
+    Apply validated operations using bulk INSERT/UPDATE/DELETE statements
+
+    Assignee notifications are merged into one digest email per assignee and
+    queued, and the task statistics updated, in the same transaction. The
+    caller commits.
+
+    Returns:
+        list: One result per operation, in request order
+    """
+    creates = [entry for entry in parsed if entry['op'] == 'create']
+    updates = [entry for entry in parsed if entry['op'] == 'update']
+    deletes = [entry['id'] for entry in parsed if entry['op'] == 'delete']
+
+    # Core statements bypass the ORM flush that stamps revisions
+    revision = next_revision() if revisions_enabled() else 0
+    created_ids = []
+    if creates:
+        rows = []
+        for entry in creates:
+            row = dict(TASK_DEFAULTS, **entry['values'])
+            row['project_id'] = entry['project_id']
+            row['revision'] = revision
+            rows.append(row)
+        assign_ids('task', rows)
+        created_ids = db.session.scalars(
+            insert(Task).returning(Task.id, sort_by_parameter_order=True), rows
+        ).all()
+    if updates:
+        rows = [dict(entry['values'], id=entry['id'], revision=revision) for entry in updates if entry['values']]
+        if rows:
+            db.session.execute(update(Task), rows)
+    if deletes:
+        db.session.execute(delete(ReminderLog).where(ReminderLog.task_id.in_(deletes)))
+        db.session.execute(delete(Task).where(Task.id.in_(deletes)).execution_options(synchronize_session=False))
+        if revisions_enabled():
+            add_tombstones('task', [(task_id, existing[task_id].project_id, teams[existing[task_id].project_id])
+                                    for task_id in deletes], revision)
+
+    stats_changes = []
+    for entry in creates:
+        values = entry['values']
+        stats_changes.append((None, (entry['project_id'], values.get('assignee_id'),
+                                     values.get('status', 'TO-DO'), values.get('due_date'))))
+    for entry in updates:
+        old = existing[entry['id']]
+        values = entry['values']
+        stats_changes.append((stats_key(old), (old.project_id, values.get('assignee_id', old.assignee_id),
+                                               values.get('status', old.status), values.get('due_date', old.due_date))))
+    for task_id in deletes:
+        stats_changes.append((stats_key(existing[task_id]), None))
+    record_task_changes(stats_changes)
+    record_bulk_activity(creates, created_ids, updates, deletes, existing, teams)
+
+    # Collecting notifications per assignee for the digest
+    changes = {}
+    for entry, task_id in zip(creates, created_ids):
+        assignee_id = entry['values'].get('assignee_id')
+        if assignee_id:
+            changes.setdefault(assignee_id, []).append(('assigned', entry['values']['title'], entry['project_id']))
+    for entry in updates:
+        old = existing[entry['id']]
+        values = entry['values']
+        assignee_id = values.get('assignee_id', old.assignee_id)
+        title = values.get('title', old.title)
+        if not assignee_id:
+            continue
+        if values.get('status', old.status) != old.status:
+            changes.setdefault(assignee_id, []).append(('status', title, f"{old.status} -> {values['status']}"))
+        if assignee_id != old.assignee_id:
+            changes.setdefault(assignee_id, []).append(('assigned', title, old.project_id))
+    if changes:
+        queue_digests(changes)
+
+    results = []
+    created = iter(created_ids)
+    for index, entry in enumerate(parsed):
+        if entry['op'] == 'create':
+            results.append({'index': index, 'op': 'create', 'id': next(created), 'status': 'created'})
+        elif entry['op'] == 'update':
+            results.append({'index': index, 'op': 'update', 'id': entry['id'], 'status': 'updated'})
+        else:
+            results.append({'index': index, 'op': 'delete', 'id': entry['id'], 'status': 'deleted'})
+    return results
+
+def record_bulk_activity(creates, created_ids, updates, deletes, existing, teams):
+    # One activity entry per operation
+    if not activity_enabled():
+        return
+    for entry, task_id in zip(creates, created_ids):
+        created = {'title': entry['values']['title']}
+        if entry['values'].get('assignee_id'):
+            created['assignee_id'] = entry['values']['assignee_id']
+        record_activity('task.created', teams[entry['project_id']], entry['project_id'], task_id, created)
+    for entry in updates:
+        old = existing[entry['id']]
+        changes = field_changes(old._asdict(), entry['values'])
+        if changes:
+            record_activity('task.updated', teams[old.project_id], old.project_id, entry['id'], changes)
+    for task_id in deletes:
+        old = existing[task_id]
+        record_activity('task.deleted', teams[old.project_id], old.project_id, task_id, {'title': old.title})
+
+def publish_bulk_events(parsed, existing, results, teams):
+    """
+    Publish one 'task.bulk' change event per project of the request, with
+    the commit
+
+    The event lists the created and updated tasks (with the fields the
+    request set) and the IDs of the deleted tasks. An event is only sent to
+    the streams of its project and team, so a request spanning several
+    projects publishes one per project.
+    """
+    if not events_enabled():
+        return
+    batches = {}
+    for entry, result in zip(parsed, results):
+        if entry['op'] == 'create':
+            project_id = entry['project_id']
+            data = dict(TASK_DEFAULTS, **entry['values'], id=result['id'], project_id=project_id)
+        else:
+            project_id = existing[entry['id']].project_id
+            data = dict(entry.get('values', {}), id=entry['id'], project_id=project_id)
+        batch = batches.setdefault(project_id, {'project_id': project_id, 'created': [], 'updated': [],
+                                                'deleted': []})
+        if entry['op'] == 'delete':
+            batch['deleted'].append(entry['id'])
+            continue
+        if data.get('due_date'):
+            data['due_date'] = data['due_date'].isoformat()
+        batch[result['status']].append(data)
+    for project_id, batch in batches.items():
+        publish_event('task.bulk', batch, project_id, [teams[project_id]])
+
+def queue_digests(changes):
+    project_ids = {detail for user_changes in changes.values()
+                   for kind, _, detail in user_changes if kind == 'assigned'}
+    project_names = dict(db.session.execute(
+        select(Project.id, Project.name).where(Project.id.in_(project_ids))
+    ).all()) if project_ids else {}
+    emails = dict(db.session.execute(select(User.id, User.email).where(User.id.in_(changes.keys()))).all())
+
+    for user_id, user_changes in changes.items():
+        lines = []
+        for kind, title, detail in user_changes:
+            if kind == 'assigned':
+                lines.append(f"Assigned: {title} (Project: {project_names.get(detail, detail)})")
+            else:
+                lines.append(f"Status changed: {title} ({detail})")
+        notify_task_digest(emails[user_id], lines)
@@ -0,0 +1,348 @@
+"""
+Read-through response cache for GET handlers.
+
+Entries are cached per request path and tagged with the IDs they depend on
+(e.g. 'project:5', 'project-tasks:5'). Write handlers call `invalidate()` with
+the tags they touched, which bumps a version counter per tag; cached entries
+remember the tag versions they were built from, so anything built before
+the write is ignored from then on. Tags are collected on the session and
+bumped when the transaction commits (not at all if it rolls back).
+
+The first level is an in-process LRU with TTL. The tag versions must be
+shared by all worker processes, or a worker keeps serving entries (and 304s)
+that another worker's write has invalidated. By default (CACHE_BACKEND
+'database') they are kept in the cache_tag table and bumped by an upsert in
+the write's own transaction. Each worker keeps the versions it read for
+CACHE_VERSION_TTL seconds, so a revalidation is answered without a query,
+and builds its own entries, whose ETags match as they hash the response
+body. Versions are microsecond timestamps, so a tag row whose last bump is
+older than twice CACHE_TTL (every entry built before it has expired) is
+deleted without a later bump ever repeating its version. A Redis backend
+shares the entries too; 'local' keeps everything in the process (a single
+worker only).
+"""
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, has_app_context, request
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.models.models import db, CacheTag
+from app.api.serializers import dumps
+
+# Session.info key of the tags waiting for the commit
+CACHE_TAGS_KEY = 'cache_tags'
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a per-entry TTL
+    """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class MemoryBackend:
+    """
+    Dictionary-backed stand-in for a shared cache server (tests, single host)
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.values.get(key)
+            if item is None or item[0] < time.monotonic():
+                return None
+            return pickle.loads(item[1])
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.values[key] = (time.monotonic() + ttl, pickle.dumps(value))
+
+    def get_counters(self, keys):
+        with self.lock:
+            return [self.counters.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+class RedisBackend:
+    """
+    Shared backend on a Redis server (requires the `redis` package)
+    """
+
+    def __init__(self, url, prefix='synergysphere:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(int(ttl), 1))
+
+    def get_counters(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def incr(self, key):
+        self.client.incr(self.prefix + key)
+
+class DatabaseBackend:
+    """
+    Tag versions in the cache_tag table of the primary database, bumped in
+    the writing transaction; entries are not shared
+    """
+    # Writes bumping tags between two prunes of stale rows
+    PRUNE_INTERVAL = 1024
+
+    def __init__(self, ttl=30, version_ttl=1, max_entries=1024):
+        self.ttl = ttl
+        self.versions = LRUCache(max_entries, version_ttl)
+        self.writes = 0
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def get_counters(self, keys):
+        tags = [key.removeprefix('tag:') for key in keys]
+        versions = {tag: self.versions.get(tag) for tag in tags}
+        missing = [tag for tag, version in versions.items() if version is None]
+        if missing:
+            with db.engine.connect() as connection:
+                found = dict(connection.execute(
+                    select(CacheTag.tag, CacheTag.version).where(CacheTag.tag.in_(missing))
+                ).all())
+            for tag in missing:
+                versions[tag] = found.get(tag, 0)
+                self.versions.set(tag, versions[tag])
+        return [versions[tag] for tag in tags]
+
+    def incr_many(self, keys, session=None):
+        """
+        Bump tag versions in the transaction of `session`, or in their own
+
+        Args:
+            keys: 'tag:'-prefixed tags
+        """
+        # One upsert for all the tags of a write (SQLite and PostgreSQL)
+        dialect = db.engine.dialect.name
+        insert = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}[dialect]
+        greatest = {'sqlite': func.max, 'postgresql': func.greatest}[dialect]
+        now = int(time.time() * 1e6)
+        statement = insert(CacheTag).values([{'tag': key.removeprefix('tag:'), 'version': now} for key in keys])
+        statement = statement.on_conflict_do_update(
+            index_elements=[CacheTag.tag],
+            set_={'version': greatest(CacheTag.version + 1, statement.excluded.version)}
+        )
+        self.writes += 1
+        prune = None
+        if self.writes % self.PRUNE_INTERVAL == 0:
+            prune = delete(CacheTag).where(CacheTag.version < int((time.time() - 2 * self.ttl) * 1e6))
+        if session is None:
+            with db.engine.begin() as connection:
+                connection.execute(statement)
+                if prune is not None:
+                    connection.execute(prune)
+            self.forget(keys)
+            return
+        session.execute(statement)
+        if prune is not None:
+            session.execute(prune)
+
+    def forget(self, keys):
+        # Versions this worker has just bumped are read again
+        for key in keys:
+            self.versions.set(key.removeprefix('tag:'), None, ttl=-1)
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=30, shared=None):
+        self.ttl = ttl
+        self.local = LRUCache(max_entries, ttl)
+        self.shared = shared
+        self.local_versions = {}
+        self.lock = threading.Lock()
+
+    def tag_versions(self, tags):
+        if self.shared is not None:
+            return tuple(self.shared.get_counters(['tag:' + tag for tag in tags]))
+        with self.lock:
+            return tuple(self.local_versions.get(tag, 0) for tag in tags)
+
+    def get(self, key, versions):
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get('entry:' + key)
+            if entry is not None:
+                self.local.set(key, entry)
+        if entry is None or entry[0] != versions:
+            return None
+        return entry[1]
+
+    def set(self, key, versions, value):
+        entry = (versions, value)
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set('entry:' + key, entry, self.ttl)
+
+    def invalidate(self, *tags, session=None):
+        """
+        Bump the versions of `tags`; with the database backend, in the
+        transaction of `session` if given
+        """
+        if isinstance(self.shared, DatabaseBackend):
+            self.shared.incr_many(['tag:' + tag for tag in dict.fromkeys(tags)], session)
+            return
+        for tag in tags:
+            if self.shared is not None:
+                self.shared.incr('tag:' + tag)
+            else:
+                with self.lock:
+                    self.local_versions[tag] = self.local_versions.get(tag, 0) + 1
+
+    def committed(self, *tags):
+        # Tags of a transaction that has just committed
+        if isinstance(self.shared, DatabaseBackend):
+            self.shared.forget(['tag:' + tag for tag in tags])
+        else:
+            self.invalidate(*tags)
+
+def compute_etag(data):
+    return hashlib.sha1(dumps(data, sort_keys=True)).hexdigest()
+
+def cached(tags):
+    """
+    Cache a Resource GET method and answer If-None-Match with 304
+
+    Args:
+        tags: Function receiving the view keyword arguments and returning the
+              list of tags the response depends on
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = current_app.extensions.get('response_cache')
+            if cache is None:
+                return method(self, *args, **kwargs)
+
+            key = request.full_path
+            # Versions are read before the handler runs so a concurrent write
+            # makes the freshly built entry stale instead of being lost
+            versions = cache.tag_versions(tags(**kwargs))
+            hit = cache.get(key, versions)
+            if hit is None:
+                result = method(self, *args, **kwargs)
+                if not isinstance(result, tuple) or result[1] != 200:
+                    return result
+                data = result[0]
+                headers = dict(result[2]) if len(result) > 2 else {}
+                hit = (data, headers, compute_etag(data))
+                cache.set(key, versions, hit)
+
+            data, headers, etag = hit
+            headers = dict(headers, ETag=f'"{etag}"')
+            headers['Cache-Control'] = 'no-cache'
+            if etag in request.if_none_match:
+                return Response(status=304, headers=headers)
+            return data, 200, headers
+        return wrapper
+    return decorator
+
+def get_response_cache():
+    return current_app.extensions.get('response_cache') if has_app_context() else None
+
+def invalidate(*tags):
+    """
+    Invalidate cached responses depending on any of `tags` when the current
+    transaction commits
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return
+    if not db.session().in_transaction():
+        cache.invalidate(*tags)
+        return
+    db.session.info.setdefault(CACHE_TAGS_KEY, {}).update(dict.fromkeys(tags))
+
+def write_cache_tags(session):
+    cache = get_response_cache()
+    tags = session.info.get(CACHE_TAGS_KEY)
+    if cache is None or not tags or not isinstance(cache.shared, DatabaseBackend):
+        return
+    cache.invalidate(*tags, session=session)
+
+def bump_cache_tags(session):
+    # Other backends are bumped once the change is visible, or a concurrent
+    # read could cache the old rows under the new versions
+    cache = get_response_cache()
+    tags = session.info.pop(CACHE_TAGS_KEY, None)
+    if cache is not None and tags:
+        cache.committed(*tags)
+
+def forget_cache_tags(session, transaction):
+    # Tags of a rolled back transaction
+    if transaction.parent is None:
+        session.info.pop(CACHE_TAGS_KEY, None)
+
+def init_cache(app):
+    if not app.config.get('CACHE_ENABLED', False):
+        return None
+    shared = None
+    backend = app.config.get('CACHE_BACKEND', 'database')
+    if backend == 'database':
+        shared = DatabaseBackend(
+            ttl=app.config.get('CACHE_TTL', 30),
+            version_ttl=app.config.get('CACHE_VERSION_TTL', 1),
+            max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024)
+        )
+    elif backend == 'redis':
+        shared = RedisBackend(app.config['CACHE_REDIS_URL'])
+    elif backend == 'memory':
+        shared = MemoryBackend()
+    cache = ResponseCache(
+        max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+        ttl=app.config.get('CACHE_TTL', 30),
+        shared=shared
+    )
+    app.extensions['response_cache'] = cache
+    # db.session is shared by every app, so the listeners are installed once
+    if not event.contains(db.session, 'before_commit', write_cache_tags):
+        event.listen(db.session, 'before_commit', write_cache_tags)
+        event.listen(db.session, 'after_commit', bump_cache_tags)
+        event.listen(db.session, 'after_transaction_end', forget_cache_tags)
+    return cache
@@ -0,0 +1,93 @@
+"""
+Coalescing of rapid updates to the same row.
+
+PUTs to one task by one caller are applied one batch at a time per process.
+A PUT arriving while the caller's earlier batch for the task is being applied
+(or within TASK_UPDATE_COALESCE_MS of the first PUT of its batch) joins the
+next batch: the changes of the batch are merged in arrival order, applied in one
+transaction, with one notification and one change event, and every request
+of the batch returns the resulting task. Retries and repeated edits thus
+cost one commit, and concurrent PUTs no longer both see the old status and
+both send the status-change email. Batches never mix callers, so each
+change is made, and recorded in the activity log, as its own user's.
+
+Batches are per process; retries reaching another worker process are
+caught by their Idempotency-Key instead (see app/api/idempotency.py).
+"""
+import threading
+import time
+from flask import current_app
+
+class Batch:
+    def __init__(self, changes):
+        self.changes = dict(changes)
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class UpdateCoalescer:
+    def __init__(self, window=0.0, stripes=64):
+        self.window = window
+        self.lock = threading.Lock()
+        # Key -> batch still accepting changes
+        self.open = {}
+        # One batch per key is applied at a time (keys share a lock per stripe)
+        self.stripes = [threading.Lock() for _ in range(stripes)]
+
+    def submit(self, key, changes, apply):
+        """
+        Merge `changes` into the open batch for `key`, or open one and apply it
+
+        Args:
+            apply: Function applying a batch's merged changes, called in the
+                   thread of the request that opened the batch
+
+        Returns:
+            The result of `apply` for the batch this request joined
+        """
+        with self.lock:
+            batch = self.open.get(key)
+            opened = batch is None
+            if opened:
+                batch = self.open[key] = Batch(changes)
+            else:
+                batch.changes.update(changes)
+        if opened:
+            return self.run(key, batch, apply)
+        return self.wait(batch)
+
+    def run(self, key, batch, apply):
+        with self.stripes[hash(key) % len(self.stripes)]:
+            if self.window:
+                time.sleep(self.window)
+            with self.lock:
+                # Requests arriving from now on open the next batch
+                del self.open[key]
+            try:
+                batch.result = apply(batch.changes)
+            except BaseException as e:
+                batch.error = e
+                raise
+            finally:
+                batch.done.set()
+        return batch.result
+
+    def wait(self, batch):
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+
+def coalesce_update(key, changes, apply):
+    """
+    Apply `changes` through the app's UpdateCoalescer (see UpdateCoalescer.submit)
+    """
+    coalescer = current_app.extensions.get('update_coalescer')
+    if coalescer is None:
+        return apply(changes)
+    return coalescer.submit(key, changes, apply)
+
+def init_coalescing(app):
+    coalescer = UpdateCoalescer(app.config.get('TASK_UPDATE_COALESCE_MS', 0) / 1000)
+    app.extensions['update_coalescer'] = coalescer
+    return coalescer
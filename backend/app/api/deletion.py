@@ -0,0 +1,212 @@
+"""
+Set-based deletion and archiving of projects and teams.
+
+Deleting a project deletes its tasks DELETE_CHUNK_SIZE at a time, one
+transaction per chunk, so even a project with a million tasks never holds
+the SQLite write lock for longer than one chunk, and other requests write
+in the DELETE_CHUNK_PAUSE_MS between two chunks. With `archive`, each chunk
+is first copied to `archived_task` (and the project to `archived_project`)
+by INSERT ... SELECT. The project row, its statistics and its sync tombstone
+go in the last transaction. A team is deleted project by project, then with
+its memberships.
+
+Nothing is loaded into the session. The foreign keys are declared ON DELETE
+CASCADE (enforced by PostgreSQL, and by SQLite with SQLITE_FOREIGN_KEYS), but
+the children are deleted first, so a cascade never has a large set to
+delete in one statement.
+
+Deleting in the background runs the same steps in a thread and returns a
+BackgroundJob, whose progress (tasks deleted out of the total from the
+statistics tables) is polled at /api/jobs/<id>. Every step is idempotent,
+so a job interrupted by a restart can simply be requested again.
+"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy import delete, func, insert, literal, select, update
+from app.models.models import (db, ArchivedProject, ArchivedTask, BackgroundJob, Project, ReminderLog, Task,
+                               TaskStat, Team, team_members, utcnow)
+from app.api.activity import record_activity
+from app.api.cache import invalidate
+from app.api.events import publish_event
+from app.api.stats import delete_project_stats
+from app.api.sync import add_tombstones, next_revision, revisions_enabled
+from app.auth import get_tokens
+from app.routing import select_shard, shard_for_team, shard_of
+
+ARCHIVED_TASK_COLUMNS = ('id', 'title', 'description', 'status', 'due_date', 'created_at', 'project_id',
+                         'assignee_id')
+ARCHIVED_PROJECT_COLUMNS = ('id', 'name', 'description', 'created_at', 'team_id')
+
+def archive_rows(archive_model, model, columns, condition):
+    # INSERT INTO archived_... SELECT ..., now FROM ... WHERE condition
+    db.session.execute(insert(archive_model).from_select(
+        [*columns, 'archived_at'],
+        select(*[getattr(model, name) for name in columns], literal(utcnow())).where(condition)
+    ))
+
+def task_count(project_ids):
+    # From the statistics summary table rather than by counting tasks
+    if not project_ids:
+        return 0
+    return db.session.scalar(
+        select(func.coalesce(func.sum(TaskStat.task_count), 0)).where(TaskStat.project_id.in_(project_ids))
+    )
+
+def delete_task_chunk(project_id, size, archive):
+    """
+    Delete (and archive) up to `size` tasks of a project; the caller commits
+
+    Returns:
+        list: IDs of the deleted tasks
+    """
+    task_ids = db.session.scalars(select(Task.id).where(Task.project_id == project_id).limit(size)).all()
+    if task_ids:
+        if archive:
+            archive_rows(ArchivedTask, Task, ARCHIVED_TASK_COLUMNS, Task.id.in_(task_ids))
+        db.session.execute(delete(ReminderLog).where(ReminderLog.task_id.in_(task_ids)))
+        db.session.execute(delete(Task).where(Task.id.in_(task_ids)).execution_options(synchronize_session=False))
+    return task_ids
+
+def delete_project_row(project_id, archive):
+    """
+    Delete (and archive) a project whose tasks are gone; the caller commits
+
+    Returns:
+        int: The project's team ID, or None if it no longer exists
+    """
+    row = db.session.execute(select(Project.team_id, Project.name).where(Project.id == project_id)).first()
+    if row is None:
+        return None
+    team_id = row.team_id
+    if archive:
+        archive_rows(ArchivedProject, Project, ARCHIVED_PROJECT_COLUMNS, Project.id == project_id)
+    delete_project_stats(project_id)
+    db.session.execute(delete(Project).where(Project.id == project_id).execution_options(synchronize_session=False))
+    if revisions_enabled():
+        # Clients drop the tasks of a deleted project, so they need no tombstones of their own
+        add_tombstones('project', [(project_id, project_id, team_id)], next_revision())
+    record_activity('project.deleted', team_id, project_id, changes={'name': row.name})
+    publish_event('project.deleted', {'id': project_id, 'team_id': team_id}, project_id, [team_id])
+    return team_id
+
+def delete_project_data(project_id, chunk_size, archive=False, progress=None, pause=0):
+    """
+    Delete a project and its tasks, committing after every chunk
+
+    Args:
+        pause: Seconds to wait after each chunk's commit
+        progress: Optional function called with the number of tasks in each
+                  chunk, before its commit
+
+    Returns:
+        tuple: (team ID or None, number of tasks deleted)
+    """
+    deleted = 0
+    while True:
+        task_ids = delete_task_chunk(project_id, chunk_size, archive)
+        if not task_ids:
+            break
+        if progress:
+            progress(len(task_ids))
+        invalidate(*[f'task:{task_id}' for task_id in task_ids])
+        db.session.commit()
+        deleted += len(task_ids)
+        if pause:
+            # SQLite's busy handler retries at growing intervals (up to 100 ms), so a writer
+            # waiting for the lock would otherwise keep missing the gap between two chunks
+            time.sleep(pause)
+    team_id = delete_project_row(project_id, archive)
+    invalidate('projects', f'project:{project_id}', f'project-tasks:{project_id}')
+    db.session.commit()
+    return team_id, deleted
+
+def delete_project(project_id, archive=False, progress=None):
+    """
+    Delete a project (see delete_project_data)
+
+    Returns:
+        int: Number of tasks deleted
+    """
+    select_shard(shard_of(project_id))
+    config = current_app.config
+    _, deleted = delete_project_data(project_id, config.get('DELETE_CHUNK_SIZE', 1000), archive, progress,
+                                     config.get('DELETE_CHUNK_PAUSE_MS', 0) / 1000)
+    return deleted
+
+def delete_team(team_id, archive=False, progress=None):
+    """
+    Delete a team with its projects, tasks and memberships
+
+    Returns:
+        int: Number of tasks deleted
+    """
+    select_shard(shard_for_team(team_id))
+    project_ids = db.session.scalars(select(Project.id).where(Project.team_id == team_id).order_by(Project.id)).all()
+    deleted = 0
+    for project_id in project_ids:
+        deleted += delete_project(project_id, archive, progress)
+
+    member_ids = db.session.scalars(select(team_members.c.user_id).where(team_members.c.team_id == team_id)).all()
+    name = db.session.scalar(select(Team.name).where(Team.id == team_id))
+    if name is not None:
+        record_activity('team.deleted', team_id, changes={'name': name})
+    db.session.execute(delete(team_members).where(team_members.c.team_id == team_id))
+    db.session.execute(delete(Team).where(Team.id == team_id).execution_options(synchronize_session=False))
+    invalidate('teams', f'team:{team_id}')
+    # Tokens list the caller's teams
+    for user_id in member_ids:
+        get_tokens().revoke_user(user_id, db.session)
+    publish_event('team.deleted', {'id': team_id}, team_ids=[team_id])
+    db.session.commit()
+    return deleted
+
+def deletion_total(kind, target_id):
+    """
+    Number of tasks a deletion job will delete
+    """
+    if kind == 'delete_project':
+        select_shard(shard_of(target_id))
+        return task_count([target_id])
+    select_shard(shard_for_team(target_id))
+    return task_count(db.session.scalars(select(Project.id).where(Project.team_id == target_id)).all())
+
+JOBS = {'delete_project': delete_project, 'delete_team': delete_team}
+
+def run_job(app, job_id):
+    with app.app_context():
+        job = db.session.get(BackgroundJob, job_id)
+        job.status = 'RUNNING'
+        db.session.commit()
+        kind, target_id, archive = job.kind, job.target_id, job.archive
+
+        def progress(count):
+            # Committed with the chunk it counts
+            db.session.execute(update(BackgroundJob).where(BackgroundJob.id == job_id)
+                               .values(done=BackgroundJob.done + count))
+
+        try:
+            JOBS[kind](target_id, archive, progress)
+            values = {'status': 'DONE'}
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Background job {job_id} ({kind} {target_id}) failed: {str(e)}")
+            values = {'status': 'FAILED', 'error': str(e)}
+        db.session.execute(update(BackgroundJob).where(BackgroundJob.id == job_id)
+                           .values(finished_at=utcnow(), **values))
+        db.session.commit()
+
+def start_job(kind, target_id, archive=False):
+    """
+    Record a deletion job and run it in a background thread
+
+    Returns:
+        BackgroundJob: The committed job
+    """
+    job = BackgroundJob(kind=kind, target_id=target_id, archive=archive, total=deletion_total(kind, target_id))
+    db.session.add(job)
+    db.session.commit()
+    thread = threading.Thread(target=run_job, args=(current_app._get_current_object(), job.id),
+                              name=f'job-{job.id}', daemon=True)
+    thread.start()
+    return job
@@ -0,0 +1,452 @@
+"""
+Change feed pushed to clients over Server-Sent Events.
+
+Write handlers call `publish_event()` before committing. Each event is sent
+to the channels it concerns ('project:<id>', 'team:<id>'), and every open
+`GET /api/events` stream that subscribed to one of them receives it. Events
+are collected on the session and published with the commit, so an event is
+never sent for a change that rolled back.
+
+The backend assigns event IDs and keeps recent events so a client that
+reconnects with `Last-Event-ID` receives what it missed instead of
+reloading everything:
+
+- DatabaseEventBackend (the default): events are rows of the change_event
+  table, written with one multi-row INSERT in the transaction of the change
+  they describe, and polled by one listener thread per process, so every
+  worker process sees the events published by the others.
+- RedisEventBackend: events go through a Redis stream after the commit, the
+  same way without polling.
+- MemoryEventBackend: events stay in the process that published them
+  (a single worker only; the gunicorn config refuses it with more).
+
+Each open stream holds a server thread, so a process serves at most
+EVENTS_MAX_STREAMS at a time, fewer than its threads, and answers further
+stream requests with 503 and Retry-After.
+"""
+import json
+import queue
+import threading
+import time
+from collections import deque
+from flask import Response, current_app, has_app_context, stream_with_context
+from sqlalchemy import delete, event as sqlalchemy_event, func, insert, make_url, select
+from app.models.models import db, ChangeEvent
+
+# Put in a subscriber's queue when it fell too far behind
+OVERFLOW = object()
+
+# Session.info key of the events waiting for the commit
+EVENTS_KEY = 'change_events'
+
+class TooManyStreams(Exception):
+    """
+    Raised when the process already serves EVENTS_MAX_STREAMS streams
+    """
+
+def event_order(event_id):
+    # '42' (memory backend) -> (42,); '1700000000000-3' (Redis stream) -> (1700000000000, 3)
+    try:
+        return tuple(int(part) for part in str(event_id).split('-'))
+    except ValueError:
+        return None
+
+class Subscription:
+    def __init__(self, channels, queue_size):
+        self.channels = frozenset(channels)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def put(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Tell the stream to send a reset instead of silently dropping events
+            self.overflowed = True
+            self.queue.queue.clear()
+            self.queue.put_nowait(OVERFLOW)
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+class EventBroker:
+    """
+    In-process fan-out from published events to open streams
+    """
+
+    def __init__(self, queue_size=256):
+        self.queue_size = queue_size
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels, self.queue_size)
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.subscriptions.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscriptions[channel]
+
+    def dispatch(self, event):
+        with self.lock:
+            targets = set()
+            for channel in event['channels']:
+                targets.update(self.subscriptions.get(channel, ()))
+        for subscription in targets:
+            subscription.put(event)
+
+class MemoryEventBackend:
+    def __init__(self, broker, buffer_size=1000):
+        self.broker = broker
+        self.events = deque(maxlen=buffer_size)
+        self.next_id = 1
+        self.lock = threading.Lock()
+
+    def publish(self, events):
+        # Dispatching under the lock keeps delivery in ID order
+        with self.lock:
+            for event in events:
+                event['id'] = str(self.next_id)
+                self.next_id += 1
+                self.events.append(event)
+                self.broker.dispatch(event)
+
+    def since(self, last_id):
+        """
+        Returns:
+            list: Events after `last_id`, or None if some were already
+                  dropped from the buffer (the client must reload)
+        """
+        position = event_order(last_id)
+        with self.lock:
+            if position is None or position[0] >= self.next_id:
+                return None
+            if self.events and position[0] < int(self.events[0]['id']) - 1:
+                return None
+            return [event for event in self.events if int(event['id']) > position[0]]
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+class RedisEventBackend:
+    """
+    Events in a capped Redis stream, read by one listener thread per process
+    (requires the `redis` package)
+    """
+
+    def __init__(self, broker, url, buffer_size=1000, key='synergysphere:events'):
+        import redis
+        self.broker = broker
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.buffer_size = buffer_size
+        self.key = key
+        self.stopping = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # Started by the first stream a process opens; a listener started in a
+        # preloaded gunicorn master would not run in the forked workers
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                # Read from the current end of the stream now, so events published
+                # before the listener's first XREAD still reach the new stream
+                latest = self.client.xrevrange(self.key, count=1)
+                last_id = latest[0][0] if latest else '0-0'
+                self.thread = threading.Thread(target=self.listen, args=(last_id,), name='event-listener',
+                                               daemon=True)
+                self.thread.start()
+
+    def publish(self, events):
+        # Delivered to local subscribers by the listener, like everyone else's
+        pipeline = self.client.pipeline(transaction=False)
+        for event in events:
+            fields = {'data': json.dumps(event, separators=(',', ':'), default=str)}
+            pipeline.xadd(self.key, fields, maxlen=self.buffer_size, approximate=True)
+        pipeline.execute()
+
+    def decode(self, event_id, fields):
+        event = json.loads(fields['data'])
+        event['id'] = event_id
+        return event
+
+    def listen(self, last_id='$'):
+        while not self.stopping.is_set():
+            try:
+                response = self.client.xread({self.key: last_id}, block=5000, count=100)
+            except Exception:
+                time.sleep(1)
+                continue
+            for _, entries in response or ():
+                for event_id, fields in entries:
+                    last_id = event_id
+                    self.broker.dispatch(self.decode(event_id, fields))
+
+    def since(self, last_id):
+        if event_order(last_id) is None:
+            return None
+        oldest = self.client.xrange(self.key, count=1)
+        if oldest and event_order(last_id) < event_order(oldest[0][0]):
+            return None
+        return [self.decode(event_id, fields) for event_id, fields in self.client.xrange(self.key, f'({last_id}')]
+
+    def close(self):
+        self.stopping.set()
+
+class DatabaseEventBackend:
+    """
+    Events in the change_event table of the primary database, trimmed to the
+    last `buffer_size`, and read by one polling listener thread per process.
+    IDs are assigned by the database, so they are the same in every process.
+    The listener reads the events after the last ID it saw, which relies on
+    IDs becoming visible in order: SQLite commits writes one at a time, but
+    PostgreSQL transactions can commit their sequence values out of order, so
+    init_events() only uses this backend on SQLite.
+    """
+
+    def __init__(self, broker, buffer_size=1000, poll_seconds=0.5, trim_every=100):
+        self.broker = broker
+        self.buffer_size = buffer_size
+        self.poll_seconds = poll_seconds
+        self.trim_every = trim_every
+        # Events this process wrote since it last trimmed the table
+        self.untrimmed = 0
+        self.stopping = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # Started by the first stream a process opens, like RedisEventBackend
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                engine = db.engine
+                with engine.connect() as connection:
+                    last_id = connection.execute(select(func.coalesce(func.max(ChangeEvent.id), 0))).scalar()
+                self.thread = threading.Thread(target=self.listen, args=(engine, last_id),
+                                               name='event-listener', daemon=True)
+                self.thread.start()
+
+    def write(self, connection, events):
+        """
+        Insert `events` with one multi-row INSERT on `connection` (a session
+        in the transaction of the change, or a connection); delivered to local
+        subscribers by the listener, like everyone else's
+        """
+        connection.execute(insert(ChangeEvent), [
+            {'type': event['type'], 'channels': json.dumps(event['channels']),
+             'data': json.dumps(event['data'], separators=(',', ':'), default=str)}
+            for event in events
+        ])
+        with self.lock:
+            self.untrimmed += len(events)
+            trim = self.untrimmed >= self.trim_every
+            if trim:
+                self.untrimmed = 0
+        if trim:
+            newest = select(func.max(ChangeEvent.id)).scalar_subquery()
+            connection.execute(delete(ChangeEvent).where(ChangeEvent.id <= newest - self.buffer_size))
+
+    def publish(self, events):
+        # Events published outside a transaction
+        with db.engine.begin() as connection:
+            self.write(connection, events)
+
+    def decode(self, row):
+        return {'id': str(row.id), 'type': row.type, 'channels': json.loads(row.channels),
+                'data': json.loads(row.data)}
+
+    def read(self, connection, last_id, limit=None):
+        statement = select(ChangeEvent).where(ChangeEvent.id > last_id).order_by(ChangeEvent.id)
+        return connection.execute(statement.limit(limit) if limit else statement).all()
+
+    def listen(self, engine, last_id):
+        while not self.stopping.is_set():
+            try:
+                with engine.connect() as connection:
+                    rows = self.read(connection, last_id, 100)
+            except Exception:
+                rows = []
+            for row in rows:
+                last_id = row.id
+                self.broker.dispatch(self.decode(row))
+            if len(rows) < 100:
+                self.stopping.wait(self.poll_seconds)
+
+    def since(self, last_id):
+        position = event_order(last_id)
+        if position is None or len(position) != 1:
+            return None
+        # The event at `last_id` (or, if it was trimmed, the next one) shows nothing was missed
+        with db.engine.connect() as connection:
+            rows = self.read(connection, position[0] - 1)
+        if not rows or rows[0].id not in (position[0], position[0] + 1):
+            return None
+        return [self.decode(row) for row in rows if row.id > position[0]]
+
+    def close(self):
+        self.stopping.set()
+
+def events_enabled():
+    return 'events' in current_app.extensions
+
+def get_event_backend():
+    return current_app.extensions.get('events') if has_app_context() else None
+
+def publish_event(event_type, data, project_id=None, team_ids=()):
+    """
+    Publish a change event to the streams of a project and/or teams when the
+    current transaction commits (at once outside a transaction)
+    """
+    backend = get_event_backend()
+    if backend is None:
+        return
+    channels = [f'team:{team_id}' for team_id in dict.fromkeys(team_ids) if team_id is not None]
+    if project_id is not None:
+        channels.append(f'project:{project_id}')
+    event = {'type': event_type, 'channels': channels, 'data': data}
+    if not db.session().in_transaction():
+        backend.publish([event])
+        return
+    db.session.info.setdefault(EVENTS_KEY, []).append(event)
+
+def write_events(session):
+    # The database backend commits the events with the change
+    backend = get_event_backend()
+    if not isinstance(backend, DatabaseEventBackend) or not session.info.get(EVENTS_KEY):
+        return
+    backend.write(session, session.info.pop(EVENTS_KEY))
+
+def publish_committed_events(session):
+    # Other backends publish once the change is visible
+    backend = get_event_backend()
+    events = session.info.pop(EVENTS_KEY, None)
+    if backend is not None and events:
+        backend.publish(events)
+
+def forget_events(session, transaction):
+    # Events of a rolled back transaction
+    if transaction.parent is None:
+        session.info.pop(EVENTS_KEY, None)
+
+def format_event(event):
+    payload = json.dumps(
+        {'type': event['type'], 'channels': event['channels'], 'data': event['data']},
+        separators=(',', ':'), default=str
+    )
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+def format_reset():
+    # The client missed events that are no longer available and should reload
+    return 'event: reset\ndata: {}\n\n'
+
+def stream_events(channels, last_event_id=None, timeout=None):
+    """
+    Build the text/event-stream response for a subscription to `channels`
+
+    The stream ends after `timeout` (at most EVENTS_MAX_STREAM_SECONDS), and
+    the browser's EventSource reconnects with Last-Event-ID.
+    """
+    app = current_app._get_current_object()
+    backend = app.extensions['events']
+    broker = app.extensions['event_broker']
+    heartbeat = app.config.get('EVENTS_HEARTBEAT_SECONDS', 15)
+    max_seconds = app.config.get('EVENTS_MAX_STREAM_SECONDS', 300)
+    duration = min(timeout, max_seconds) if timeout else max_seconds
+    retry_ms = app.config.get('EVENTS_RETRY_MS', 3000)
+
+    streams = app.extensions['event_streams']
+    if not streams.acquire(blocking=False):
+        raise TooManyStreams('Too many open event streams, try again shortly')
+    subscription = None
+    try:
+        backend.start()
+        # Subscribe before reading the backlog so nothing falls in between
+        subscription = broker.subscribe(channels)
+        backlog = []
+        reset = False
+        if last_event_id:
+            backlog = backend.since(last_event_id)
+            if backlog is None:
+                reset, backlog = True, []
+            backlog = [event for event in backlog if channels.intersection(event['channels'])]
+    except Exception:
+        if subscription is not None:
+            broker.unsubscribe(subscription)
+        streams.release()
+        raise
+    last_seen = event_order(backlog[-1]['id']) if backlog else event_order(last_event_id) if last_event_id else None
+
+    def generate():
+        nonlocal last_seen
+        deadline = time.monotonic() + duration
+        yield f'retry: {retry_ms}\n\n'
+        if reset:
+            yield format_reset()
+        for event in backlog:
+            yield format_event(event)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = subscription.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if event is OVERFLOW:
+                yield format_reset()
+                break
+            position = event_order(event['id'])
+            if last_seen is not None and position is not None and position <= last_seen:
+                continue
+            last_seen = position
+            yield format_event(event)
+
+    def release():
+        # When the server closes the response, also if the stream never started
+        broker.unsubscribe(subscription)
+        streams.release()
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+    response.call_on_close(release)
+    return response
+
+def init_events(app):
+    if not app.config.get('EVENTS_ENABLED', False):
+        return None
+    broker = EventBroker(queue_size=app.config.get('EVENTS_QUEUE_SIZE', 256))
+    buffer_size = app.config.get('EVENTS_BUFFER_SIZE', 1000)
+    backend_name = app.config.get('EVENTS_BACKEND', 'database')
+    if backend_name == 'database':
+        database = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+        if database != 'sqlite':
+            raise RuntimeError(f"EVENTS_BACKEND=database needs SQLite, not {database}; "
+                               "use EVENTS_BACKEND=redis")
+        backend = DatabaseEventBackend(broker, buffer_size, app.config.get('EVENTS_POLL_SECONDS', 0.5))
+    elif backend_name == 'redis':
+        backend = RedisEventBackend(broker, app.config['EVENTS_REDIS_URL'], buffer_size)
+    else:
+        backend = MemoryEventBackend(broker, buffer_size)
+    app.extensions['event_broker'] = broker
+    app.extensions['events'] = backend
+    app.extensions['event_streams'] = threading.BoundedSemaphore(app.config.get('EVENTS_MAX_STREAMS', 2))
+    # db.session is shared by every app, so the listeners are installed once
+    if not sqlalchemy_event.contains(db.session, 'before_commit', write_events):
+        sqlalchemy_event.listen(db.session, 'before_commit', write_events)
+        sqlalchemy_event.listen(db.session, 'after_commit', publish_committed_events)
+        sqlalchemy_event.listen(db.session, 'after_transaction_end', forget_events)
+    return backend
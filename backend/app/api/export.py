@@ -0,0 +1,89 @@
+import heapq
+import zlib
+from flask import Response, current_app, stream_with_context
+from app.models.models import db
+from app.api.serializers import dumps
+from app.routing import on_each_shard, selected_shard, sharded
+
+def iter_rows(statement, schema, fields, batch_size):
+    """
+    Yield rows of `statement` as dicts using a server-side cursor
+
+    `yield_per` keeps only one batch of rows in memory at a time, so memory
+    stays flat regardless of how many rows are exported.
+    """
+    dump_values = schema.compile(fields)[0]
+    if sharded() and selected_shard() is None:
+        # One cursor per shard, merged in ID order (the statement is ordered by ID)
+        statement = statement.add_columns(schema.model.id).execution_options(yield_per=batch_size)
+        results = on_each_shard(lambda: db.session.execute(statement))
+        for row in heapq.merge(*results, key=lambda row: row[-1]):
+            yield dump_values(row)
+        return
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        for row in partition:
+            yield dump_values(row)
+
+def iter_ndjson(rows, rows_per_chunk):
+    buffer = []
+    for row in rows:
+        buffer.append(dumps(row))
+        if len(buffer) >= rows_per_chunk:
+            yield b'\n'.join(buffer) + b'\n'
+            buffer = []
+    if buffer:
+        yield b'\n'.join(buffer) + b'\n'
+
+def iter_json_array(rows, rows_per_chunk):
+    # Emit the opening bracket immediately so the first byte goes out right away
+    yield b'['
+    first = True
+    buffer = []
+    for row in rows:
+        encoded = dumps(row)
+        buffer.append(encoded if first else b',' + encoded)
+        first = False
+        if len(buffer) >= rows_per_chunk:
+            yield b''.join(buffer)
+            buffer = []
+    buffer.append(b']')
+    yield b''.join(buffer)
+
+def iter_gzip(chunks):
+    # wbits=31 produces a gzip container; sync flushes keep the stream incremental
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(statement, schema, fields, fmt='ndjson', gzip=False):
+    """
+    Build a streaming response for an export query
+
+    Args:
+        statement: SQLAlchemy select() of the exported columns
+        schema (Schema): Serializer of the exported model
+        fields (list): Column names, in the same order as the select
+        fmt (str): 'ndjson' or 'json' (a chunked JSON array)
+        gzip (bool): Whether to gzip-compress the stream
+
+    Returns:
+        Response: A chunked Flask response
+    """
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    rows = iter_rows(statement, schema, fields, batch_size)
+    if fmt == 'json':
+        chunks = iter_json_array(rows, batch_size)
+        mimetype = 'application/json'
+    else:
+        chunks = iter_ndjson(rows, batch_size)
+        mimetype = 'application/x-ndjson'
+
+    headers = {'X-Accel-Buffering': 'no'}
+    if gzip:
+        chunks = iter_gzip(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
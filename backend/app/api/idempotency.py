@@ -0,0 +1,258 @@
+"""
+Idempotency-Key support for mutating requests.
+
+A client retrying a POST, PUT, PATCH or DELETE sends the same
+`Idempotency-Key` header with every attempt. The first attempt reserves the
+key and runs; its response (status, body, Content-Type and Location) is then
+stored for IDEMPOTENCY_TTL seconds, and later attempts get that response
+back, marked `Idempotent-Replayed: true`, without running the handler: no
+duplicate task, no second notification email, no query on the main tables.
+
+Keys are scoped to the caller (the user of the access token, if any), the
+method and the path, and stored as a hash. A retry with a different body
+gets 422, and one arriving while the first attempt still runs gets 409.
+Responses with a 5xx status are not stored, so the request can be retried.
+
+Records are shared by the worker processes, so that a retry reaching
+another worker is recognised too: by default (IDEMPOTENCY_BACKEND 'database')
+in the idempotency_record table of the primary database, which costs a
+query before and after each request carrying a key, or in Redis ('redis').
+'local' keeps them in an in-process LRU with TTL eviction (a single worker
+only).
+"""
+import hashlib
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, g, request
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.auth import current_identity
+from app.models.models import db, IdempotencyRecord
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+MUTATING_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+# Response headers stored with the body
+STORED_HEADERS = ('Content-Type', 'Location')
+
+# Records: (PENDING, fingerprint) while the first attempt runs, then
+# (DONE, fingerprint, status, body, headers)
+PENDING = 0
+DONE = 1
+
+class LocalStore:
+    """
+    Thread-safe in-process record store with a per-entry TTL
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def evict(self, now):
+        # Least recently written first, which is mostly the first to expire
+        while self.entries and (len(self.entries) > self.max_entries or next(iter(self.entries.values()))[0] < now):
+            self.entries.popitem(last=False)
+
+    def reserve(self, key, record, ttl):
+        """
+        Store `record` unless the key holds a live record
+
+        Returns:
+            tuple: The existing record, or None if `record` was stored
+        """
+        now = time.monotonic()
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None and item[0] >= now:
+                return item[1]
+            self.entries[key] = (now + ttl, record)
+            self.entries.move_to_end(key)
+            self.evict(now)
+            return None
+
+    def set(self, key, record, ttl):
+        now = time.monotonic()
+        with self.lock:
+            self.entries[key] = (now + ttl, record)
+            self.entries.move_to_end(key)
+            self.evict(now)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+class RedisStore:
+    """
+    Record store on a Redis server, shared by worker processes (requires the
+    `redis` package)
+    """
+
+    def __init__(self, url, prefix='synergysphere:idempotency:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def reserve(self, key, record, ttl):
+        name = self.prefix + key
+        while not self.client.set(name, pickle.dumps(record), nx=True, ex=max(int(ttl), 1)):
+            value = self.client.get(name)
+            # Unless it expired in between
+            if value is not None:
+                return pickle.loads(value)
+        return None
+
+    def set(self, key, record, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(record), ex=max(int(ttl), 1))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+class DatabaseStore:
+    """
+    Record store in the idempotency_record table of the primary database,
+    shared by worker processes
+    """
+
+    def __init__(self):
+        self.writes = 0
+
+    def values(self, record, ttl):
+        state, record_fingerprint, *response = record
+        status, body, headers = response or (None, None, None)
+        return {'fingerprint': record_fingerprint, 'state': state, 'status': status, 'body': body,
+                'headers': None if headers is None else json.dumps(headers), 'expires_at': time.time() + ttl}
+
+    def upsert(self, key, record, ttl, live=True):
+        """
+        Insert or overwrite the record for `key`; with `live` False, a live
+        record is kept
+
+        Returns:
+            bool: Whether the record was written
+        """
+        insert = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}[db.engine.dialect.name]
+        values = self.values(record, ttl)
+        statement = insert(IdempotencyRecord).values(key=key, **values).on_conflict_do_update(
+            index_elements=[IdempotencyRecord.key], set_=values,
+            where=None if live else IdempotencyRecord.expires_at < time.time()
+        )
+        with db.engine.begin() as connection:
+            written = connection.execute(statement).rowcount > 0
+            self.writes += 1
+            if self.writes % 1024 == 0:
+                connection.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < time.time()))
+        return written
+
+    def reserve(self, key, record, ttl):
+        while not self.upsert(key, record, ttl, live=False):
+            with db.engine.connect() as connection:
+                row = connection.execute(
+                    select(IdempotencyRecord).where(IdempotencyRecord.key == key,
+                                                    IdempotencyRecord.expires_at >= time.time())
+                ).first()
+            # Unless it expired in between
+            if row is not None:
+                if row.state == PENDING:
+                    return (PENDING, row.fingerprint)
+                return (DONE, row.fingerprint, row.status, row.body, json.loads(row.headers))
+        return None
+
+    def set(self, key, record, ttl):
+        self.upsert(key, record, ttl)
+
+    def delete(self, key):
+        with db.engine.begin() as connection:
+            connection.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key == key))
+
+def scoped_key(key):
+    identity = current_identity()
+    scope = f"{identity.user_id if identity else ''}\n{request.method}\n{request.path}\n{key}"
+    return hashlib.sha256(scope.encode()).hexdigest()[:32]
+
+def fingerprint():
+    return hashlib.sha256(request.get_data()).digest()[:16]
+
+def replay(record):
+    _, _, status, body, headers = record
+    return Response(body, status=status, headers=dict(headers, **{'Idempotent-Replayed': 'true'}))
+
+def check_request(store, lock_seconds):
+    """
+    Reserve the request's Idempotency-Key, or answer from its record
+
+    Returns:
+        A response for a retried request, or None to run the handler
+    """
+    key = request.headers.get(HEADER)
+    if key is None or request.method not in MUTATING_METHODS or not request.path.startswith('/api/'):
+        return None
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return {'message': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}, 400
+
+    scoped, request_fingerprint = scoped_key(key), fingerprint()
+    # The reservation expires on its own if this process dies before storing the response
+    record = store.reserve(scoped, (PENDING, request_fingerprint), lock_seconds)
+    if record is None:
+        g.idempotency = (scoped, request_fingerprint)
+        return None
+    if record[1] != request_fingerprint:
+        return {'message': f'{HEADER} was already used with a different request'}, 422
+    if record[0] == PENDING:
+        return {'message': f'A request with this {HEADER} is still being processed'}, 409
+    return replay(record)
+
+def store_response(store, ttl, response):
+    reserved = g.pop('idempotency', None)
+    if reserved is None:
+        return response
+    scoped, request_fingerprint = reserved
+    if response.status_code >= 500 or response.is_streamed:
+        # Not a result to repeat: let the client retry
+        store.delete(scoped)
+        return response
+    headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+    store.set(scoped, (DONE, request_fingerprint, response.status_code, response.get_data(), headers), ttl)
+    return response
+
+def release(store):
+    # An unhandled exception skipped store_response()
+    reserved = g.pop('idempotency', None)
+    if reserved is not None:
+        store.delete(reserved[0])
+
+def init_idempotency(app):
+    """
+    Install the Idempotency-Key hooks; call after init_auth(), which they rely on
+    """
+    if not app.config.get('IDEMPOTENCY_ENABLED', False):
+        return None
+    backend = app.config.get('IDEMPOTENCY_BACKEND', 'database')
+    if backend == 'database':
+        store = DatabaseStore()
+    elif backend == 'redis':
+        store = RedisStore(app.config['IDEMPOTENCY_REDIS_URL'])
+    else:
+        store = LocalStore(app.config.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+    app.extensions['idempotency'] = store
+    ttl = app.config.get('IDEMPOTENCY_TTL', 86400)
+    lock_seconds = app.config.get('IDEMPOTENCY_LOCK_SECONDS', 60)
+
+    @app.before_request
+    def check_idempotency_key():
+        return check_request(store, lock_seconds)
+
+    @app.after_request
+    def store_idempotent_response(response):
+        return store_response(store, ttl, response)
+
+    @app.teardown_request
+    def release_idempotency_key(exception):
+        release(store)
+
+    return store
@@ -1,12 +1,15 @@
-import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from flask import current_app
+import time
+from app.models.models import db, NotificationOutbox
+from app.metrics import NOTIFICATION_LATENCY
 
 def send_email(recipient_email, subject, body):
     """
-    Send an email notification using Gmail SMTP
+    Queue an email notification in the outbox
+    
+    The message is added to the current database session, so it is committed
+    in the same transaction as the change that triggered it. Delivery happens
+    later in the outbox worker (see app/api/outbox.py), which keeps the mail
+    server out of the request path.
     
     Args:
         recipient_email (str): Email address of the recipient
@@ -14,46 +17,17 @@ def send_email(recipient_email, subject, body):
         body (str): Body content of the email
     
     Returns:
-        bool: True if email sent successfully, False otherwise
-    """
-    try:
-        # Checking if email sending is enabled
-        if not current_app.config.get('MAIL_ENABLED', True):
-            current_app.logger.info(f"Email sending disabled. Would have sent to: {recipient_email}")
-            return True
-            
-        # Getting Gmail credentials from app config
-        smtp_username = current_app.config.get('SMTP_USERNAME')
-        smtp_password = current_app.config.get('SMTP_PASSWORD')
-        
-        if not smtp_username or not smtp_password:
-            current_app.logger.error("SMTP credentials not configured")
-            return False
-            
-        # Creating message
-        message = MIMEMultipart()
-        message['From'] = smtp_username
-        message['To'] = recipient_email
-        message['Subject'] = subject
-        
-        # Attaching body
-        message.attach(MIMEText(body, 'plain'))
-        
-        # Connecting to Gmail SMTP server
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()  # Upgrade to secure connection
-        server.login(smtp_username, smtp_password)
-        
-        # Sending email
-        server.send_message(message)
-        server.quit()
-        
-        current_app.logger.info(f"Email sent to {recipient_email}")
-        return True
-        
-    except Exception as e:
-        current_app.logger.error(f"Failed to send email: {str(e)}")
-        return False
+        NotificationOutbox: The queued outbox entry
+    """
+    started = time.perf_counter()
+    message = NotificationOutbox(
+        recipient=recipient_email,
+        subject=subject,
+        body=body
+    )
+    db.session.add(message)
+    NOTIFICATION_LATENCY.observe(time.perf_counter() - started, stage='enqueue')
+    return message
 
 def notify_task_assignment(user_email, task_title, project_name):
     """
@@ -115,3 +89,62 @@ def notify_task_status_change(user_email, task_title, old_status, new_status):
     """
     
     return send_email(user_email, subject, body)
+
+def notify_task_digest(user_email, changes):
+    """
+    Send a single digest notification covering several task changes
+    
+    Args:
+        user_email (str): Email address of the assignee
+        changes (list): Human-readable lines, one per task change
+    """
+    subject = f"Task Updates ({len(changes)})"
+    lines = "\n".join(f"    - {change}" for change in changes)
+    body = f"""
+    Dear Team Member,
+    
+    The following tasks assigned to you have been created or updated:
+    
+{lines}
+    
+    Please log in to the application to view more details.
+    
+    Regards,
+    Project Management Team
+    """
+    
+    return send_email(user_email, subject, body)
+
+def notify_due_reminder(user_email, due_soon, overdue, more=0):
+    """
+    Send one reminder covering all of a user's tasks that are due soon or overdue
+    
+    Args:
+        user_email (str): Email address of the assignee
+        due_soon (list): Human-readable lines for tasks due soon
+        overdue (list): Human-readable lines for overdue tasks
+        more (int): Number of further tasks left out of the email
+    """
+    subject = f"Task Reminder ({len(due_soon) + len(overdue) + more})"
+    sections = []
+    if overdue:
+        sections.append("Overdue:\n" + "\n".join(f"    - {line}" for line in overdue))
+    if due_soon:
+        sections.append("Due soon:\n" + "\n".join(f"    - {line}" for line in due_soon))
+    if more:
+        sections.append(f"... and {more} more.")
+    lines = "\n\n    ".join(sections)
+    body = f"""
+    Dear Team Member,
+    
+    The following tasks assigned to you need your attention:
+    
+    {lines}
+    
+    Please log in to the application to view more details.
+    
+    Regards,
+    Project Management Team
+    """
+    
+    return send_email(user_email, subject, body)
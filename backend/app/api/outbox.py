@@ -0,0 +1,216 @@
+import smtplib
+import threading
+import time
+import uuid
+from datetime import timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from sqlalchemy import and_, or_, select, update
+from app.models.models import db, NotificationOutbox, utcnow
+from app.metrics import NOTIFICATION_LATENCY
+
+class SMTPConnection:
+    """
+    Long-lived SMTP connection owned by a single outbox worker thread.
+
+    The connection is opened lazily, reused across batches and closed again
+    once it has been idle for longer than SMTP_IDLE_TIMEOUT seconds.
+    """
+
+    def __init__(self, config):
+        self.host = config.get('SMTP_HOST', 'smtp.gmail.com')
+        self.port = config.get('SMTP_PORT', 587)
+        self.use_tls = config.get('SMTP_USE_TLS', True)
+        self.username = config.get('SMTP_USERNAME')
+        self.password = config.get('SMTP_PASSWORD')
+        self.timeout = config.get('SMTP_TIMEOUT', 10)
+        self.idle_timeout = config.get('SMTP_IDLE_TIMEOUT', 60)
+        self.sender = config.get('MAIL_DEFAULT_SENDER') or self.username
+        self.server = None
+        self.last_used = 0.0
+
+    def connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()  # Upgrade to secure connection
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self.server = server
+
+    def ensure_connected(self):
+        if self.server is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            self.close()
+        if self.server is None:
+            self.connect()
+
+    def send(self, recipient_email, subject, body):
+        message = MIMEMultipart()
+        message['From'] = self.sender or ''
+        message['To'] = recipient_email
+        message['Subject'] = subject
+        message.attach(MIMEText(body, 'plain'))
+
+        self.ensure_connected()
+        try:
+            self.server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle connection; reconnect once and retry
+            self.close()
+            self.connect()
+            self.server.send_message(message)
+        self.last_used = time.monotonic()
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            pass
+        self.server = None
+
+def claim_batch(limit, lease_seconds):
+    """
+    Atomically claim up to `limit` due outbox entries for one worker
+
+    Entries stuck in SENDING for longer than `lease_seconds` (e.g. after a
+    crash) are claimed again. Claiming counts an attempt, so an entry that
+    crashes its worker every time still reaches OUTBOX_MAX_ATTEMPTS.
+
+    Returns:
+        list: The claimed NotificationOutbox rows
+    """
+    now = utcnow()
+    token = uuid.uuid4().hex
+    claimable = or_(
+        and_(NotificationOutbox.status == 'PENDING', NotificationOutbox.next_attempt_at <= now),
+        and_(NotificationOutbox.status == 'SENDING', NotificationOutbox.claimed_at < now - timedelta(seconds=lease_seconds))
+    )
+    due_ids = (
+        select(NotificationOutbox.id)
+        .where(claimable)
+        .order_by(NotificationOutbox.id)
+        .limit(limit)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(NotificationOutbox)
+        .where(NotificationOutbox.id.in_(due_ids), claimable)
+        .values(status='SENDING', claim_token=token, claimed_at=now, attempts=NotificationOutbox.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return NotificationOutbox.query.filter_by(claim_token=token, status='SENDING').order_by(NotificationOutbox.id).all()
+
+def retry_delay(attempts, base_seconds, max_seconds):
+    # Exponential backoff: base, 2*base, 4*base, ... capped at max_seconds
+    return min(base_seconds * (2 ** (attempts - 1)), max_seconds)
+
+class OutboxWorker:
+    """
+    Background pool that drains the notification outbox.
+
+    Each worker thread owns one SMTPConnection and sends a whole claimed
+    batch over it. Failed messages are retried with exponential backoff
+    until OUTBOX_MAX_ATTEMPTS is reached, after which they are marked FAILED.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.workers = config.get('OUTBOX_WORKERS', 2)
+        self.batch_size = config.get('OUTBOX_BATCH_SIZE', 20)
+        self.poll_interval = config.get('OUTBOX_POLL_INTERVAL', 1.0)
+        self.lease_seconds = config.get('OUTBOX_LEASE_SECONDS', 300)
+        self.max_attempts = config.get('OUTBOX_MAX_ATTEMPTS', 5)
+        self.retry_base = config.get('OUTBOX_RETRY_BASE_SECONDS', 30)
+        self.retry_max = config.get('OUTBOX_RETRY_MAX_SECONDS', 3600)
+        self.threads = []
+        self.stopping = threading.Event()
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self.run, name=f'outbox-worker-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=5):
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def run(self):
+        connection = SMTPConnection(self.app.config)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    sent = self.drain_once(connection)
+                except Exception as e:
+                    self.app.logger.error(f"Outbox worker error: {str(e)}")
+                    sent = 0
+                # Keep going without sleeping while there is a backlog
+                if sent < self.batch_size:
+                    self.stopping.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def drain_once(self, connection):
+        """
+        Claim and deliver one batch
+
+        Returns:
+            int: Number of entries processed
+        """
+        with self.app.app_context():
+            try:
+                batch = claim_batch(self.batch_size, self.lease_seconds)
+                if batch:
+                    self.deliver(connection, batch)
+                return len(batch)
+            finally:
+                db.session.remove()
+
+    def deliver(self, connection, batch):
+        mail_enabled = self.app.config.get('MAIL_ENABLED', True)
+        for message in batch:
+            if message.attempts > self.max_attempts:
+                # Claimed again after its worker died while sending it, each time
+                message.status = 'FAILED'
+                message.claim_token = None
+                self.app.logger.error(f"Giving up on email to {message.recipient}: {message.last_error}")
+                continue
+            try:
+                if mail_enabled:
+                    started = time.perf_counter()
+                    connection.send(message.recipient, message.subject, message.body)
+                    NOTIFICATION_LATENCY.observe(time.perf_counter() - started, stage='deliver')
+                    self.app.logger.info(f"Email sent to {message.recipient}")
+                else:
+                    self.app.logger.info(f"Email sending disabled. Would have sent to: {message.recipient}")
+                message.status = 'SENT'
+                message.sent_at = utcnow()
+                message.last_error = None
+            except Exception as e:
+                # Drop the connection so the next message starts from a clean session
+                connection.close()
+                message.last_error = str(e)
+                if message.attempts >= self.max_attempts:
+                    message.status = 'FAILED'
+                    self.app.logger.error(f"Giving up on email to {message.recipient}: {str(e)}")
+                else:
+                    message.status = 'PENDING'
+                    message.next_attempt_at = utcnow() + timedelta(
+                        seconds=retry_delay(message.attempts, self.retry_base, self.retry_max))
+                    self.app.logger.warning(f"Failed to send email to {message.recipient}, will retry: {str(e)}")
+            message.claim_token = None
+        db.session.commit()
+
+def start_outbox_worker(app):
+    """
+    Start the outbox worker pool for `app` and register it as an extension
+    """
+    worker = OutboxWorker(app)
+    worker.start()
+    app.extensions['outbox_worker'] = worker
+    return worker
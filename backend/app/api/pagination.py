@@ -0,0 +1,150 @@
+import base64
+import json
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import and_, or_
+from app.api.serializers import SCHEMAS
+from app.routing import SHARDED_TABLES, shard_rows
+
+class QueryArgumentError(ValueError):
+    """
+    Raised when a list endpoint receives an invalid query-string argument
+    """
+
+def parse_datetime(value):
+    """
+    Parse an ISO 8601 timestamp into the naive UTC form stored in the database
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise QueryArgumentError(f"Invalid date: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise QueryArgumentError(f"'{name}' must be an integer")
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise QueryArgumentError('Invalid cursor')
+    # Values are compared with columns as they are, so their types are checked here
+    if not isinstance(values, dict) or type(values.get('id')) is not int:
+        raise QueryArgumentError('Invalid cursor')
+    return values
+
+def parse_fields(args, default_fields):
+    """
+    Resolve the `fields=` projection against the columns a resource exposes
+
+    Returns:
+        list: Requested field names, in the order they were asked for
+    """
+    raw = args.get('fields')
+    if not raw:
+        return list(default_fields)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in default_fields]
+    if unknown:
+        raise QueryArgumentError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def apply_in_filter(query, column, raw):
+    values = [value.strip() for value in raw.split(',') if value.strip()]
+    return query.filter(column.in_(values)) if values else query
+
+def apply_int_filter(query, column, raw, name):
+    # 'none' matches rows where the column is NULL (e.g. unassigned tasks)
+    if raw.lower() == 'none':
+        return query.filter(column.is_(None))
+    return query.filter(column == parse_int(raw, name))
+
+def apply_range_filter(query, column, after=None, before=None):
+    if after:
+        query = query.filter(column >= parse_datetime(after))
+    if before:
+        query = query.filter(column < parse_datetime(before))
+    return query
+
+def serialize_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def parse_limit(args):
+    # Page size from `limit`, defaulting to PAGE_SIZE_DEFAULT and capped at PAGE_SIZE_MAX
+    default_limit = current_app.config.get('PAGE_SIZE_DEFAULT', 100)
+    max_limit = current_app.config.get('PAGE_SIZE_MAX', 1000)
+    limit = parse_int(args.get('limit', default_limit), 'limit')
+    if limit < 1:
+        raise QueryArgumentError("'limit' must be positive")
+    return min(limit, max_limit)
+
+def keyset_page(query, model, args, fields):
+    """
+    Fetch one page of `query` using keyset pagination on `id` or `created_at`
+
+    Only the columns listed in `fields` (plus the sort key) are loaded, so the
+    cost of a page depends on the page size rather than on the table size.
+
+    Query-string arguments:
+        limit: Page size (PAGE_SIZE_DEFAULT, capped at PAGE_SIZE_MAX)
+        sort: 'id' (default) or 'created_at'
+        cursor: Opaque value returned in the X-Next-Cursor header
+
+    Returns:
+        tuple: (list of dicts, next cursor or None)
+    """
+    limit = parse_limit(args)
+
+    sort = args.get('sort', 'id')
+    sortable = ('id', 'created_at') if hasattr(model, 'created_at') else ('id',)
+    if sort not in sortable:
+        raise QueryArgumentError(f"'sort' must be one of: {', '.join(sortable)}")
+    sort_keys = ['id'] if sort == 'id' else ['created_at', 'id']
+
+    cursor = args.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if sort == 'id':
+            query = query.filter(model.id > position['id'])
+        else:
+            if 'created_at' not in position:
+                raise QueryArgumentError('Cursor does not match sort order')
+            created_at = parse_datetime(position['created_at'])
+            query = query.filter(or_(
+                model.created_at > created_at,
+                and_(model.created_at == created_at, model.id > position['id'])
+            ))
+
+    selected = list(dict.fromkeys(fields + sort_keys))
+    page = (
+        query.with_entities(*[getattr(model, name) for name in selected])
+        .order_by(*[getattr(model, key) for key in sort_keys])
+        .limit(limit + 1)
+    )
+    if model.__tablename__ in SHARDED_TABLES:
+        # Without a selected shard, each shard returns a page and the pages are merged
+        rows = shard_rows(page.statement, key=lambda row: tuple(row._mapping[key] for key in sort_keys))[:limit + 1]
+    else:
+        rows = page.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor({key: serialize_value(last[key]) for key in sort_keys})
+
+    return SCHEMAS[model].dump_rows(rows, fields), next_cursor
+
+def page_headers(next_cursor):
+    return {'X-Next-Cursor': next_cursor} if next_cursor else {}
@@ -0,0 +1,219 @@
+"""
+Due-date reminders.
+
+A run finds the tasks that are due within the next REMINDER_WINDOW_HOURS, or
+became overdue during the last REMINDER_OVERDUE_DAYS. It queues one digest
+email per assignee through the notification outbox and records each reminded
+task in `reminder_log`, in the same transaction, so a task is reminded about
+once per due date (and once more when it becomes overdue) however often the
+scheduler runs.
+
+Pending tasks are read in pages of REMINDER_BATCH_SIZE rows, in (assignee_id,
+due_date, id) order, with a commit per page. Each page seeks the covering
+index on (assignee_id, due_date, id, ...) to where the previous one ended, so
+a run reads the index once instead of sorting the due window for every page
+(see pending_select). An assignee whose tasks run past the end of a page keeps
+one digest: it is queued, and its tasks logged, with the page where they end,
+so memory use depends on the page size and the largest digest rather than on
+the number of due tasks. With sharding, each shard is processed in turn.
+"""
+import threading
+from datetime import timedelta
+from sqlalchemy import and_, case, delete, exists, func, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from app.models.models import db, Project, ReminderLog, Task, User, utcnow
+from app.api.notifications import notify_due_reminder
+from app.routing import on_each_shard
+
+DONE = 'DONE'
+
+def reminder_window(now, window_hours, overdue_days):
+    return now - timedelta(days=overdue_days), now + timedelta(hours=window_hours)
+
+def due_tasks(start, end):
+    return and_(
+        Task.due_date >= start, Task.due_date < end,
+        Task.assignee_id.is_not(None), Task.status.is_distinct_from(DONE)
+    )
+
+def count_due_assignees(start, end):
+    return db.session.scalar(select(func.count(Task.assignee_id.distinct())).where(due_tasks(start, end)))
+
+def pending_select(start, end, now, after=None):
+    """
+    Due tasks without a reminder of the current kind for their due date,
+    after the (assignee_id, due_date, id) position `after` (before every
+    assignee when None), in that order
+
+    The position is compared as a row value, which SQLite (without
+    statistics, as well) turns into a seek on the covering index
+    ix_task_assignee_id_due_date_covering, so the index gives the order and
+    a page reads on from where the previous one ended. Without a lower bound
+    on assignee_id, SQLite would rather range-scan ix_task_due_date and sort
+    the whole due window for every page.
+    """
+    kind = case((Task.due_date < now, 'overdue'), else_='due_soon')
+    already_sent = exists().where(
+        ReminderLog.task_id == Task.id, ReminderLog.kind == kind, ReminderLog.due_date == Task.due_date
+    )
+    if after is None:
+        # User IDs are positive
+        after = (0, start, 0)
+    return (
+        select(Task.id, Task.title, Task.due_date, Task.assignee_id, kind.label('kind'),
+               Project.name.label('project_name'))
+        .join(Project, Project.id == Task.project_id)
+        .where(due_tasks(start, end), ~already_sent,
+               tuple_(Task.assignee_id, Task.due_date, Task.id) > tuple_(*after))
+        .order_by(Task.assignee_id, Task.due_date, Task.id)
+    )
+
+def pending_reminders(start, end, now, after, limit):
+    """
+    Next `limit` rows of pending_select()
+
+    Users may live in another database than tasks, so emails are looked up
+    separately.
+    """
+    return db.session.execute(pending_select(start, end, now, after).limit(limit)).all()
+
+class Digest:
+    """
+    One assignee's reminder email, collected over one or more pages: the
+    first `max_tasks` rows are listed, the others only counted and logged
+    """
+
+    def __init__(self, assignee_id, max_tasks):
+        self.assignee_id = assignee_id
+        self.max_tasks = max_tasks
+        self.listed = []
+        self.more = 0
+        self.logged = []
+
+    def add(self, row):
+        if len(self.listed) < self.max_tasks:
+            self.listed.append(row)
+        else:
+            self.more += 1
+        self.logged.append({'task_id': row.id, 'kind': row.kind, 'due_date': row.due_date,
+                            'assignee_id': row.assignee_id})
+
+def queue_reminders(digests):
+    """
+    Queue one email per digest and log every task it covers
+
+    Returns:
+        int: Number of tasks covered
+    """
+    emails = dict(db.session.execute(
+        select(User.id, User.email).where(User.id.in_([digest.assignee_id for digest in digests]))
+    ).all())
+    for digest in digests:
+        lines = {'due_soon': [], 'overdue': []}
+        for row in digest.listed:
+            lines[row.kind].append(f"{row.title} ({row.project_name}), due {row.due_date:%Y-%m-%d %H:%M} UTC")
+        notify_due_reminder(emails[digest.assignee_id], lines['due_soon'], lines['overdue'], digest.more)
+    logged = [entry for digest in digests for entry in digest.logged]
+    db.session.execute(insert(ReminderLog), logged)
+    return len(logged)
+
+def send_due_reminders(config, now=None):
+    """
+    Queue reminder digests for every assignee with due or overdue tasks
+
+    Returns:
+        dict: Counts of assignees, emails and tasks processed
+    """
+    now = now or utcnow()
+    window_hours = config.get('REMINDER_WINDOW_HOURS', 24)
+    overdue_days = config.get('REMINDER_OVERDUE_DAYS', 7)
+    batch_size = config.get('REMINDER_BATCH_SIZE', 500)
+    max_tasks = config.get('REMINDER_MAX_TASKS_PER_EMAIL', 50)
+    start, end = reminder_window(now, window_hours, overdue_days)
+
+    totals = {'assignees': 0, 'emails': 0, 'tasks': 0}
+    for shard_totals in on_each_shard(lambda: send_shard_reminders(now, start, end, batch_size, max_tasks)):
+        for key, value in shard_totals.items():
+            totals[key] += value
+    return totals
+
+def send_shard_reminders(now, start, end, batch_size, max_tasks):
+    totals = {'assignees': count_due_assignees(start, end), 'emails': 0, 'tasks': 0}
+    after, current = None, None
+    while True:
+        rows = pending_reminders(start, end, now, after, batch_size)
+        complete = []
+        for row in rows:
+            if current is None or current.assignee_id != row.assignee_id:
+                if current is not None:
+                    complete.append(current)
+                current = Digest(row.assignee_id, max_tasks)
+            current.add(row)
+        last_page = len(rows) < batch_size
+        if last_page and current is not None:
+            complete.append(current)
+            current = None
+        if rows:
+            after = (rows[-1].assignee_id, rows[-1].due_date, rows[-1].id)
+        if complete:
+            try:
+                totals['tasks'] += queue_reminders(complete)
+                db.session.commit()
+                totals['emails'] += len(complete)
+            except IntegrityError:
+                # Another process reminded some of these tasks first; it sent their emails
+                db.session.rollback()
+        if last_page:
+            break
+
+    # Reminders for due dates before the window can never be sent again
+    db.session.execute(delete(ReminderLog).where(ReminderLog.due_date < start))
+    db.session.commit()
+    return totals
+
+class ReminderScheduler:
+    """
+    Background thread running send_due_reminders() every
+    REMINDER_INTERVAL_SECONDS
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config.get('REMINDER_INTERVAL_SECONDS', 900)
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='reminder-scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            self.run_once()
+
+    def run_once(self):
+        with self.app.app_context():
+            try:
+                totals = send_due_reminders(self.app.config)
+                if totals['emails']:
+                    self.app.logger.info(
+                        f"Queued {totals['emails']} reminder emails covering {totals['tasks']} tasks")
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Reminder scheduler error: {str(e)}")
+            finally:
+                db.session.remove()
+
+def start_reminder_scheduler(app):
+    """
+    Start the reminder scheduler for `app` and register it as an extension
+    """
+    scheduler = ReminderScheduler(app)
+    scheduler.start()
+    app.extensions['reminder_scheduler'] = scheduler
+    return scheduler
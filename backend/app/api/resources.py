@@ -1,11 +1,65 @@
-from flask import jsonify, request, g  
+from flask import request, current_app
 from flask_restful import Resource, Api  
 from datetime import datetime
-from app.models.models import db, Project, Task, Team, User, team_members
-from app import app
+from app.models.models import db, Activity, BackgroundJob, Project, ReminderLog, Task, Team, User, team_members
 from app.api.notifications import notify_task_assignment, notify_team_addition, notify_task_status_change
+from app.api.pagination import (QueryArgumentError, parse_fields, parse_int, keyset_page, page_headers, decode_cursor,
+                                apply_in_filter, apply_int_filter, apply_range_filter)
+from app.api.export import stream_export
+from app.api.bulk import (BulkValidationError, validate_operations, apply_operations, operation_shards,
+                          publish_bulk_events)
+from app.api.cache import cached, invalidate
+from app.api.serializers import output_json, job_schema, project_schema, task_schema, team_schema, user_schema
+from app.api.events import TooManyStreams, events_enabled, publish_event, stream_events
+from app.api.search import search_projects, search_tasks
+from app.api.assignments import assigned_tasks
+from app.api.activity import activity_page, field_changes, record_activity
+from app.api.coalescing import coalesce_update
+from app.api.deletion import delete_project, delete_team, start_job
+from app.api.sync import sync_changes
+from app.api.stats import project_stats, record_task_change, stats_key, user_stats
+from app.database import query_budget
+from app.routing import (related_loader, select_shard, shard_for_team, shard_of, shard_rows, sharded,
+                         use_primary)
+from app.passwords import PasswordHasherBusy, get_hasher
+from app.auth import AuthError, current_identity, get_tokens, login_required, team_access_denied
+from sqlalchemy import delete, select, exists
+from sqlalchemy.orm import joinedload
 
-api = Api(app)
+api = Api()
+api.representation('application/json')(output_json)
+
+# Columns that list endpoints can return through `fields=`
+PROJECT_FIELDS = project_schema.fields
+TEAM_FIELDS = team_schema.fields
+TASK_FIELDS = task_schema.fields
+TASK_UPDATE_FIELDS = ('title', 'description', 'status', 'due_date', 'assignee_id')
+
+def parse_flag(args, name):
+    return args.get(name, 'false').lower() in ('1', 'true')
+
+def run_deletion(kind, target_id, message):
+    # ?archive=true keeps copies of the deleted rows, ?background=true returns a job to poll
+    archive = parse_flag(request.args, 'archive')
+    if parse_flag(request.args, 'background'):
+        job = start_job(kind, target_id, archive)
+        return job_schema.dump(job), 202, {'Location': f'/api/jobs/{job.id}'}
+    deleted = (delete_project if kind == 'delete_project' else delete_team)(target_id, archive)
+    return {'message': message, 'tasks_deleted': deleted}, 200
+
+def task_changes(data):
+    # The fields of a task update present in the request body
+    changes = {name: data[name] for name in TASK_UPDATE_FIELDS if name in data}
+    if 'due_date' in changes:
+        changes['due_date'] = datetime.fromisoformat(changes['due_date']) if changes['due_date'] else None
+    return changes
+
+def select_filter_shard(args):
+    # A project or team filter only needs the shard holding that project or team
+    if args.get('project_id', '').isdigit():
+        select_shard(shard_of(int(args['project_id'])))
+    elif args.get('team_id', '').isdigit():
+        select_shard(shard_for_team(int(args['team_id'])))
 
 class UserRegistration(Resource):
     def post(self):
@@ -17,55 +71,109 @@ class UserRegistration(Resource):
         try:
             new_user = User(
                 email=data['email'],
-                password=data['password'],
+                password=get_hasher().hash(data['password']),
                 name=data['name']
             )
             db.session.add(new_user)
             db.session.commit()
             return {'message': 'User created successfully'}, 201
+        except PasswordHasherBusy as e:
+            return {'message': str(e)}, 503, {'Retry-After': '1'}
         except Exception as e:
             return {'message': str(e)}, 500
 
+def user_team_ids(user_id):
+    return db.session.execute(
+        select(team_members.c.team_id).where(team_members.c.user_id == user_id)
+    ).scalars().all()
+
 class UserLogin(Resource):
     def post(self):
         data = request.get_json()
         
         user = User.query.filter_by(email=data['email']).first()
         
-        if user and user.password == data['password']:
-            return {'message': 'Login successful'}, 200
+        hasher = get_hasher()
+        try:
+            matches, needs_rehash = hasher.verify(user.password if user else None, data['password'])
+            if matches and needs_rehash:
+                # Upgrade plain or lower-cost hashes to the configured work factor
+                user.password = hasher.hash(data['password'])
+                db.session.commit()
+        except PasswordHasherBusy as e:
+            return {'message': str(e)}, 503, {'Retry-After': '1'}
+        
+        if matches:
+            tokens = get_tokens().issue(user.id, user_team_ids(user.id))
+            return dict(tokens, message='Login successful'), 200
         
         return {'message': 'Invalid credentials'}, 401
 
+class TokenRefresh(Resource):
+    def post(self):
+        data = request.get_json() or {}
+        tokens = get_tokens()
+        
+        try:
+            payload = tokens.verify_refresh(data.get('refresh_token', ''))
+        except AuthError as e:
+            return {'message': str(e)}, 401
+        
+        user = db.session.get(User, payload['uid'])
+        if not user:
+            return {'message': 'User not found'}, 401
+        
+        # Refresh tokens are single use
+        tokens.revoke_refresh(payload)
+        return tokens.issue(user.id, user_team_ids(user.id)), 200
+
+class UserLogout(Resource):
+    @login_required
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        tokens = get_tokens()
+        tokens.revoke_access(current_identity())
+        if data.get('refresh_token'):
+            try:
+                tokens.revoke_refresh(tokens.verify_refresh(data['refresh_token']))
+            except AuthError:
+                pass
+        return {'message': 'Logged out'}, 200
+
+class CurrentUser(Resource):
+    @login_required
+    def get(self):
+        # Answered from the token alone, without a database query
+        identity = current_identity()
+        return {'id': identity.user_id, 'team_ids': sorted(identity.team_ids)}, 200
+
 class ProjectResource(Resource):
+    @cached(lambda project_id=None: [f'project:{project_id}'] if project_id else ['projects'])
+    @query_budget(1)
     def get(self, project_id=None):
         if project_id:
-            project = Project.query.get(project_id)
-            if not project:
+            row = db.session.execute(project_schema.select().where(Project.id == project_id)).first()
+            if not row:
                 return {'message': 'Project not found'}, 404
             
-            return {
-                'id': project.id,
-                'name': project.name,
-                'description': project.description,
-                'created_at': project.created_at.isoformat(),
-                'team_id': project.team_id
-            }, 200
+            return project_schema.dump_row(row), 200
         else:
-            projects = Project.query.all()
-            result = []
-            for project in projects:
-                result.append({
-                    'id': project.id,
-                    'name': project.name,
-                    'description': project.description,
-                    'created_at': project.created_at.isoformat(),
-                    'team_id': project.team_id
-                })
-            return result, 200
+            try:
+                fields = parse_fields(request.args, PROJECT_FIELDS)
+                select_filter_shard(request.args)
+                query = Project.query
+                if request.args.get('team_id'):
+                    query = apply_int_filter(query, Project.team_id, request.args['team_id'], 'team_id')
+                result, next_cursor = keyset_page(query, Project, request.args, fields)
+            except QueryArgumentError as e:
+                return {'message': str(e)}, 400
+            return result, 200, page_headers(next_cursor)
     
     def post(self):
         data = request.get_json()
+        denied = team_access_denied(data.get('team_id'))
+        if denied:
+            return denied
         
         try:
             new_project = Project(
@@ -74,14 +182,14 @@ class ProjectResource(Resource):
                 team_id=data['team_id']
             )
             db.session.add(new_project)
+            record_activity('project.created', new_project.team_id, new_project, changes={'name': new_project.name})
+            invalidate('projects')
+            # Flushed for the ID and defaults; serialized before commit to skip reloading it
+            db.session.flush()
+            result = project_schema.dump(new_project)
+            publish_event('project.created', result, result['id'], [result['team_id']])
             db.session.commit()
-            return {
-                'id': new_project.id,
-                'name': new_project.name,
-                'description': new_project.description,
-                'created_at': new_project.created_at.isoformat(),
-                'team_id': new_project.team_id
-            }, 201
+            return result, 201
         except Exception as e:
             return {'message': str(e)}, 500
     
@@ -91,8 +199,17 @@ class ProjectResource(Resource):
             return {'message': 'Project not found'}, 404
         
         data = request.get_json()
+        old_team_id = project.team_id
+        # Moving a project needs membership of both teams
+        for team_id in {old_team_id, data.get('team_id', old_team_id)}:
+            denied = team_access_denied(team_id)
+            if denied:
+                return denied
+        if isinstance(data.get('team_id'), int) and shard_for_team(data['team_id']) != shard_for_team(old_team_id):
+            return {'message': 'Cannot move a project to a team on another database shard'}, 400
         
         try:
+            old_values = {'name': project.name, 'description': project.description, 'team_id': old_team_id}
             if 'name' in data:
                 project.name = data['name']
             if 'description' in data:
@@ -100,55 +217,64 @@ class ProjectResource(Resource):
             if 'team_id' in data:
                 project.team_id = data['team_id']
             
+            changes = field_changes(old_values, {name: data[name] for name in old_values if name in data})
+            if changes:
+                record_activity('project.updated', project.team_id, project_id, changes=changes)
+                if project.team_id != old_team_id:
+                    # Also in the feed of the team it left
+                    record_activity('project.updated', old_team_id, project_id, changes=changes)
+            invalidate('projects', f'project:{project_id}')
+            result = project_schema.dump(project)
+            # A project moved to another team is announced to both teams
+            publish_event('project.updated', result, project_id, [old_team_id, result['team_id']])
             db.session.commit()
-            return {
-                'id': project.id,
-                'name': project.name,
-                'description': project.description,
-                'created_at': project.created_at.isoformat(),
-                'team_id': project.team_id
-            }, 200
+            return result, 200
         except Exception as e:
             return {'message': str(e)}, 500
     
     def delete(self, project_id):
-        project = Project.query.get(project_id)
-        if not project:
+        team_id = db.session.scalar(select(Project.team_id).where(Project.id == project_id))
+        if team_id is None:
             return {'message': 'Project not found'}, 404
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
         
+        # Tasks are deleted in chunks with SQL statements, see app/api/deletion.py
         try:
-            db.session.delete(project)
-            db.session.commit()
-            return {'message': 'Project deleted successfully'}, 200
+            return run_deletion('delete_project', project_id, 'Project deleted successfully')
         except Exception as e:
+            db.session.rollback()
             return {'message': str(e)}, 500
 
 class TeamResource(Resource):
+    @cached(lambda team_id=None: [f'team:{team_id}'] if team_id else ['teams'])
+    @query_budget(2)
     def get(self, team_id=None):
         if team_id:
-            team = Team.query.get(team_id)
-            if not team:
+            row = db.session.execute(team_schema.select().where(Team.id == team_id)).first()
+            if not row:
                 return {'message': 'Team not found'}, 404
             
-            members = [{'id': user.id, 'name': user.name, 'email': user.email} 
-                      for user in team.members]
+            # One query for the member columns instead of iterating the dynamic relationship
+            member_rows = db.session.execute(
+                user_schema.select()
+                .join(team_members, team_members.c.user_id == User.id)
+                .where(team_members.c.team_id == team_id)
+                .order_by(User.id)
+            )
             
-            return {
-                'id': team.id,
-                'name': team.name,
-                'leader_id': team.leader_id,
-                'members': members
-            }, 200
+            return dict(team_schema.dump_row(row), members=user_schema.dump_rows(member_rows)), 200
         else:
-            teams = Team.query.all()
-            result = []
-            for team in teams:
-                result.append({
-                    'id': team.id,
-                    'name': team.name,
-                    'leader_id': team.leader_id
-                })
-            return result, 200
+            try:
+                fields = parse_fields(request.args, TEAM_FIELDS)
+                query = Team.query
+                if request.args.get('leader_id'):
+                    query = apply_int_filter(query, Team.leader_id, request.args['leader_id'], 'leader_id')
+                result, next_cursor = keyset_page(query, Team, request.args, fields)
+            except QueryArgumentError as e:
+                return {'message': str(e)}, 400
+            return result, 200, page_headers(next_cursor)
     
     def post(self):
         data = request.get_json()
@@ -159,23 +285,64 @@ class TeamResource(Resource):
                 leader_id=data['leader_id']
             )
             db.session.add(new_team)
+            record_activity('team.created', new_team, changes={'name': new_team.name})
+            invalidate('teams')
             db.session.commit()
             
             leader = User.query.get(data['leader_id'])
             if leader:
+                leader_id = leader.id
                 new_team.members.append(leader)
+                invalidate('teams')
+                get_tokens().revoke_user(leader_id, db.session)
                 db.session.commit()
             
-            return {
-                'id': new_team.id,
-                'name': new_team.name,
-                'leader_id': new_team.leader_id
-            }, 201
+            return team_schema.dump(new_team), 201
         except Exception as e:
             return {'message': str(e)}, 500
+    
+    def delete(self, team_id):
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
+        
+        leader_id = db.session.scalar(select(Team.leader_id).where(Team.id == team_id))
+        if leader_id is None:
+            return {'message': 'Team not found'}, 404
+        
+        identity = current_identity()
+        if identity and identity.user_id != leader_id:
+            return {'message': 'Only the team leader can delete the team'}, 403
+        
+        try:
+            return run_deletion('delete_team', team_id, 'Team deleted successfully')
+        except Exception as e:
+            db.session.rollback()
+            return {'message': str(e)}, 500
+
+class JobResource(Resource):
+    # Progress is written by the job's thread, possibly moments ago
+    @use_primary
+    @query_budget(1)
+    def get(self, job_id):
+        row = db.session.execute(job_schema.select().where(BackgroundJob.id == job_id)).first()
+        if not row:
+            return {'message': 'Job not found'}, 404
+        return job_schema.dump_row(row), 200
+
+def is_team_member(team_id, user_id):
+    # Targeted EXISTS check instead of loading the whole membership list
+    return db.session.query(
+        exists().where(team_members.c.team_id == team_id, team_members.c.user_id == user_id)
+    ).scalar()
 
 class TeamMemberResource(Resource):
+    @query_budget(8)
     def post(self, team_id):
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
+        
         team = Team.query.get(team_id)
         if not team:
             return {'message': 'Team not found'}, 404
@@ -190,21 +357,32 @@ class TeamMemberResource(Resource):
         if not user:
             return {'message': 'User not found'}, 404
         
-        if user in team.members:
+        if is_team_member(team_id, user.id):
             return {'message': 'User is already a member of this team'}, 400
         
         try:
             team.members.append(user)
-            db.session.commit()
             
-            # Sending notification email to the user
+            # Queueing notification email to the user in the same transaction
             notify_team_addition(user.email, team.name)
+            member_id = user.id
+            record_activity('member.added', team_id, changes={'user_id': member_id, 'name': user.name})
+            invalidate(f'team:{team_id}')
+            # The user's tokens list their teams; make them refresh
+            get_tokens().revoke_user(member_id, db.session)
+            publish_event('team.member_added', {'team_id': team_id, 'user_id': member_id}, team_ids=[team_id])
+            db.session.commit()
             
             return {'message': 'User added to team successfully'}, 200
         except Exception as e:
             return {'message': str(e)}, 500
     
+    @query_budget(7)
     def delete(self, team_id, user_id):
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
+        
         team = Team.query.get(team_id)
         if not team:
             return {'message': 'Team not found'}, 404
@@ -213,7 +391,7 @@ class TeamMemberResource(Resource):
         if not user:
             return {'message': 'User not found'}, 404
         
-        if user not in team.members:
+        if not is_team_member(team_id, user.id):
             return {'message': 'User is not a member of this team'}, 400
         
         if team.leader_id == user.id:
@@ -221,43 +399,39 @@ class TeamMemberResource(Resource):
         
         try:
             team.members.remove(user)
+            record_activity('member.removed', team_id, changes={'user_id': user.id, 'name': user.name})
+            invalidate(f'team:{team_id}')
+            get_tokens().revoke_user(user_id, db.session)
+            publish_event('team.member_removed', {'team_id': team_id, 'user_id': user_id}, team_ids=[team_id])
             db.session.commit()
             return {'message': 'User removed from team successfully'}, 200
         except Exception as e:
             return {'message': str(e)}, 500
 
 class TaskResource(Resource):
+    @cached(lambda project_id=None, task_id=None: [f'task:{task_id}'] if task_id else [f'project-tasks:{project_id}'])
+    @query_budget(1)
     def get(self, project_id=None, task_id=None):
         if task_id:
-            task = Task.query.get(task_id)
-            if not task:
+            row = db.session.execute(task_schema.select().where(Task.id == task_id)).first()
+            if not row:
                 return {'message': 'Task not found'}, 404
             
-            return {
-                'id': task.id,
-                'title': task.title,
-                'description': task.description,
-                'status': task.status,
-                'due_date': task.due_date.isoformat() if task.due_date else None,
-                'created_at': task.created_at.isoformat(),
-                'project_id': task.project_id,
-                'assignee_id': task.assignee_id
-            }, 200
+            return task_schema.dump_row(row), 200
         elif project_id:
-            tasks = Task.query.filter_by(project_id=project_id).all()
-            result = []
-            for task in tasks:
-                result.append({
-                    'id': task.id,
-                    'title': task.title,
-                    'description': task.description,
-                    'status': task.status,
-                    'due_date': task.due_date.isoformat() if task.due_date else None,
-                    'created_at': task.created_at.isoformat(),
-                    'project_id': task.project_id,
-                    'assignee_id': task.assignee_id
-                })
-            return result, 200
+            args = request.args
+            try:
+                fields = parse_fields(args, TASK_FIELDS)
+                query = Task.query.filter_by(project_id=project_id)
+                if args.get('status'):
+                    query = apply_in_filter(query, Task.status, args['status'])
+                if args.get('assignee_id'):
+                    query = apply_int_filter(query, Task.assignee_id, args['assignee_id'], 'assignee_id')
+                query = apply_range_filter(query, Task.due_date, args.get('due_after'), args.get('due_before'))
+                result, next_cursor = keyset_page(query, Task, args, fields)
+            except QueryArgumentError as e:
+                return {'message': str(e)}, 400
+            return result, 200, page_headers(next_cursor)
         else:
             return {'message': 'Project ID is required'}, 400
     
@@ -265,6 +439,9 @@ class TaskResource(Resource):
         project = Project.query.get(project_id)
         if not project:
             return {'message': 'Project not found'}, 404
+        denied = team_access_denied(project.team_id)
+        if denied:
+            return denied
         
         data = request.get_json()
         
@@ -282,72 +459,94 @@ class TaskResource(Resource):
                 assignee_id=data.get('assignee_id')
             )
             db.session.add(new_task)
-            db.session.commit()
+            record_task_change(None, stats_key(new_task))
             
-            # Sending notification email if task is assigned to someone
+            # Queueing notification email if task is assigned to someone
             if new_task.assignee_id:
                 assignee = User.query.get(new_task.assignee_id)
                 if assignee:
                     notify_task_assignment(assignee.email, new_task.title, project.name)
             
-            return {
-                'id': new_task.id,
-                'title': new_task.title,
-                'description': new_task.description,
-                'status': new_task.status,
-                'due_date': new_task.due_date.isoformat() if new_task.due_date else None,
-                'created_at': new_task.created_at.isoformat(),
-                'project_id': new_task.project_id,
-                'assignee_id': new_task.assignee_id
-            }, 201
+            team_id = project.team_id
+            created = {'title': new_task.title}
+            if new_task.assignee_id:
+                created['assignee_id'] = new_task.assignee_id
+            record_activity('task.created', team_id, project_id, new_task, created)
+            invalidate(f'project-tasks:{project_id}')
+            db.session.flush()
+            result = task_schema.dump(new_task)
+            publish_event('task.created', result, project_id, [team_id])
+            db.session.commit()
+            return result, 201
         except Exception as e:
             return {'message': str(e)}, 500
     
+    @query_budget(10)
     def put(self, task_id):
-        task = Task.query.get(task_id)
-        if not task:
+        team_id = db.session.scalar(
+            select(Project.team_id).join(Task, Task.project_id == Project.id).where(Task.id == task_id)
+        )
+        if team_id is None:
             return {'message': 'Task not found'}, 404
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
         
         data = request.get_json()
+        
+        try:
+            # Parsed per request, so that a bad value fails this request and not the batch it joins
+            changes = task_changes(data)
+        except Exception as e:
+            return {'message': str(e)}, 500
+        
+        # Rapid PUTs of the caller to the task are merged into one commit, see app/api/coalescing.py
+        identity = current_identity()
+        key = ('task', task_id, identity.user_id if identity else None)
+        return coalesce_update(key, changes, lambda changes: self.update(task_id, changes))
+    
+    def update(self, task_id, changes):
+        # The project and current assignee are needed for notifications
+        task = Task.query.options(joinedload(Task.project), related_loader(Task.assignee_user)).get(task_id)
+        if not task:
+            return {'message': 'Task not found'}, 404
+        
         old_status = task.status
         old_assignee_id = task.assignee_id
+        old_stats_key = stats_key(task)
+        old_values = {name: getattr(task, name) for name in changes}
         
         try:
-            if 'title' in data:
-                task.title = data['title']
-            if 'description' in data:
-                task.description = data['description']
-            if 'status' in data:
-                task.status = data['status']
-            if 'due_date' in data:
-                task.due_date = datetime.fromisoformat(data['due_date']) if data['due_date'] else None
-            if 'assignee_id' in data:
-                task.assignee_id = data['assignee_id']
+            for name, value in changes.items():
+                setattr(task, name, value)
             
-            db.session.commit()
+            status_changed = old_status != task.status
+            reassigned = old_assignee_id != task.assignee_id
+            record_task_change(old_stats_key, stats_key(task))
             
-            # Sending notification if the status has changed
-            if old_status != task.status and task.assignee_id:
-                assignee = User.query.get(task.assignee_id)
+            if task.assignee_id and (status_changed or reassigned):
+                # The eagerly loaded assignee is still current unless the task was reassigned
+                assignee = db.session.get(User, task.assignee_id) if reassigned else task.assignee_user
                 if assignee:
-                    notify_task_status_change(assignee.email, task.title, old_status, task.status)
+                    # Queueing notification if the status has changed
+                    if status_changed:
+                        notify_task_status_change(assignee.email, task.title, old_status, task.status)
+                    # Queueing notification if the task has been reassigned
+                    if reassigned:
+                        notify_task_assignment(assignee.email, task.title, task.project.name)
             
-            # Sending notification if the task has been reassigned
-            if old_assignee_id != task.assignee_id and task.assignee_id:
-                assignee = User.query.get(task.assignee_id)
-                if assignee:
-                    notify_task_assignment(assignee.email, task.title, task.project.name)
+            # Serializing before commit avoids reloading the expired instance
+            result = task_schema.dump(task)
             
-            return {
-                'id': task.id,
-                'title': task.title,
-                'description': task.description,
-                'status': task.status,
-                'due_date': task.due_date.isoformat() if task.due_date else None,
-                'created_at': task.created_at.isoformat(),
-                'project_id': task.project_id,
-                'assignee_id': task.assignee_id
-            }, 200
+            team_id = task.project.team_id
+            changed = field_changes(old_values, changes)
+            if changed:
+                record_activity('task.updated', team_id, result['project_id'], task_id, changed)
+            invalidate(f'task:{task_id}', f'project-tasks:{result["project_id"]}')
+            publish_event('task.updated', result, result['project_id'], [team_id])
+            db.session.commit()
+            
+            return result, 200
         except Exception as e:
             return {'message': str(e)}, 500
     
@@ -356,18 +555,274 @@ class TaskResource(Resource):
         if not task:
             return {'message': 'Task not found'}, 404
         
+        project_id = task.project_id
+        team_id = db.session.scalar(select(Project.team_id).where(Project.id == project_id))
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
+        
         try:
+            db.session.execute(delete(ReminderLog).where(ReminderLog.task_id == task_id))
             db.session.delete(task)
+            record_task_change(stats_key(task), None)
+            record_activity('task.deleted', team_id, project_id, task_id, {'title': task.title})
+            invalidate(f'task:{task_id}', f'project-tasks:{project_id}')
+            publish_event('task.deleted', {'id': task_id, 'project_id': project_id}, project_id, [team_id])
             db.session.commit()
             return {'message': 'Task deleted successfully'}, 200
         except Exception as e:
             return {'message': str(e)}, 500
 
+class ProjectStatsResource(Resource):
+    @cached(lambda project_id: [f'project-tasks:{project_id}'])
+    @query_budget(3)
+    def get(self, project_id):
+        if not db.session.get(Project, project_id):
+            return {'message': 'Project not found'}, 404
+        return project_stats(project_id), 200
+
+class UserStatsResource(Resource):
+    @query_budget(3)
+    def get(self, user_id):
+        if not db.session.get(User, user_id):
+            return {'message': 'User not found'}, 404
+        return user_stats(user_id), 200
+
+class UserTasksResource(Resource):
+    @query_budget(3)
+    def get(self, user_id):
+        if not db.session.get(User, user_id):
+            return {'message': 'User not found'}, 404
+        
+        # Other users' tasks are limited to the caller's teams
+        identity = current_identity()
+        team_ids = identity.team_ids if identity and identity.user_id != user_id else None
+        try:
+            result, next_cursor = assigned_tasks(user_id, request.args, team_ids)
+        except QueryArgumentError as e:
+            return {'message': str(e)}, 400
+        return result, 200, page_headers(next_cursor)
+
+class TeamActivityResource(Resource):
+    @query_budget(1)
+    def get(self, team_id):
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
+        
+        # Newest first, see app/api/activity.py
+        try:
+            result, next_cursor = activity_page(Activity.team_id == team_id, request.args)
+        except QueryArgumentError as e:
+            return {'message': str(e)}, 400
+        return result, 200, page_headers(next_cursor)
+
+class ProjectActivityResource(Resource):
+    @query_budget(2)
+    def get(self, project_id):
+        team_id = db.session.scalar(select(Project.team_id).where(Project.id == project_id))
+        if team_id is None:
+            return {'message': 'Project not found'}, 404
+        denied = team_access_denied(team_id)
+        if denied:
+            return denied
+        
+        try:
+            result, next_cursor = activity_page(Activity.project_id == project_id, request.args)
+        except QueryArgumentError as e:
+            return {'message': str(e)}, 400
+        return result, 200, page_headers(next_cursor)
+
+class SearchResource(Resource):
+    @query_budget(2)
+    def get(self):
+        if db.engine.dialect.name != 'sqlite':
+            return {'message': 'Full-text search requires SQLite FTS5'}, 501
+        
+        args = request.args
+        kind = args.get('type', 'tasks')
+        try:
+            select_filter_shard(args)
+            if kind == 'tasks':
+                result, next_cursor = search_tasks(args, parse_fields(args, TASK_FIELDS))
+            elif kind == 'projects':
+                result, next_cursor = search_projects(args, parse_fields(args, PROJECT_FIELDS))
+            else:
+                return {'message': "'type' must be 'tasks' or 'projects'"}, 400
+        except QueryArgumentError as e:
+            return {'message': str(e)}, 400
+        return result, 200, page_headers(next_cursor)
+
+def parse_id_list(raw, name):
+    return {parse_int(value.strip(), name) for value in (raw or '').split(',') if value.strip()}
+
+class EventsResource(Resource):
+    # The projects, the backlog, and the listener's start on the first stream of a process
+    @query_budget(3)
+    def get(self):
+        if not events_enabled():
+            return {'message': 'Change events are disabled'}, 501
+        
+        args = request.args
+        try:
+            project_ids = parse_id_list(args.get('projects'), 'projects')
+            team_ids = parse_id_list(args.get('teams'), 'teams')
+            timeout = float(args['timeout']) if args.get('timeout') else None
+        except QueryArgumentError as e:
+            return {'message': str(e)}, 400
+        except ValueError:
+            return {'message': "'timeout' must be a number"}, 400
+        if not project_ids and not team_ids:
+            return {'message': "At least one of 'projects' or 'teams' is required"}, 400
+        
+        # A stream only carries events of teams the caller belongs to
+        identity = current_identity()
+        if project_ids:
+            project_teams = dict(shard_rows(select(Project.id, Project.team_id).where(Project.id.in_(project_ids))))
+            if len(project_teams) != len(project_ids):
+                return {'message': 'Project not found'}, 404
+            if identity and not identity.team_ids.issuperset(project_teams.values()):
+                return {'message': 'Not a member of this team'}, 403
+        if identity and not identity.team_ids.issuperset(team_ids):
+            return {'message': 'Not a member of this team'}, 403
+        
+        # The stream holds no database connection while it waits for events
+        db.session.close()
+        channels = {f'project:{project_id}' for project_id in project_ids}
+        channels.update(f'team:{team_id}' for team_id in team_ids)
+        last_event_id = request.headers.get('Last-Event-ID') or args.get('last_event_id')
+        try:
+            return stream_events(channels, last_event_id, timeout)
+        except TooManyStreams as e:
+            retry_after = max(round(current_app.config.get('EVENTS_RETRY_MS', 3000) / 1000), 1)
+            return {'message': str(e)}, 503, {'Retry-After': str(retry_after)}
+
+class SyncResource(Resource):
+    # A replica that is behind would answer with an older revision
+    @use_primary
+    @query_budget(7)
+    def get(self):
+        if sharded():
+            return {'message': 'Delta sync needs a single database and is not available with shards'}, 501
+        
+        args = request.args
+        position = None
+        try:
+            since = parse_int(args.get('since', 0), 'since')
+            team_ids = parse_id_list(args.get('teams'), 'teams')
+            if args.get('cursor'):
+                # Continues a revision larger than a page; the cursor holds the `since` it started from
+                values = decode_cursor(args['cursor'])
+                since = parse_int(values.get('since'), 'cursor')
+                position = (parse_int(values.get('revision'), 'cursor'), parse_int(values['id'], 'cursor'))
+        except QueryArgumentError as e:
+            return {'message': str(e)}, 400
+        if since < 0:
+            return {'message': "'since' must not be negative"}, 400
+        
+        identity = current_identity()
+        if not team_ids:
+            if identity is None:
+                return {'message': "'teams' is required without a bearer token"}, 400
+            team_ids = set(identity.team_ids)
+        elif identity and not identity.team_ids.issuperset(team_ids):
+            return {'message': 'Not a member of this team'}, 403
+        
+        max_tasks = current_app.config.get('SYNC_MAX_TASKS', 5000)
+        result = sync_changes(team_ids, since, max_tasks, list(PROJECT_FIELDS), list(TASK_FIELDS), position)
+        return result, 200
+
+class TaskBulkResource(Resource):
+    def post(self):
+        data = request.get_json()
+        operations = data.get('operations') if isinstance(data, dict) else None
+        
+        if not isinstance(operations, list) or not operations:
+            return {'message': 'A non-empty list of operations is required'}, 400
+        
+        max_operations = current_app.config.get('BULK_MAX_OPERATIONS', 1000)
+        if len(operations) > max_operations:
+            return {'message': f'At most {max_operations} operations are allowed per request'}, 413
+        
+        shards = operation_shards(operations)
+        if len(shards) > 1:
+            return {'message': 'All operations must concern projects on the same database shard'}, 400
+        select_shard(next(iter(shards), None))
+        
+        try:
+            parsed, existing, teams = validate_operations(operations)
+        except BulkValidationError as e:
+            return {'message': str(e), 'results': e.results}, 400
+        
+        try:
+            results = apply_operations(parsed, existing, teams)
+            tags = {f'project-tasks:{entry["project_id"]}' for entry in parsed if entry['op'] == 'create'}
+            for task_id, row in existing.items():
+                tags.update((f'task:{task_id}', f'project-tasks:{row.project_id}'))
+            invalidate(*tags)
+            publish_bulk_events(parsed, existing, results, teams)
+            db.session.commit()
+            return {'results': results}, 200
+        except Exception as e:
+            db.session.rollback()
+            return {'message': str(e)}, 500
+
+class ExportResource(Resource):
+    def get(self, entity):
+        args = request.args
+        fmt = args.get('format', 'ndjson')
+        if fmt not in ('ndjson', 'json'):
+            return {'message': "'format' must be 'ndjson' or 'json'"}, 400
+        use_gzip = args.get('gzip', 'false').lower() in ('1', 'true')
+        
+        try:
+            select_filter_shard(args)
+            if entity == 'projects':
+                schema = project_schema
+                fields = parse_fields(args, PROJECT_FIELDS)
+                statement = schema.select(fields).order_by(Project.id)
+                if args.get('team_id'):
+                    statement = apply_int_filter(statement, Project.team_id, args['team_id'], 'team_id')
+            elif entity == 'tasks':
+                schema = task_schema
+                fields = parse_fields(args, TASK_FIELDS)
+                statement = schema.select(fields).order_by(Task.id)
+                if args.get('project_id'):
+                    statement = apply_int_filter(statement, Task.project_id, args['project_id'], 'project_id')
+                if args.get('team_id'):
+                    statement = apply_int_filter(statement.join(Project, Task.project_id == Project.id),
+                                                 Project.team_id, args['team_id'], 'team_id')
+                if args.get('status'):
+                    statement = apply_in_filter(statement, Task.status, args['status'])
+                if args.get('assignee_id'):
+                    statement = apply_int_filter(statement, Task.assignee_id, args['assignee_id'], 'assignee_id')
+                statement = apply_range_filter(statement, Task.due_date, args.get('due_after'), args.get('due_before'))
+            else:
+                return {'message': 'Unknown export type'}, 404
+        except QueryArgumentError as e:
+            return {'message': str(e)}, 400
+        
+        return stream_export(statement, schema, fields, fmt=fmt, gzip=use_gzip)
+
 api.add_resource(UserRegistration, '/api/register')
 api.add_resource(UserLogin, '/api/login')
+api.add_resource(TokenRefresh, '/api/token/refresh')
+api.add_resource(UserLogout, '/api/logout')
+api.add_resource(CurrentUser, '/api/me')
 api.add_resource(ProjectResource, '/api/projects', '/api/projects/<int:project_id>')
 api.add_resource(TeamResource, '/api/teams', '/api/teams/<int:team_id>')
 api.add_resource(TeamMemberResource, '/api/teams/<int:team_id>/members', '/api/teams/<int:team_id>/members/<int:user_id>')
 api.add_resource(TaskResource, '/api/projects/<int:project_id>/tasks', '/api/tasks/<int:task_id>')
+api.add_resource(ProjectStatsResource, '/api/projects/<int:project_id>/stats')
+api.add_resource(UserStatsResource, '/api/users/<int:user_id>/stats')
+api.add_resource(UserTasksResource, '/api/users/<int:user_id>/tasks')
+api.add_resource(TeamActivityResource, '/api/teams/<int:team_id>/activity')
+api.add_resource(ProjectActivityResource, '/api/projects/<int:project_id>/activity')
+api.add_resource(SearchResource, '/api/search')
+api.add_resource(EventsResource, '/api/events')
+api.add_resource(SyncResource, '/api/sync')
+api.add_resource(TaskBulkResource, '/api/tasks/bulk')
+api.add_resource(ExportResource, '/api/export/<string:entity>')
+api.add_resource(JobResource, '/api/jobs/<int:job_id>')
 
 
@@ -0,0 +1,216 @@
+"""
+Full-text search over tasks and projects with SQLite FTS5.
+
+`task_fts` and `project_fts` are external-content FTS5 tables: they index
+the text columns of `task` and `project` without storing a second copy,
+and triggers on the base tables keep them in sync for every write,
+including the bulk endpoint's Core statements. Results are ordered by
+BM25 rank (title/name matches weigh more than description matches), or
+newest first, and paginated with a keyset cursor.
+"""
+import re
+from sqlalchemy import and_, column, or_, select, table, text
+from app.models.models import db, Project, Task
+from app.api.pagination import (QueryArgumentError, apply_in_filter, apply_int_filter, decode_cursor,
+                                encode_cursor, parse_int, parse_limit)
+from app.api.serializers import SCHEMAS
+from app.routing import shard_rows
+
+# Column weights for bm25(): title/name, then description
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+def fts_statements(name, content, source, columns, values):
+    """
+    DDL for an external-content FTS5 index and the triggers on `content`
+    that keep it in sync
+
+    Args:
+        name: FTS5 table name
+        content: Table whose writes are indexed
+        source: View over `content` the index reads its content from
+        columns: Indexed column names
+        values: SQL expressions for those columns, with {row} standing for
+                the trigger's new/old row
+    """
+    column_list = ', '.join(columns)
+    new_values = [value.format(row='new') for value in values]
+    old_values = [value.format(row='old') for value in values]
+    delete_old = (f"INSERT INTO {name} ({name}, rowid, {column_list}) "
+                  f"VALUES ('delete', old.id, {', '.join(old_values)});")
+    insert_new = f"INSERT INTO {name} (rowid, {column_list}) VALUES (new.id, {', '.join(new_values)});"
+    changed = ' OR '.join(f'{old} IS NOT {new}' for old, new in zip(old_values, new_values))
+    return [
+        # Prefix indexes keep 'term*' queries fast for short prefixes
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5("
+        f"{column_list}, content='{source}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON {content} BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON {content} BEGIN {delete_old} END",
+        # Only reindex when an indexed value changed (status updates are frequent)
+        f"CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE ON {content} WHEN {changed} "
+        f"BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {name} ({name}, rank) VALUES ('rank', 'bm25({TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, 0)')",
+        f"INSERT INTO {name} ({name}) VALUES ('rebuild')",
+    ]
+
+def create_search_index(connection):
+    # FTS5 is SQLite-only; other databases have no search index
+    if connection.dialect.name != 'sqlite':
+        return
+    # The hidden `scope` column holds a 'p<project_id>' token, so a project
+    # or team filter is answered inside the index instead of ranking every
+    # match first and filtering afterwards
+    connection.execute(text(
+        "CREATE VIEW IF NOT EXISTS task_search AS "
+        "SELECT id, title, description, 'p' || project_id AS scope FROM task"
+    ))
+    connection.execute(text(
+        "CREATE VIEW IF NOT EXISTS project_search AS "
+        "SELECT id, name, description, 't' || team_id AS scope FROM project"
+    ))
+    statements = (
+        fts_statements('task_fts', 'task', 'task_search', ('title', 'description', 'scope'),
+                       ('{row}.title', '{row}.description', "'p' || {row}.project_id")) +
+        fts_statements('project_fts', 'project', 'project_search', ('name', 'description', 'scope'),
+                       ('{row}.name', '{row}.description', "'t' || {row}.team_id"))
+    )
+    for statement in statements:
+        connection.execute(text(statement))
+
+TERM = re.compile(r'\w+\*?', re.UNICODE)
+
+# Teams with more projects than this are filtered with a join instead
+MAX_SCOPE_TERMS = 200
+
+def match_expression(raw, columns, scopes=None):
+    """
+    Turn user input into an FTS5 query over `columns`: all words must
+    match, and a word ending in '*' matches as a prefix. FTS5 operators and
+    syntax in the input are treated as plain text.
+
+    Args:
+        raw: The `q` argument
+        columns: Text columns to search
+        scopes: Optional scope tokens (e.g. 'p12'), one of which must match
+    """
+    terms = []
+    for term in TERM.findall(raw or ''):
+        prefix = term.endswith('*')
+        word = term.rstrip('*')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    if not terms:
+        raise QueryArgumentError("'q' must contain at least one word")
+    expression = '{%s} : (%s)' % (' '.join(columns), ' AND '.join(terms))
+    if scopes is not None:
+        expression += ' AND scope : (%s)' % ' OR '.join(f'"{scope}"' for scope in scopes)
+    return expression
+
+def fts_table(name):
+    return table(name, column('rowid'), column('rank'))
+
+def search_statement(model, fts_name, fields, match):
+    fts = fts_table(fts_name)
+    selected = list(dict.fromkeys(fields + ['id']))
+    statement = (
+        select(*[getattr(model, name) for name in selected], fts.c.rank.label('rank'))
+        .select_from(fts)
+        .join(model, model.id == fts.c.rowid)
+        .where(text(f'{fts_name} MATCH :match').bindparams(match=match))
+    )
+    return statement, fts
+
+def search_page(statement, fts, model, args, fields):
+    """
+    Fetch one page after the cursor position, by rank (sort=relevance, the
+    default) or newest first (sort=recent). Ranking needs every match to be
+    scored, so for very common words sort=recent is much faster.
+
+    Returns:
+        tuple: (list of dicts with a 'score' key, next cursor or None)
+    """
+    limit = parse_limit(args)
+    sort = args.get('sort', 'relevance')
+    if sort not in ('relevance', 'recent'):
+        raise QueryArgumentError("'sort' must be one of: relevance, recent")
+
+    cursor = args.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if sort == 'recent':
+            statement = statement.where(fts.c.rowid < position['id'])
+        else:
+            if not isinstance(position.get('rank'), (int, float)):
+                raise QueryArgumentError('Cursor does not match sort order')
+            statement = statement.where(or_(
+                fts.c.rank > position['rank'],
+                and_(fts.c.rank == position['rank'], fts.c.rowid > position['id'])
+            ))
+    if sort == 'recent':
+        statement = statement.order_by(fts.c.rowid.desc())
+        key, reverse = (lambda row: row.id), True
+    else:
+        statement = statement.order_by(fts.c.rank, fts.c.rowid)
+        key, reverse = (lambda row: (row.rank, row.id)), False
+    statement = statement.limit(limit + 1)
+    # BM25 ranks from different shards are merged as they are
+    rows = shard_rows(statement, key, reverse)[:limit + 1]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        position = {'id': last['id']} if sort == 'recent' else {'rank': last['rank'], 'id': last['id']}
+        next_cursor = encode_cursor(position)
+
+    dump_values = SCHEMAS[model].compile(fields)[0]
+    items = []
+    for row in rows:
+        item = dump_values(row)
+        # bm25() is negative, lower is better; expose it as a positive score
+        item['score'] = round(-row.rank, 6)
+        items.append(item)
+    return items, next_cursor
+
+def search_tasks(args, fields):
+    """
+    Search task titles and descriptions
+
+    Project and team filters become scope terms of the FTS query; status
+    and assignee filters are applied to the matching rows.
+    """
+    scopes = None
+    team_filter = None
+    if args.get('project_id'):
+        scopes = [f"p{parse_int(args['project_id'], 'project_id')}"]
+    if args.get('team_id'):
+        team_id = parse_int(args['team_id'], 'team_id')
+        project_ids = db.session.scalars(select(Project.id).where(Project.team_id == team_id)).all()
+        if not project_ids:
+            return [], None
+        if len(project_ids) > MAX_SCOPE_TERMS:
+            team_filter = team_id
+        else:
+            team_scopes = {f'p{project_id}' for project_id in project_ids}
+            scopes = sorted(team_scopes if scopes is None else team_scopes.intersection(scopes))
+            if not scopes:
+                return [], None
+
+    match = match_expression(args.get('q'), ('title', 'description'), scopes)
+    statement, fts = search_statement(Task, 'task_fts', fields, match)
+    if team_filter is not None:
+        statement = statement.join(Project, Task.project_id == Project.id).where(Project.team_id == team_filter)
+    if args.get('status'):
+        statement = apply_in_filter(statement, Task.status, args['status'])
+    if args.get('assignee_id'):
+        statement = apply_int_filter(statement, Task.assignee_id, args['assignee_id'], 'assignee_id')
+    return search_page(statement, fts, Task, args, fields)
+
+def search_projects(args, fields):
+    scopes = None
+    if args.get('team_id'):
+        scopes = [f"t{parse_int(args['team_id'], 'team_id')}"]
+    match = match_expression(args.get('q'), ('name', 'description'), scopes)
+    statement, fts = search_statement(Project, 'project_fts', fields, match)
+    return search_page(statement, fts, Project, args, fields)
@@ -0,0 +1,126 @@
+"""
+Response serialization.
+
+Each model has a Schema listing the fields the API returns. For every field
+list it is asked for, a schema compiles once a function turning a row tuple
+or a model instance into a dict, converting only the date/time columns.
+Handlers that only need to return data can load rows as tuples with
+`schema.select()` instead of building ORM instances.
+
+Responses are encoded with orjson when it is installed (see
+requirements.txt), otherwise with the standard library.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import make_response
+from sqlalchemy import Date, DateTime, select
+from app.models.models import Activity, BackgroundJob, Project, Task, Team, User
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class Schema:
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        self.compiled = {}
+
+    def columns(self, fields=None):
+        return [getattr(self.model, name) for name in (fields or self.fields)]
+
+    def select(self, fields=None):
+        """
+        select() of the columns for `fields`, for loading rows as tuples
+        """
+        return select(*self.columns(fields))
+
+    def compile(self, fields=None):
+        """
+        Returns:
+            tuple: (function dumping a row whose first columns are `fields`,
+                    function dumping a model instance)
+        """
+        fields = tuple(fields or self.fields)
+        compiled = self.compiled.get(fields)
+        if compiled is None:
+            compiled = self.compiled[fields] = self.build(fields)
+        return compiled
+
+    def build(self, fields):
+        # Generated source with one dict literal, e.g. for ('id', 'due_date'):
+        #   def dump_values(values):
+        #       v1 = values[1]
+        #       return {'id': values[0], 'due_date': None if v1 is None else v1.isoformat()}
+        table = self.model.__table__
+        temporal = {name for name in fields if isinstance(table.c[name].type, (Date, DateTime))}
+        source = []
+        for kind, access in (('values', 'values[{index}]'), ('obj', 'obj.{name}')):
+            lines = [f'def dump_{kind}({kind}):']
+            entries = []
+            for index, name in enumerate(fields):
+                value = access.format(index=index, name=name)
+                if name in temporal:
+                    lines.append(f'    v{index} = {value}')
+                    value = f'None if v{index} is None else v{index}.isoformat()'
+                entries.append(f'{name!r}: {value}')
+            lines.append(f"    return {{{', '.join(entries)}}}")
+            source.append('\n'.join(lines))
+        namespace = {}
+        exec('\n\n'.join(source), namespace)
+        return namespace['dump_values'], namespace['dump_obj']
+
+    def dump(self, obj, fields=None):
+        return self.compile(fields)[1](obj)
+
+    def dump_row(self, row, fields=None):
+        """
+        Dump a row whose first columns are `fields`, in order
+        """
+        return self.compile(fields)[0](row)
+
+    def dump_rows(self, rows, fields=None):
+        dump_values = self.compile(fields)[0]
+        return [dump_values(row) for row in rows]
+
+project_schema = Schema(Project, ('id', 'name', 'description', 'created_at', 'team_id'))
+team_schema = Schema(Team, ('id', 'name', 'leader_id'))
+task_schema = Schema(Task, ('id', 'title', 'description', 'status', 'due_date', 'created_at',
+                            'project_id', 'assignee_id'))
+# Never includes the password hash
+user_schema = Schema(User, ('id', 'name', 'email'))
+job_schema = Schema(BackgroundJob, ('id', 'kind', 'target_id', 'archive', 'status', 'total', 'done', 'error',
+                                    'created_at', 'finished_at'))
+activity_schema = Schema(Activity, ('id', 'created_at', 'team_id', 'project_id', 'task_id', 'actor_id', 'action',
+                                    'changes'))
+
+SCHEMAS = {schema.model: schema for schema in (project_schema, team_schema, task_schema, user_schema, job_schema,
+                                                activity_schema)}
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # SUM() on PostgreSQL returns Decimal
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(data, sort_keys=False):
+    """
+    Encode `data` as compact JSON
+
+    Returns:
+        bytes: The encoded document
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(data, default=json_default, option=option)
+    return json.dumps(data, default=json_default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+def output_json(data, code, headers=None):
+    # Flask-RESTful representation for application/json
+    response = make_response(dumps(data), code)
+    response.headers.extend(headers or {})
+    return response
@@ -0,0 +1,167 @@
+"""
+Task statistics kept in summary tables.
+
+`task_stat` counts tasks per (project, assignee, status) and `task_due_stat`
+counts tasks that are not DONE per (project, assignee, due day). Every write
+path that creates, deletes or changes the status, assignee or due date of
+tasks calls `record_task_changes()` in its own transaction, so reading the
+statistics never scans the task table. `rebuild_stats()` recomputes both
+tables from scratch.
+
+A task counts as overdue once the UTC day it is due on has passed.
+"""
+from collections import Counter
+from sqlalchemy import delete, func, insert, select
+from app.models.models import db, Task, TaskStat, TaskDueStat, utcnow
+from app.routing import shard_rows
+
+DONE = 'DONE'
+
+def stats_key(task):
+    """
+    The task attributes the statistics depend on
+
+    Args:
+        task: A Task, or a row with the same attribute names
+    """
+    return (task.project_id, task.assignee_id, task.status, task.due_date)
+
+def count_changes(changes):
+    status_counts = Counter()
+    due_counts = Counter()
+    for old, new in changes:
+        for key, delta in ((old, -1), (new, 1)):
+            if key is None:
+                continue
+            project_id, assignee_id, status, due_date = key
+            assignee_id = assignee_id or 0
+            status_counts[(project_id, assignee_id, status or '')] += delta
+            if due_date is not None and status != DONE:
+                due_counts[(project_id, assignee_id, due_date.date())] += delta
+    return status_counts, due_counts
+
+def upsert_counts(table, key_columns, counts):
+    rows = [dict(zip(key_columns, key), task_count=delta) for key, delta in counts.items() if delta]
+    if not rows:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={'task_count': table.c.task_count + statement.excluded.task_count}
+    )
+    db.session.execute(statement, rows)
+
+def record_task_changes(changes):
+    """
+    Apply task changes to the summary tables in the current transaction
+
+    Args:
+        changes: Iterable of (old, new) stats_key() tuples; old is None for
+                 created tasks and new is None for deleted ones
+    """
+    status_counts, due_counts = count_changes(
+        (old, new) for old, new in changes if old != new
+    )
+    upsert_counts(TaskStat.__table__, ('project_id', 'assignee_id', 'status'), status_counts)
+    upsert_counts(TaskDueStat.__table__, ('project_id', 'assignee_id', 'due_day'), due_counts)
+
+def record_task_change(old, new):
+    record_task_changes([(old, new)])
+
+def delete_project_stats(project_id):
+    db.session.execute(delete(TaskStat).where(TaskStat.project_id == project_id))
+    db.session.execute(delete(TaskDueStat).where(TaskDueStat.project_id == project_id))
+
+def rebuild_stats(connection):
+    """
+    Recompute both summary tables from the task table
+
+    Returns:
+        int: Number of tasks counted
+    """
+    assignee = func.coalesce(Task.assignee_id, 0)
+    status = func.coalesce(Task.status, '')
+    due_day = func.date(Task.due_date)
+    connection.execute(delete(TaskStat))
+    connection.execute(delete(TaskDueStat))
+    connection.execute(insert(TaskStat).from_select(
+        ['project_id', 'assignee_id', 'status', 'task_count'],
+        select(Task.project_id, assignee, status, func.count()).group_by(Task.project_id, assignee, status)
+    ))
+    connection.execute(insert(TaskDueStat).from_select(
+        ['project_id', 'assignee_id', 'due_day', 'task_count'],
+        select(Task.project_id, assignee, due_day, func.count())
+        .where(Task.due_date.is_not(None), status != DONE)
+        .group_by(Task.project_id, assignee, due_day)
+    ))
+    return connection.execute(select(func.coalesce(func.sum(TaskStat.task_count), 0))).scalar()
+
+def summarize(status_rows, overdue_rows):
+    """
+    Build totals, overdue counts and per-status counts, grouped by the first
+    column of each row
+
+    Args:
+        status_rows: (group, status, count) rows
+        overdue_rows: (group, count) rows
+    """
+    groups = {}
+    for group, status, count in status_rows:
+        if not count:
+            continue
+        entry = groups.setdefault(group, {'total': 0, 'overdue': 0, 'by_status': {}})
+        entry['total'] += count
+        entry['by_status'][status] = entry['by_status'].get(status, 0) + count
+    for group, count in overdue_rows:
+        if count and group in groups:
+            groups[group]['overdue'] += count
+    totals = {'total': 0, 'overdue': 0, 'by_status': {}}
+    for entry in groups.values():
+        totals['total'] += entry['total']
+        totals['overdue'] += entry['overdue']
+        for status, count in entry['by_status'].items():
+            totals['by_status'][status] = totals['by_status'].get(status, 0) + count
+    return totals, groups
+
+def project_stats(project_id):
+    """
+    Task counts for a project, in total and per assignee (two queries)
+    """
+    status_rows = db.session.execute(
+        select(TaskStat.assignee_id, TaskStat.status, TaskStat.task_count)
+        .where(TaskStat.project_id == project_id)
+    ).all()
+    overdue_rows = db.session.execute(
+        select(TaskDueStat.assignee_id, func.sum(TaskDueStat.task_count))
+        .where(TaskDueStat.project_id == project_id, TaskDueStat.due_day < utcnow().date())
+        .group_by(TaskDueStat.assignee_id)
+    ).all()
+    totals, groups = summarize(status_rows, overdue_rows)
+    totals['project_id'] = project_id
+    totals['by_assignee'] = [
+        dict(entry, assignee_id=assignee_id or None) for assignee_id, entry in sorted(groups.items())
+    ]
+    return totals
+
+def user_stats(user_id):
+    """
+    Task counts for tasks assigned to a user, in total and per project (two
+    queries, per shard)
+    """
+    status_rows = shard_rows(
+        select(TaskStat.project_id, TaskStat.status, TaskStat.task_count)
+        .where(TaskStat.assignee_id == user_id)
+    )
+    overdue_rows = shard_rows(
+        select(TaskDueStat.project_id, func.sum(TaskDueStat.task_count))
+        .where(TaskDueStat.assignee_id == user_id, TaskDueStat.due_day < utcnow().date())
+        .group_by(TaskDueStat.project_id)
+    )
+    totals, groups = summarize(status_rows, overdue_rows)
+    totals['user_id'] = user_id
+    totals['by_project'] = [dict(entry, project_id=project_id) for project_id, entry in sorted(groups.items())]
+    return totals
@@ -0,0 +1,231 @@
+"""
+Revisions, tombstones and delta sync for offline-capable clients.
+
+Every transaction that changes a team (including its members), project or
+task takes the next value of a global revision counter (`sync_state`) and
+stamps it on the rows it writes. Deleting a project or task, or moving a
+project to another team, leaves a tombstone with that revision. A client
+keeps the revision returned by its last sync and asks for everything above
+it, so a sync only reads and sends what changed in the client's teams.
+
+Bumping the counter row locks it until the writing transaction commits, so
+revisions become visible in order and a sync never skips a change that
+committed late. Tombstones older than SYNC_TOMBSTONE_DAYS can be purged; a
+client whose revision predates the purge receives a full snapshot instead.
+
+A single counter cannot order writes to several databases, so with sharding
+(see app/routing.py) revisions are not kept and delta sync is unavailable.
+"""
+from datetime import timedelta
+from itertools import chain
+from sqlalchemy import and_, delete, event, func, insert, or_, select, update
+from sqlalchemy.orm import attributes
+from app.models.models import db, Project, SyncState, Task, Team, Tombstone, User, team_members, utcnow
+from app.api.serializers import SCHEMAS
+from app.api.pagination import encode_cursor
+from app.routing import sharded
+
+# Session.info key holding the revision of the current transaction
+REVISION_KEY = 'sync_revision'
+
+def revisions_enabled():
+    return not sharded()
+
+def next_revision(session=None):
+    """
+    The revision of the current transaction, allocated on first use
+    """
+    session = session or db.session
+    revision = session.info.get(REVISION_KEY)
+    if revision is None:
+        state = SyncState.__table__
+        revision = session.execute(
+            update(state).where(state.c.id == 1)
+            .values(revision=state.c.revision + 1)
+            .returning(state.c.revision)
+        ).scalar()
+        if revision is None:
+            # Database created by create_all() without running the migrations
+            revision = 1
+            session.execute(insert(state).values(id=1, revision=revision, purged_revision=0))
+        session.info[REVISION_KEY] = revision
+    return revision
+
+def add_tombstones(entity, rows, revision):
+    """
+    Record deletions made with Core statements (the bulk endpoint)
+
+    Args:
+        entity: 'project' or 'task'
+        rows: (entity_id, project_id, team_id) tuples
+        revision: Revision of the current transaction
+    """
+    if rows:
+        db.session.execute(insert(Tombstone), [
+            {'entity': entity, 'entity_id': entity_id, 'project_id': project_id,
+             'team_id': team_id, 'revision': revision}
+            for entity_id, project_id, team_id in rows
+        ])
+
+def stamp_revisions(session, flush_context, instances):
+    # Writes through the ORM are stamped here, before every flush
+    if not revisions_enabled():
+        return
+    changed = [obj for obj in chain(session.new, session.dirty)
+               if isinstance(obj, (Team, Project, Task)) and (obj in session.new or session.is_modified(obj))]
+    # Memberships changed from the user's side of the relationship
+    for user in session.dirty:
+        if isinstance(user, User):
+            history = attributes.get_history(user, 'member_of', passive=attributes.PASSIVE_NO_INITIALIZE)
+            changed.extend(team for team in chain(history.added, history.deleted) if team not in changed)
+    deleted = [obj for obj in session.deleted if isinstance(obj, (Project, Task))]
+    if not changed and not deleted:
+        return
+
+    revision = next_revision(session)
+    with session.no_autoflush:
+        for obj in changed:
+            obj.revision = revision
+            if isinstance(obj, Project) and obj not in session.new:
+                old_team_ids = [team_id for team_id in attributes.get_history(obj, 'team_id').deleted
+                                if team_id is not None and team_id != obj.team_id]
+                if old_team_ids:
+                    # Clients of the old team drop the project, those of the new one receive its tasks
+                    session.add_all(Tombstone(entity='project', entity_id=obj.id, project_id=obj.id,
+                                              team_id=team_id, revision=revision) for team_id in old_team_ids)
+                    session.execute(update(Task.__table__).where(Task.__table__.c.project_id == obj.id)
+                                    .values(revision=revision))
+        for obj in deleted:
+            if isinstance(obj, Project):
+                session.add(Tombstone(entity='project', entity_id=obj.id, project_id=obj.id,
+                                      team_id=obj.team_id, revision=revision))
+            else:
+                session.add(Tombstone(entity='task', entity_id=obj.id, project_id=obj.project_id,
+                                      team_id=obj.project.team_id, revision=revision))
+
+def forget_revision(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(REVISION_KEY, None)
+
+def purge_tombstones(connection, max_age_days):
+    """
+    Delete tombstones older than `max_age_days`
+
+    Returns:
+        int: Number of tombstones deleted
+    """
+    cutoff = utcnow() - timedelta(days=max_age_days)
+    newest = connection.execute(
+        select(func.max(Tombstone.revision)).where(Tombstone.deleted_at < cutoff)
+    ).scalar()
+    if newest is None:
+        return 0
+    result = connection.execute(delete(Tombstone).where(Tombstone.revision <= newest))
+    # Clients that synced before this revision can no longer get a delta
+    connection.execute(update(SyncState).where(SyncState.id == 1).values(purged_revision=newest))
+    return result.rowcount
+
+def changed_rows(model, fields, scope, since, upto):
+    columns = [getattr(model, name) for name in dict.fromkeys(list(fields) + ['id', 'revision'])]
+    statement = select(*columns).where(scope, model.revision <= upto)
+    if since:
+        statement = statement.where(model.revision > since)
+    return statement
+
+def serialize_rows(model, rows, fields):
+    dump_values = SCHEMAS[model].compile(fields)[0]
+    items = []
+    for row in rows:
+        item = dump_values(row)
+        item['revision'] = row.revision
+        items.append(item)
+    return items
+
+def sync_changes(team_ids, since, max_tasks, project_fields, task_fields, position=None):
+    """
+    What changed in the teams' memberships, projects and tasks after
+    revision `since` (0 for a full snapshot)
+
+    At most `max_tasks` tasks are returned; `has_more` then asks the client
+    to sync again from the returned revision. A revision with more tasks
+    than that (e.g. the rows of a legacy database, all at revision 0) is
+    paged by (revision, id): the response then also has a `cursor`, and its
+    projects, teams and deletions come with the page that completes it.
+
+    Args:
+        position: (revision, id) of the last task sent, from the cursor
+
+    Returns:
+        dict: The /api/sync response body
+    """
+    state = db.session.execute(select(SyncState.revision, SyncState.purged_revision)).first()
+    latest, purged = state if state else (0, 0)
+    # A revision from before the last purge (or from another database) needs a full snapshot
+    reset = since > latest or 0 < since < purged
+    if reset:
+        since, position = 0, None
+    project_scope = Project.team_id.in_(team_ids)
+
+    statement = changed_rows(Task, task_fields, Task.project_id.in_(select(Project.id).where(project_scope)),
+                             since, latest)
+    if position:
+        statement = statement.where(or_(Task.revision > position[0],
+                                        and_(Task.revision == position[0], Task.id > position[1])))
+    rows = db.session.execute(statement.order_by(Task.revision, Task.id).limit(max_tasks + 1)).all()
+    upto = latest
+    has_more = len(rows) > max_tasks
+    cursor = None
+    if has_more:
+        # Whole revisions are sent when possible, so the next sync can start after the last one
+        boundary = rows[max_tasks].revision
+        complete = [row for row in rows if row.revision < boundary]
+        if complete:
+            rows, upto = complete, boundary - 1
+        else:
+            # The page ends inside a revision: no revision is complete yet
+            rows, upto = rows[:max_tasks], since
+            cursor = encode_cursor({'since': since, 'revision': boundary, 'id': rows[-1].id})
+
+    projects, teams, members = [], [], {}
+    deleted = {'projects': [], 'tasks': []}
+    if cursor is None:
+        projects = db.session.execute(changed_rows(Project, project_fields, project_scope, since, upto)).all()
+        teams = db.session.execute(
+            changed_rows(Team, ('id', 'name', 'leader_id'), Team.id.in_(team_ids), since, upto)
+        ).all()
+        if teams:
+            membership = db.session.execute(
+                select(team_members.c.team_id, team_members.c.user_id)
+                .where(team_members.c.team_id.in_([team.id for team in teams]))
+            )
+            for team_id, user_id in membership:
+                members.setdefault(team_id, []).append(user_id)
+        if since:
+            tombstones = db.session.execute(
+                select(Tombstone.entity, Tombstone.entity_id)
+                .where(Tombstone.team_id.in_(team_ids), Tombstone.revision > since, Tombstone.revision <= upto)
+                .order_by(Tombstone.revision)
+            )
+            for entity, entity_id in tombstones:
+                deleted[f'{entity}s'].append(entity_id)
+
+    team_items = serialize_rows(Team, teams, ('id', 'name', 'leader_id'))
+    for item in team_items:
+        item['member_ids'] = sorted(members.get(item['id'], []))
+    return {
+        'revision': upto,
+        'cursor': cursor,
+        'reset': reset,
+        'has_more': has_more,
+        'team_ids': sorted(team_ids),
+        'teams': team_items,
+        'projects': serialize_rows(Project, projects, project_fields),
+        'tasks': serialize_rows(Task, rows, task_fields),
+        'deleted': deleted,
+    }
+
+def init_sync(app):
+    # db.session is shared by every app, so the listeners are installed once
+    if not event.contains(db.session, 'before_flush', stamp_revisions):
+        event.listen(db.session, 'before_flush', stamp_revisions)
+        event.listen(db.session, 'after_transaction_end', forget_revision)
@@ -0,0 +1,281 @@
+"""
+Signed bearer tokens.
+
+Access tokens are short-lived and carry the user ID and the IDs of the
+teams the user belongs to, so authenticating a request and checking team
+membership needs no database query. Refresh tokens live longer and carry
+only the user ID; exchanging one reloads the memberships.
+
+Revocations (logout, refresh token rotation, membership changes) are
+checked in memory. They are also written to the token_revocation table, which
+every worker process reads for the revocations of the others at most every
+REVOCATION_SYNC_SECONDS: one query for all the requests in that interval.
+"""
+import secrets
+import threading
+import time
+import uuid
+from functools import wraps
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import delete, insert, select
+from app.models.models import db, TokenRevocation
+
+ACCESS_SALT = 'access-token'
+REFRESH_SALT = 'refresh-token'
+
+# Endpoints reachable without a token when AUTH_REQUIRED is set
+PUBLIC_ENDPOINTS = {'userregistration', 'userlogin', 'tokenrefresh'}
+
+class AuthError(Exception):
+    """
+    Raised for a missing, malformed, expired or revoked token
+    """
+
+class Identity:
+    def __init__(self, user_id, team_ids, token_id, expires_at):
+        self.user_id = user_id
+        self.team_ids = frozenset(team_ids)
+        self.token_id = token_id
+        self.expires_at = expires_at
+
+    def in_team(self, team_id):
+        return team_id in self.team_ids
+
+class RevocationList:
+    """
+    Revoked token IDs, plus per-user cut-off times for revoking every token
+    issued to a user before a given moment
+
+    With a `sync_interval`, revocations are shared with the other processes
+    through the token_revocation table; None keeps them in this process.
+    """
+
+    def __init__(self, sync_interval=None):
+        self.tokens = {}
+        self.users = {}
+        self.lock = threading.Lock()
+        self.sync_interval = sync_interval
+        self.sync_lock = threading.Lock()
+        self.synced_at = None
+        # Highest token_revocation row applied
+        self.last_id = 0
+
+    def revoke(self, token_id, expires_at):
+        self.store({'token_id': token_id, 'revoked_at': time.time(), 'expires_at': expires_at})
+        with self.lock:
+            self.tokens[token_id] = expires_at
+            if len(self.tokens) % 1024 == 0:
+                self.purge()
+
+    def revoke_user(self, user_id, max_age, session=None):
+        now = time.time()
+        self.store({'user_id': user_id, 'revoked_at': now, 'expires_at': now + max_age}, session)
+        with self.lock:
+            self.users[user_id] = (now, now + max_age)
+
+    def store(self, row, session=None):
+        """
+        Write a token_revocation row in the transaction of `session`, or in
+        its own
+        """
+        if self.sync_interval is None:
+            return
+        if session is not None:
+            self.write(session, row)
+            return
+        with db.engine.begin() as connection:
+            self.write(connection, row)
+
+    def write(self, connection, row):
+        row_id = connection.execute(insert(TokenRevocation).values(**row)).inserted_primary_key[0]
+        if row_id % 1024 == 0:
+            connection.execute(delete(TokenRevocation).where(TokenRevocation.expires_at < time.time()))
+
+    def sync(self, force=False):
+        """
+        Apply the revocations written by other processes since the last sync,
+        once per `sync_interval` unless `force`d
+        """
+        if self.sync_interval is None:
+            return
+        now = time.monotonic()
+        if not force and self.synced_at is not None and now - self.synced_at < self.sync_interval:
+            return
+        # Requests arriving during a sync check against the revocations already applied
+        if not self.sync_lock.acquire(blocking=not force):
+            return
+        try:
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    select(TokenRevocation)
+                    .where(TokenRevocation.id > self.last_id, TokenRevocation.expires_at > time.time())
+                    .order_by(TokenRevocation.id)
+                ).all()
+            with self.lock:
+                for row in rows:
+                    if row.token_id is not None:
+                        self.tokens[row.token_id] = row.expires_at
+                    elif row.revoked_at > self.users.get(row.user_id, (0, 0))[0]:
+                        self.users[row.user_id] = (row.revoked_at, row.expires_at)
+            if rows:
+                self.last_id = rows[-1].id
+            self.synced_at = now
+        finally:
+            self.sync_lock.release()
+
+    def is_revoked(self, token_id, user_id=None, issued_at=None, force_sync=False):
+        self.sync(force_sync)
+        # Plain dict reads, no lock needed on the request path
+        if token_id in self.tokens:
+            return True
+        if user_id is None:
+            return False
+        cutoff = self.users.get(user_id)
+        return cutoff is not None and issued_at <= cutoff[0]
+
+    def purge(self):
+        # Expired tokens are rejected anyway, so their entries can go
+        now = time.time()
+        self.tokens = {key: expires for key, expires in self.tokens.items() if expires > now}
+        self.users = {key: value for key, value in self.users.items() if value[1] > now}
+
+class TokenManager:
+    def __init__(self, secret_key, access_ttl=900, refresh_ttl=86400, sync_interval=None):
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self.access = URLSafeTimedSerializer(secret_key, salt=ACCESS_SALT)
+        self.refresh = URLSafeTimedSerializer(secret_key, salt=REFRESH_SALT)
+        self.revoked = RevocationList(sync_interval)
+
+    def issue(self, user_id, team_ids):
+        """
+        Returns:
+            dict: Access and refresh token pair, as returned by /api/login
+        """
+        now = time.time()
+        access_token = self.access.dumps({
+            'uid': user_id, 'teams': sorted(team_ids), 'jti': uuid.uuid4().hex, 'iat': now
+        })
+        refresh_token = self.refresh.dumps({'uid': user_id, 'jti': uuid.uuid4().hex, 'iat': now})
+        return {
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'token_type': 'Bearer',
+            'expires_in': self.access_ttl
+        }
+
+    def load(self, serializer, token, max_age):
+        try:
+            return serializer.loads(token, max_age=max_age)
+        except BadSignature:
+            # Also covers SignatureExpired
+            raise AuthError('Invalid or expired token')
+
+    def verify_access(self, token):
+        payload = self.load(self.access, token, self.access_ttl)
+        if self.revoked.is_revoked(payload['jti'], payload['uid'], payload['iat']):
+            raise AuthError('Token has been revoked')
+        return Identity(payload['uid'], payload['teams'], payload['jti'], payload['iat'] + self.access_ttl)
+
+    def verify_refresh(self, token):
+        # Per-user cut-offs only apply to access tokens, so a refresh token
+        # still works after a membership change and picks up the new teams.
+        # Refresh tokens are single use, so another worker's rotation must be seen now
+        payload = self.load(self.refresh, token, self.refresh_ttl)
+        if self.revoked.is_revoked(payload['jti'], force_sync=True):
+            raise AuthError('Token has been revoked')
+        return payload
+
+    def revoke_access(self, identity):
+        self.revoked.revoke(identity.token_id, identity.expires_at)
+
+    def revoke_refresh(self, payload):
+        self.revoked.revoke(payload['jti'], payload['iat'] + self.refresh_ttl)
+
+    def revoke_user(self, user_id, session=None):
+        """
+        Invalidate the user's current access tokens, e.g. after their team
+        memberships changed; clients then refresh to get the new teams
+
+        Args:
+            session: Session whose transaction makes the change, so the
+                     revocation commits (or rolls back) with it
+        """
+        self.revoked.revoke_user(user_id, self.access_ttl, session)
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    return token.strip()
+
+def authenticate(tokens, required):
+    g.identity = None
+    token = bearer_token()
+    if token is None:
+        if (required and request.method != 'OPTIONS' and request.path.startswith('/api/')
+                and request.endpoint not in PUBLIC_ENDPOINTS):
+            return {'message': 'Authentication required'}, 401
+        return None
+    try:
+        g.identity = tokens.verify_access(token)
+    except AuthError as e:
+        return {'message': str(e)}, 401
+    return None
+
+def get_tokens():
+    return current_app.extensions['tokens']
+
+def current_identity():
+    return g.get('identity')
+
+def login_required(method):
+    """
+    Reject the request with 401 unless it carries a valid access token
+    """
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        if current_identity() is None:
+            return {'message': 'Authentication required'}, 401
+        return method(*args, **kwargs)
+    return wrapper
+
+def team_access_denied(team_id):
+    """
+    Membership check from the token, for handlers acting on a team
+
+    Returns:
+        tuple: A 403 response if the caller may not act on `team_id`,
+               otherwise None. Without AUTH_REQUIRED, anonymous calls pass.
+    """
+    identity = current_identity()
+    if identity is None:
+        if current_app.config.get('AUTH_REQUIRED', False):
+            return {'message': 'Authentication required'}, 401
+        return None
+    if not identity.in_team(team_id):
+        return {'message': 'Not a member of this team'}, 403
+    return None
+
+def init_auth(app):
+    secret_key = app.config.get('SECRET_KEY')
+    if not secret_key:
+        # Tokens then only verify in this process and die with it
+        app.logger.warning("SECRET_KEY is not set; using a random key for auth tokens")
+        secret_key = secrets.token_hex(32)
+    tokens = TokenManager(
+        secret_key,
+        access_ttl=app.config.get('ACCESS_TOKEN_TTL', 900),
+        refresh_ttl=app.config.get('REFRESH_TOKEN_TTL', 86400),
+        sync_interval=app.config.get('REVOCATION_SYNC_SECONDS', 1.0)
+    )
+    app.extensions['tokens'] = tokens
+    required = app.config.get('AUTH_REQUIRED', False)
+
+    @app.before_request
+    def authenticate_request():
+        return authenticate(tokens, required)
+
+    return tokens
@@ -0,0 +1,75 @@
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app.models.models import db
+from app import migrations
+from app.routing import shard_engines, writable_engines
+
+db_cli = AppGroup('db', help='Database schema commands.')
+
+@db_cli.command('upgrade')
+def upgrade_command():
+    """Create missing tables and apply pending migrations (on every shard)."""
+    for engine in writable_engines(current_app):
+        db.metadata.create_all(engine)
+        version = migrations.upgrade(engine, logger=current_app.logger)
+        click.echo(f"Database {engine.url!r} is at schema version {version}")
+
+@db_cli.command('version')
+def version_command():
+    """Show the current schema version."""
+    for engine in writable_engines(current_app):
+        with engine.begin() as connection:
+            version = migrations.current_version(connection)
+        click.echo(f"{engine.url!r}: current: {version}, latest: {migrations.LATEST_VERSION}")
+
+@db_cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the task statistics summary tables."""
+    from app.api.stats import rebuild_stats
+    tasks = 0
+    for engine in shard_engines(current_app):
+        with engine.begin() as connection:
+            tasks += rebuild_stats(connection)
+    click.echo(f"Rebuilt task statistics from {tasks} tasks")
+
+@db_cli.command('purge-tombstones')
+@click.option('--days', type=int, default=None, help='Keep tombstones younger than this (default SYNC_TOMBSTONE_DAYS).')
+def purge_tombstones_command(days):
+    """Delete old delta sync tombstones."""
+    from app.api.sync import purge_tombstones
+    if days is None:
+        days = current_app.config.get('SYNC_TOMBSTONE_DAYS', 30)
+    purged = 0
+    for engine in shard_engines(current_app):
+        with engine.begin() as connection:
+            purged += purge_tombstones(connection, days)
+    click.echo(f"Purged {purged} tombstones older than {days} days")
+
+@db_cli.command('compact-activity')
+def compact_activity_command():
+    """Merge old runs of task updates in the activity log and delete expired entries."""
+    from app.api.activity import compact_activity
+    config = current_app.config
+    merged = expired = 0
+    for engine in shard_engines(current_app):
+        counts = compact_activity(engine, config.get('ACTIVITY_COMPACT_DAYS', 30),
+                                  config.get('ACTIVITY_COMPACT_WINDOW_MINUTES', 60),
+                                  config.get('ACTIVITY_RETENTION_DAYS', 365))
+        merged += counts[0]
+        expired += counts[1]
+    click.echo(f"Merged away {merged} activity entries and deleted {expired} expired ones")
+
+reminders_cli = AppGroup('reminders', help='Due-date reminder commands.')
+
+@reminders_cli.command('send')
+def send_reminders_command():
+    """Queue reminder emails for tasks due soon or overdue."""
+    from app.api.reminders import send_due_reminders
+    totals = send_due_reminders(current_app.config)
+    click.echo(f"Queued {totals['emails']} emails covering {totals['tasks']} tasks "
+               f"({totals['assignees']} assignees with due tasks)")
+
+def register_commands(app):
+    app.cli.add_command(db_cli)
+    app.cli.add_command(reminders_cli)
@@ -0,0 +1,110 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+
+def sqlite_pragmas(config):
+    """
+    PRAGMA statements run on every new SQLite connection
+
+    WAL lets readers proceed while a writer holds the lock, and busy_timeout
+    makes concurrent writers wait instead of failing with "database is locked".
+    """
+    pragmas = [
+        f"PRAGMA journal_mode={config.get('SQLITE_JOURNAL_MODE', 'WAL')}",
+        f"PRAGMA synchronous={config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}",
+        f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}",
+        f"PRAGMA cache_size=-{int(config.get('SQLITE_CACHE_SIZE_KB', 65536))}",
+        f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE', 268435456))}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    # Enforce foreign keys and their ON DELETE CASCADE; not with sharding, as shards hold
+    # projects without their teams and users
+    if config.get('SQLITE_FOREIGN_KEYS', False) and not config.get('SQLALCHEMY_SHARD_URIS'):
+        pragmas.append("PRAGMA foreign_keys=ON")
+    return pragmas
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised when a handler runs more SQL statements than its query budget
+    """
+
+# Counters registered by count_queries(), per thread
+listeners = threading.local()
+
+def get_query_count():
+    # Number of SQL statements run in the current app/request context
+    return g.get('query_count', 0) if has_app_context() else 0
+
+@contextmanager
+def count_queries():
+    """
+    Count the SQL statements run by the current thread inside the block, e.g.
+    in a test:
+
+        with count_queries() as counter:
+            client.get('/api/teams/1')
+        assert counter['count'] <= 2
+
+    Statements of other threads (outbox workers, other requests) are not counted.
+    """
+    counter = {'count': 0}
+    if not hasattr(listeners, 'counters'):
+        listeners.counters = []
+    listeners.counters.append(counter)
+    try:
+        yield counter
+    finally:
+        listeners.counters.remove(counter)
+
+def query_budget(limit):
+    """
+    Declare the maximum number of SQL statements a Resource method may run
+
+    Going over budget logs a warning, or raises QueryBudgetExceeded when
+    QUERY_BUDGET_ENFORCE is set (as it should be in tests). A request not
+    routed to one shard may run its queries once per shard.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            from app.routing import selected_shard, shard_count
+            budget = limit if selected_shard() is not None else limit * max(1, shard_count())
+            start = get_query_count()
+            result = method(*args, **kwargs)
+            used = get_query_count() - start
+            if used > budget:
+                message = f"{method.__qualname__} ran {used} queries (budget {budget})"
+                if current_app.config.get('QUERY_BUDGET_ENFORCE', False):
+                    raise QueryBudgetExceeded(message)
+                current_app.logger.warning(message)
+            return result
+        return wrapper
+    return decorator
+
+def configure_engine(app, engine):
+    """
+    Apply per-connection tuning to `engine` and count statements per context
+
+    Only SQLite needs connection tuning; other databases
+    (DATABASE_URL=postgresql://...) are tuned on the server and through
+    SQLALCHEMY_ENGINE_OPTIONS.
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        if has_app_context():
+            g.query_count = g.get('query_count', 0) + 1
+        for counter in getattr(listeners, 'counters', ()):
+            counter['count'] += 1
+
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
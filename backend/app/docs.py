@@ -0,0 +1,46 @@
+"""
+Swagger UI for docs/openapi.yaml.
+
+With LAZY_STARTUP, flask_swagger_ui is not imported at start-up: its URLs
+are routed to a view that builds the UI on the first request, in a small
+Flask app of its own (blueprints cannot be registered once the main app has
+served a request), and forwards every request to it.
+"""
+import threading
+from flask import Flask, Response, request
+
+def swaggerui_blueprint(base_url, api_url, config):
+    from flask_swagger_ui import get_swaggerui_blueprint
+    return get_swaggerui_blueprint(base_url, api_url, config=config)
+
+class LazySwaggerUI:
+    def __init__(self, base_url, api_url, config=None):
+        self.base_url = base_url
+        self.api_url = api_url
+        self.config = config
+        self.app = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            if self.app is None:
+                app = Flask(__name__)
+                app.register_blueprint(swaggerui_blueprint(self.base_url, self.api_url, self.config),
+                                       url_prefix=self.base_url)
+                self.app = app
+        return self.app
+
+    def view(self, path=None):
+        return Response.from_app(self.app or self.load(), request.environ)
+
+def init_swagger_ui(app, base_url, api_url, config=None):
+    """
+    Serve the Swagger UI for `api_url` under `base_url`
+    """
+    if not app.config.get('LAZY_STARTUP', False):
+        app.register_blueprint(swaggerui_blueprint(base_url, api_url, config), url_prefix=base_url)
+        return
+    ui = LazySwaggerUI(base_url, api_url, config)
+    prefix = base_url.rstrip('/')
+    app.add_url_rule(f'{prefix}/', 'swagger_ui', ui.view)
+    app.add_url_rule(f'{prefix}/<path:path>', 'swagger_ui', ui.view)
@@ -0,0 +1,209 @@
+"""
+Request-level performance instrumentation.
+
+Records per-endpoint latency, response size and SQL statement counts/time,
+plus notification and start-up timings, and exposes them at /metrics in the
+Prometheus text exposition format. Metrics are kept per process; with several gunicorn
+workers each worker reports its own series.
+"""
+import cProfile
+import os
+import random
+import threading
+import time
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+class Counter:
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, key)} {value}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = format_labels(self.labels + ('le',), key + (bound,))
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                lines.append(f'{self.name}_bucket{format_labels(self.labels + ("le",), key + ("+Inf",))} {series[-2]}')
+                lines.append(f'{self.name}_count{format_labels(self.labels, key)} {series[-2]}')
+                lines.append(f'{self.name}_sum{format_labels(self.labels, key)} {series[-1]}')
+        return lines
+
+class Gauge:
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            self.values[key] = value
+
+    def has(self, **labels):
+        return tuple(labels.get(name, '') for name in self.labels) in self.values
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} gauge']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, key)} {value}')
+        return lines
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by endpoint and method.',
+                            ('endpoint', 'method'))
+REQUESTS = Counter('http_requests_total', 'Requests by endpoint, method and status.',
+                   ('endpoint', 'method', 'status'))
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size by endpoint and method.',
+                          ('endpoint', 'method'), SIZE_BUCKETS)
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'SQL statements run per request.',
+                            ('endpoint', 'method'), COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram('http_request_db_seconds', 'Time spent in SQL per request.',
+                            ('endpoint', 'method'))
+QUERY_LATENCY = Histogram('db_query_duration_seconds', 'Latency of individual SQL statements.')
+NOTIFICATION_LATENCY = Histogram('notification_duration_seconds',
+                                 'Time to queue (enqueue) or deliver (deliver) one email.', ('stage',))
+# Workers forked from a preloaded gunicorn master report the master's stages
+STARTUP_SECONDS = Gauge('app_startup_seconds',
+                        'Time taken by each start-up stage (import, create_app, schema, warm_up).', ('stage',))
+
+METRICS = [REQUEST_LATENCY, REQUESTS, RESPONSE_SIZE, REQUEST_QUERIES, REQUEST_DB_TIME,
+           QUERY_LATENCY, NOTIFICATION_LATENCY, STARTUP_SECONDS]
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def endpoint_label():
+    # Flask-RESTful names endpoints after the Resource class, e.g. 'taskresource'
+    return request.endpoint or 'unmatched'
+
+def start_request(profile_rate):
+    g.request_started = time.perf_counter()
+    g.sql_time = 0.0
+    g.query_count_start = g.get('query_count', 0)
+
+    if profile_rate and random.random() < profile_rate:
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+def finish_request(response, server_timing, profile_dir):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = endpoint_label()
+    method = request.method
+    queries = g.get('query_count', 0) - g.get('query_count_start', 0)
+    sql_time = g.get('sql_time', 0.0)
+
+    REQUEST_LATENCY.observe(elapsed, endpoint=endpoint, method=method)
+    REQUESTS.inc(endpoint=endpoint, method=method, status=response.status_code)
+    REQUEST_QUERIES.observe(queries, endpoint=endpoint, method=method)
+    REQUEST_DB_TIME.observe(sql_time, endpoint=endpoint, method=method)
+    # Streamed responses have no length up front
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, endpoint=endpoint, method=method)
+
+    if server_timing:
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.2f}, db;dur={sql_time * 1000:.2f};desc="{queries} queries"'
+        )
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        filename = f'{endpoint}-{method}-{int(time.time() * 1000)}.prof'
+        profiler.dump_stats(os.path.join(profile_dir, filename))
+    return response
+
+def instrument_engine(engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finish_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        QUERY_LATENCY.observe(elapsed)
+        if has_app_context() and 'sql_time' in g:
+            g.sql_time += elapsed
+
+def init_metrics(app, *engines):
+    """
+    Install the request hooks, SQL timing on `engines` and the /metrics endpoint
+    """
+    if not app.config.get('METRICS_ENABLED', False):
+        return
+    server_timing = app.config.get('SERVER_TIMING', False)
+    profile_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+    profile_dir = app.config.get('PROFILER_DIR', 'profiles')
+
+    for engine in engines:
+        instrument_engine(engine)
+
+    @app.before_request
+    def before_request():
+        start_request(profile_rate)
+
+    @app.after_request
+    def after_request(response):
+        return finish_request(response, server_timing, profile_dir)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,175 @@
+"""
+Versioned schema migrations.
+
+`db.create_all()` only creates missing tables, so it never adds columns or
+indexes to tables that already exist in a deployed `data/app.db`. Schema
+changes are therefore also recorded here as numbered migrations and applied
+in order by `upgrade()`. The current version is kept in the `schema_version`
+table.
+
+Migrations must be idempotent (CREATE ... IF NOT EXISTS), because a fresh
+database created by `db.create_all()` already has the latest schema. New
+tables need a migration too: the servers call `ensure_schema()`, which skips
+`db.create_all()` when the database is already at the latest version.
+"""
+import time
+from sqlalchemy import inspect, text
+from app.models.models import db
+
+def create_table(name):
+    def migrate(connection):
+        db.metadata.tables[name].create(connection, checkfirst=True)
+    return migrate
+
+def create_stats_tables(connection):
+    from app.api.stats import rebuild_stats
+    for name in ('task_stat', 'task_due_stat'):
+        db.metadata.tables[name].create(connection, checkfirst=True)
+    # Backfill from the existing tasks
+    rebuild_stats(connection)
+
+def create_search_index(connection):
+    from app.api.search import create_search_index
+    create_search_index(connection)
+
+def add_column(table, name, ddl):
+    def migrate(connection):
+        # ALTER TABLE ... ADD COLUMN has no IF NOT EXISTS
+        if name not in {column['name'] for column in inspect(connection).get_columns(table)}:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+    return migrate
+
+def create_sync_tables(connection):
+    for name in ('sync_state', 'tombstone'):
+        db.metadata.tables[name].create(connection, checkfirst=True)
+    for table in ('team', 'project', 'task'):
+        add_column(table, 'revision', 'BIGINT NOT NULL DEFAULT 0')(connection)
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_project_team_id_revision ON project (team_id, revision)'))
+    connection.execute(text('CREATE INDEX IF NOT EXISTS ix_task_project_id_revision ON task (project_id, revision)'))
+    # Existing rows keep revision 0 and are part of every full sync
+    connection.execute(text(
+        'INSERT INTO sync_state (id, revision, purged_revision) '
+        'SELECT 1, 0, 0 WHERE NOT EXISTS (SELECT 1 FROM sync_state)'
+    ))
+
+def create_id_sequences(connection):
+    db.metadata.tables['id_sequence'].create(connection, checkfirst=True)
+    # Start above the existing IDs (next_value * shards + shard > max(id) for any number of shards)
+    for table in ('project', 'task'):
+        connection.execute(text(
+            f"INSERT INTO id_sequence (name, next_value) SELECT '{table}', (SELECT COALESCE(MAX(id), 0) FROM {table}) "
+            f"WHERE NOT EXISTS (SELECT 1 FROM id_sequence WHERE name = '{table}')"
+        ))
+
+def add_delete_cascades(connection):
+    for name in ('archived_project', 'archived_task', 'background_job'):
+        db.metadata.tables[name].create(connection, checkfirst=True)
+    # SQLite cannot alter a foreign key without rebuilding the table; there the
+    # cascades only apply to new databases (deletion does not depend on them)
+    if connection.dialect.name == 'sqlite':
+        return
+    inspector = inspect(connection)
+    for table, column in (('task', 'project_id'), ('project', 'team_id'),
+                          ('team_members', 'team_id'), ('team_members', 'user_id')):
+        for key in inspector.get_foreign_keys(table):
+            if key['constrained_columns'] == [column]:
+                connection.execute(text(
+                    f"ALTER TABLE {table} DROP CONSTRAINT {key['name']}, ADD CONSTRAINT {key['name']} "
+                    f"FOREIGN KEY ({column}) REFERENCES \"{key['referred_table']}\" (id) ON DELETE CASCADE"
+                ))
+
+def run_sql(*statements):
+    def migrate(connection):
+        for statement in statements:
+            connection.execute(text(statement))
+    return migrate
+
+# (version, description, migration function taking a Connection)
+MIGRATIONS = [
+    (1, 'Notification outbox table', create_table('notification_outbox')),
+    (2, 'Indexes on hot query columns', run_sql(
+        'CREATE INDEX IF NOT EXISTS ix_task_project_id ON task (project_id)',
+        'CREATE INDEX IF NOT EXISTS ix_task_assignee_id ON task (assignee_id)',
+        'CREATE INDEX IF NOT EXISTS ix_task_status ON task (status)',
+        'CREATE INDEX IF NOT EXISTS ix_task_due_date ON task (due_date)',
+        'CREATE INDEX IF NOT EXISTS ix_task_project_id_status ON task (project_id, status)',
+        'CREATE INDEX IF NOT EXISTS ix_task_assignee_id_due_date ON task (assignee_id, due_date)',
+        'CREATE INDEX IF NOT EXISTS ix_project_team_id ON project (team_id)',
+        'CREATE INDEX IF NOT EXISTS ix_team_leader_id ON team (leader_id)',
+        'CREATE INDEX IF NOT EXISTS ix_team_members_user_id ON team_members (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_notification_outbox_status_next_attempt_at '
+        'ON notification_outbox (status, next_attempt_at)',
+    )),
+    (3, 'Task statistics summary tables', create_stats_tables),
+    (4, 'Full-text search index on tasks and projects', create_search_index),
+    (5, 'Revisions and tombstones for delta sync', create_sync_tables),
+    (6, 'Due-date reminder log', create_table('reminder_log')),
+    (7, 'ID sequences for sharded projects and tasks', create_id_sequences),
+    (8, 'Covering index for tasks by assignee and due date', run_sql(
+        'CREATE INDEX IF NOT EXISTS ix_task_assignee_id_due_date_covering '
+        'ON task (assignee_id, due_date, id, status, project_id, title)',
+        # A prefix of the covering index
+        'DROP INDEX IF EXISTS ix_task_assignee_id_due_date',
+    )),
+    (9, 'ON DELETE CASCADE, archive and background job tables', add_delete_cascades),
+    (10, 'Activity log', create_table('activity')),
+    (11, 'Response cache tag versions', create_table('cache_tag')),
+    (12, 'Shared token revocations', create_table('token_revocation')),
+    (13, 'Change events shared by the workers', create_table('change_event')),
+    (14, 'Idempotency-Key records shared by the workers', create_table('idempotency_record')),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(connection):
+    connection.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+    version = connection.execute(text('SELECT MAX(version) FROM schema_version')).scalar()
+    return version or 0
+
+def upgrade(engine=None, logger=None):
+    """
+    Apply all pending migrations, each in its own transaction
+
+    Args:
+        engine: Engine to migrate (defaults to db.engine in the app context)
+        logger: Optional logger for progress messages
+
+    Returns:
+        int: The schema version after upgrading
+    """
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        version = current_version(connection)
+
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as connection:
+            migrate(connection)
+            connection.execute(text('INSERT INTO schema_version (version) VALUES (:version)'), {'version': number})
+        if logger:
+            logger.info(f"Applied migration {number}: {description}")
+        version = number
+    return version
+
+def ensure_schema(engine=None, logger=None):
+    """
+    Create missing tables and apply pending migrations, unless the database
+    is already at LATEST_VERSION
+
+    Checking the version is one query, while create_all() inspects every
+    table, so restarts against a current database go straight to serving.
+
+    Returns:
+        int: The schema version
+    """
+    from app.startup import record_stage
+    started = time.perf_counter()
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        version = current_version(connection)
+    if version < LATEST_VERSION:
+        db.metadata.create_all(engine)
+        version = upgrade(engine, logger)
+    record_stage('schema', started)
+    return version
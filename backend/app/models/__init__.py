@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from app.routing import RoutingSession
 
-db = SQLAlchemy()
+# Sends each statement to the primary database, a read replica or a shard
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
\ No newline at end of file
@@ -1,11 +1,18 @@
 from datetime import datetime, timezone
-from flask_sqlalchemy import SQLAlchemy
-from . import db, bcrypt
+from . import db
+
+def utcnow():
+    # Naive UTC timestamp, matching how SQLite stores DateTime columns
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+TASK_STATUSES = ('TO-DO', 'IN_PROGRESS', 'DONE')
 
 # Association table for team members
 team_members = db.Table('team_members',
-    db.Column('team_id', db.Integer, db.ForeignKey('team.id'), primary_key=True),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    db.Column('team_id', db.Integer, db.ForeignKey('team.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key covers team -> members; this covers user -> teams
+    db.Index('ix_team_members_user_id', 'user_id')
 )
 
 class User(db.Model):
@@ -20,23 +27,221 @@ class User(db.Model):
 class Team(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    leader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    projects = db.relationship('Project', backref='team', lazy=True)
+    leader_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    # Sync revision of the last change, including membership changes (see app/api/sync.py)
+    revision = db.Column(db.BigInteger, nullable=False, server_default='0')
+    # Deleted with set-based SQL (app/api/deletion.py), never by loading the children
+    projects = db.relationship('Project', backref='team', lazy=True, cascade='all', passive_deletes=True)
 
 class Project(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
-    tasks = db.relationship('Task', backref='project', lazy=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    tasks = db.relationship('Task', backref='project', lazy=True, cascade='all', passive_deletes=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id', ondelete='CASCADE'), nullable=False, index=True)
+    revision = db.Column(db.BigInteger, nullable=False, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_project_team_id_revision', 'team_id', 'revision'),
+    )
 
 class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    status = db.Column(db.String(20), default='TO-DO')  # TO-DO, IN_PROGRESS, DONE
+    status = db.Column(db.String(20), default='TO-DO', index=True)  # TO-DO, IN_PROGRESS, DONE
+    due_date = db.Column(db.DateTime, index=True)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False, index=True)
+    assignee_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    revision = db.Column(db.BigInteger, nullable=False, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_task_project_id_status', 'project_id', 'status'),
+        # Covers the "my tasks" page (see app/api/assignments.py)
+        db.Index('ix_task_assignee_id_due_date_covering', 'assignee_id', 'due_date', 'id', 'status', 'project_id',
+                 'title'),
+        db.Index('ix_task_project_id_revision', 'project_id', 'revision'),
+    )
+
+class NotificationOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='PENDING')  # PENDING, SENDING, SENT, FAILED
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=utcnow)
+    next_attempt_at = db.Column(db.DateTime, default=utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+class ReminderLog(db.Model):
+    # Due-date reminders already queued, so each is sent once per due date
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # due_soon, overdue
+    due_date = db.Column(db.DateTime, nullable=False)
+    assignee_id = db.Column(db.Integer, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('task_id', 'kind', 'due_date', name='uq_reminder_log_task_id_kind_due_date'),
+        db.Index('ix_reminder_log_due_date', 'due_date'),
+    )
+
+# Summary tables maintained by app/api/stats.py; assignee_id 0 means unassigned
+class TaskStat(db.Model):
+    project_id = db.Column(db.Integer, primary_key=True)
+    assignee_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_task_stat_assignee_id', 'assignee_id'),
+    )
+
+class TaskDueStat(db.Model):
+    # Tasks not yet DONE, per day they are due
+    project_id = db.Column(db.Integer, primary_key=True)
+    assignee_id = db.Column(db.Integer, primary_key=True)
+    due_day = db.Column(db.Date, primary_key=True)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_task_due_stat_assignee_id_due_day', 'assignee_id', 'due_day'),
+    )
+
+# Rows copied by an archiving delete (see app/api/deletion.py), keeping their IDs
+class ArchivedProject(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    created_at = db.Column(db.DateTime)
+    team_id = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_archived_project_team_id', 'team_id'),
+    )
+
+class ArchivedTask(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    status = db.Column(db.String(20))
     due_date = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
-    assignee_id = db.Column(db.Integer, db.ForeignKey('user.id'))
\ No newline at end of file
+    created_at = db.Column(db.DateTime)
+    project_id = db.Column(db.Integer, nullable=False)
+    assignee_id = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_archived_task_project_id', 'project_id'),
+    )
+
+class BackgroundJob(db.Model):
+    # A deletion running in a background thread, polled at /api/jobs/<id>
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # delete_project, delete_team
+    target_id = db.Column(db.Integer, nullable=False)
+    archive = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(20), nullable=False, default='PENDING')  # PENDING, RUNNING, DONE, FAILED
+    # Tasks to delete, and deleted so far
+    total = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    finished_at = db.Column(db.DateTime)
+
+# Append-only log of changes behind the activity feeds, see app/api/activity.py.
+# No foreign keys: the history outlives deleted tasks and projects
+class Activity(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    team_id = db.Column(db.Integer, nullable=False)
+    project_id = db.Column(db.Integer)
+    task_id = db.Column(db.Integer)
+    # User who made the change, None for anonymous calls and background jobs
+    actor_id = db.Column(db.Integer)
+    action = db.Column(db.String(30), nullable=False)  # e.g. task.updated, member.added
+    # Compact JSON of the changed fields, {"status": ["TO-DO", "DONE"]} for an update
+    changes = db.Column(db.Text)
+
+    __table_args__ = (
+        # Keyset reads of the feeds, newest first
+        db.Index('ix_activity_team_id_id', 'team_id', 'id'),
+        db.Index('ix_activity_project_id_id', 'project_id', 'id'),
+        db.Index('ix_activity_created_at', 'created_at'),
+    )
+
+# Per-shard ID allocation for projects and tasks, see app/routing.py
+class IdSequence(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+
+# Change tracking for delta sync, maintained by app/api/sync.py
+class SyncState(db.Model):
+    # Single row: the last revision handed out, and the newest revision
+    # whose tombstones have been purged
+    id = db.Column(db.Integer, primary_key=True)
+    revision = db.Column(db.BigInteger, nullable=False, server_default='0')
+    purged_revision = db.Column(db.BigInteger, nullable=False, server_default='0')
+
+class Tombstone(db.Model):
+    # A deleted project or task, or a project that moved to another team
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)  # project, task
+    entity_id = db.Column(db.Integer, nullable=False)
+    project_id = db.Column(db.Integer, nullable=False)
+    team_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+    __table_args__ = (
+        db.Index('ix_tombstone_team_id_revision', 'team_id', 'revision'),
+        db.Index('ix_tombstone_deleted_at', 'deleted_at'),
+    )
+
+# Response cache tag versions shared by all worker processes, see app/api/cache.py
+class CacheTag(db.Model):
+    tag = db.Column(db.String(200), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+# Token revocations shared by all worker processes, see app/auth.py. Times are
+# Unix timestamps, like the `iat` claim of the tokens
+class TokenRevocation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # A revoked token, or every access token issued to `user_id` up to `revoked_at`
+    token_id = db.Column(db.String(32))
+    user_id = db.Column(db.Integer)
+    revoked_at = db.Column(db.Float, nullable=False)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
+
+# Idempotency-Key records shared by all worker processes, see app/api/idempotency.py.
+# `expires_at` is a Unix timestamp
+class IdempotencyRecord(db.Model):
+    # Hash of the key scoped to the caller, method and path
+    key = db.Column(db.String(32), primary_key=True)
+    fingerprint = db.Column(db.LargeBinary(16), nullable=False)
+    state = db.Column(db.Integer, nullable=False)  # 0 while the first attempt runs, then 1
+    status = db.Column(db.Integer)
+    body = db.Column(db.LargeBinary)
+    # JSON object of the stored response headers
+    headers = db.Column(db.Text)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
+
+# Recent change events, shared by all worker processes, see app/api/events.py
+class ChangeEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(50), nullable=False)
+    # JSON list of channels, e.g. ["team:1", "project:5"], and the JSON payload
+    channels = db.Column(db.Text, nullable=False)
+    data = db.Column(db.Text, nullable=False)
@@ -0,0 +1,104 @@
+"""
+Password hashing and verification off the request thread.
+
+bcrypt is deliberately slow, so a burst of logins would otherwise occupy
+every request thread with hashing. Hashing and verification are run on a
+small bounded thread pool instead (the bcrypt C extension releases the GIL,
+so the pool uses real cores); requests that cannot get a slot within
+PASSWORD_HASH_TIMEOUT seconds are rejected with PasswordHasherBusy.
+"""
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.models import bcrypt
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when the hashing pool and its queue are full
+    """
+
+def hash_rounds(password_hash):
+    # '$2b$12$...' -> 12
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def is_bcrypt_hash(value):
+    return isinstance(value, str) and value.startswith(('$2a$', '$2b$', '$2y$')) and len(value) == 60
+
+def hash_password(password, rounds=None):
+    return bcrypt.generate_password_hash(password, rounds).decode('utf-8')
+
+def check_password(password_hash, password, rounds):
+    """
+    Verify `password` against a stored value
+
+    Returns:
+        tuple: (matches, needs_rehash); rows created before passwords were
+               hashed hold the plain password and are rehashed on login too
+    """
+    if not is_bcrypt_hash(password_hash):
+        matches = hmac.compare_digest(str(password_hash).encode('utf-8'), password.encode('utf-8'))
+        return matches, matches
+    matches = bcrypt.check_password_hash(password_hash, password)
+    return matches, matches and hash_rounds(password_hash) != rounds
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, queue_size=32, timeout=5.0):
+        self.rounds = rounds
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        # Running plus waiting jobs, so a login storm cannot queue unbounded work
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self._dummy_hash = None
+
+    @property
+    def dummy_hash(self):
+        # Compared against when the user does not exist, so unknown emails
+        # take as long as wrong passwords. Computed on first use (or by
+        # warm_up()) rather than on every process start.
+        if self._dummy_hash is None:
+            self._dummy_hash = hash_password('not-a-real-password', self.rounds)
+        return self._dummy_hash
+
+    def run(self, function, *args):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy('Too many concurrent logins, try again shortly')
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self.run(hash_password, password, self.rounds)
+
+    def verify(self, password_hash, password):
+        """
+        Returns:
+            tuple: (matches, needs_rehash)
+        """
+        if password_hash is None:
+            self.run(check_password, self.dummy_hash, password, self.rounds)
+            return False, False
+        return self.run(check_password, password_hash, password, self.rounds)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+def init_passwords(app):
+    hasher = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        queue_size=app.config.get('PASSWORD_HASH_QUEUE', 32),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 5.0)
+    )
+    app.extensions['password_hasher'] = hasher
+    return hasher
+
+def get_hasher():
+    return current_app.extensions['password_hasher']
@@ -0,0 +1,376 @@
+"""
+Read replicas and sharding of project data by team.
+
+`db.session` is a RoutingSession, which picks the database of every
+statement in `get_bind()`:
+
+- Read replicas (DATABASE_REPLICA_URLS): GET and HEAD requests read from a
+  replica of the primary database, unless the request has already written,
+  or the same client wrote less than DATABASE_REPLICA_STICKY_SECONDS ago (so
+  a client re-reading what it just changed is not served from a replica that
+  is behind, while other clients' reads stay on the replicas). A client is
+  the subject of its bearer token, or, for every client, a short-lived
+  cookie set on the responses of requests that wrote. Handlers that must see
+  the latest data use @use_primary. Flushes and INSERT/UPDATE/DELETE
+  statements always go to the primary.
+  Keeping the replicas up to date is left to the database (streaming
+  replication, or e.g. Litestream/LiteFS for SQLite files).
+
+- Shards (DATABASE_SHARD_URLS): projects, tasks and the tables kept per
+  project (statistics, search index, reminder log) live in the shard of
+  their team, `team_id % number of shards`. Users, teams and memberships
+  stay in the primary database. New project and task IDs are allocated per
+  shard so that `id % number of shards` is the shard holding the row, and a
+  request addressing a project, task or team by ID is routed to its shard
+  before the handler runs. Statements on sharded tables without a selected
+  shard raise ShardNotSelected; handlers listing rows of several teams read
+  every shard with shard_rows(). Each shard has its own write lock (or
+  server), so write throughput grows with the number of shards. A write to
+  a shard and to the primary in one request (e.g. a task and its
+  notification email) are committed one after the other, not atomically.
+
+Every database is a Flask-SQLAlchemy bind ('replica-<n>', 'shard-<n>'), so
+it gets the same engine options, SQLite pragmas and metrics as the primary.
+"""
+import heapq
+import math
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, insert, update
+from sqlalchemy.sql.util import find_tables
+
+# Tables holding per-team data, stored on the shards
+SHARDED_TABLES = frozenset((
+    'project', 'task', 'task_stat', 'task_due_stat', 'reminder_log', 'tombstone', 'id_sequence',
+    'task_fts', 'project_fts', 'task_search', 'project_search', 'archived_project', 'archived_task',
+    'activity',
+))
+
+# Session.info keys
+SHARD_KEY = 'shard'
+REPLICA_KEY = 'read_replica'
+WROTE_KEY = 'wrote'
+
+# Set on the responses of requests that wrote, for DATABASE_REPLICA_STICKY_SECONDS
+STICKY_COOKIE = 'read_primary'
+
+class ShardNotSelected(RuntimeError):
+    """
+    Raised when a statement on a sharded table runs without a selected shard
+    """
+
+class Router:
+    def __init__(self, replica_keys, shard_keys, sticky_seconds):
+        self.replica_keys = replica_keys
+        self.shard_keys = shard_keys
+        self.sticky_seconds = sticky_seconds
+        # monotonic() of the last write of each token subject in this process
+        self.last_writes = {}
+        self.lock = threading.Lock()
+
+    def record_write(self, subject):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.last_writes) >= 10000:
+                # Forget the subjects that are no longer sticky
+                self.last_writes = {key: at for key, at in self.last_writes.items()
+                                    if now - at <= self.sticky_seconds}
+            self.last_writes[subject] = now
+
+    def wrote_recently(self, subject):
+        return time.monotonic() - self.last_writes.get(subject, float('-inf')) <= self.sticky_seconds
+
+    @property
+    def shard_count(self):
+        return len(self.shard_keys)
+
+    def bind_key(self, session, mapper, clause):
+        """
+        The bind key for a statement, or None for the primary database
+        """
+        if self.shard_keys and SHARDED_TABLES.intersection(statement_tables(mapper, clause)):
+            shard = session.info.get(SHARD_KEY)
+            if shard is None:
+                raise ShardNotSelected('No shard selected for a statement on project data')
+            return self.shard_keys[shard]
+        # A flush asks for the bind of a mapper without a statement
+        if (self.replica_keys and session.info.get(REPLICA_KEY) and not session.info.get(WROTE_KEY)
+                and clause is not None and not getattr(clause, 'is_dml', False)):
+            return random.choice(self.replica_keys)
+        return None
+
+def statement_tables(mapper, clause):
+    names = set()
+    if mapper is not None:
+        names.update(table.name for table in mapper.tables)
+    if clause is not None:
+        names.update(getattr(table, 'name', None) for table in find_tables(
+            clause, include_aliases=True, include_joins=True, include_crud=True))
+    return names
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            router = current_app.extensions.get('router')
+            if router is not None:
+                key = router.bind_key(self, mapper, clause)
+                if key is not None:
+                    bind = self._db.engines[key]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+def get_router():
+    return current_app.extensions.get('router') if has_app_context() else None
+
+def shard_count():
+    router = get_router()
+    return router.shard_count if router else 0
+
+def sharded():
+    return shard_count() > 0
+
+def shard_for_team(team_id):
+    """
+    The shard holding the projects of a team, or None without sharding
+    """
+    count = shard_count()
+    return team_id % count if count else None
+
+def shard_of(row_id):
+    """
+    The shard holding the project or task with this ID, or None without sharding
+    """
+    count = shard_count()
+    return row_id % count if count else None
+
+def get_session(session=None):
+    if session is None:
+        from app.models import db
+        session = db.session
+    return session
+
+def select_shard(shard, session=None):
+    """
+    Route the statements of `session` on sharded tables to `shard`
+    """
+    if shard is not None:
+        get_session(session).info[SHARD_KEY] = shard
+
+def selected_shard(session=None):
+    return get_session(session).info.get(SHARD_KEY)
+
+@contextmanager
+def use_shard(shard, session=None):
+    session = get_session(session)
+    previous = session.info.get(SHARD_KEY)
+    session.info[SHARD_KEY] = shard
+    try:
+        yield shard
+    finally:
+        session.info[SHARD_KEY] = previous
+
+def on_each_shard(function):
+    """
+    Call `function()` once per shard, with the session routed to it (once,
+    unrouted, without sharding)
+
+    Returns:
+        list: The results, in shard order
+    """
+    count = shard_count()
+    if not count:
+        return [function()]
+    results = []
+    for shard in range(count):
+        with use_shard(shard):
+            results.append(function())
+    return results
+
+def shard_rows(statement, key=None, reverse=False):
+    """
+    Rows of the SELECT `statement`: from the selected shard, or from every
+    shard when none is selected, merged in `key` order (each shard's rows must
+    already be in that order)
+
+    With sharding, the statement may only read sharded tables: the others are
+    not on the shards.
+    """
+    from app.models import db
+    if not sharded():
+        return db.session.execute(statement).all()
+    tables = statement_tables(None, statement)
+    assert tables <= SHARDED_TABLES, f'shard_rows() on unsharded tables: {sorted(tables - SHARDED_TABLES)}'
+    if selected_shard() is not None:
+        return db.session.execute(statement).all()
+    results = on_each_shard(lambda: db.session.execute(statement).all())
+    if key is None:
+        return [row for rows in results for row in rows]
+    return list(heapq.merge(*results, key=key, reverse=reverse))
+
+def related_loader(attribute):
+    """
+    Loader option for a relationship to a table in the primary database:
+    a JOIN cannot reach it from a shard, so it is loaded with a second query
+    """
+    from sqlalchemy.orm import joinedload, selectinload
+    return selectinload(attribute) if sharded() else joinedload(attribute)
+
+def use_primary(method):
+    """
+    Read from the primary database in this handler, even for a GET request
+    """
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        get_session().info[REPLICA_KEY] = False
+        return method(*args, **kwargs)
+    return wrapper
+
+def allocate_ids(table_name, count, session=None):
+    """
+    Allocate `count` IDs for rows of `table_name` on the selected shard
+
+    IDs come from a per-shard counter row in `id_sequence`, locked by the
+    UPDATE until the transaction ends, and satisfy `id % shards == shard`.
+    """
+    from app.models.models import IdSequence
+    session = get_session(session)
+    shard, shards = session.info[SHARD_KEY], shard_count()
+    sequence = IdSequence.__table__
+    last = session.execute(
+        update(sequence).where(sequence.c.name == table_name)
+        .values(next_value=sequence.c.next_value + count)
+        .returning(sequence.c.next_value)
+    ).scalar()
+    if last is None:
+        # Shard created by create_all() without running the migrations
+        last = count
+        session.execute(insert(sequence).values(name=table_name, next_value=count))
+    return [value * shards + shard for value in range(last - count + 1, last + 1)]
+
+def assign_ids(table_name, rows, session=None):
+    """
+    Set the 'id' of rows inserted with a Core statement on a shard
+    """
+    if sharded() and rows:
+        for row, row_id in zip(rows, allocate_ids(table_name, len(rows), session)):
+            row['id'] = row_id
+
+def prepare_shard_writes(session, flush_context, instances):
+    # New projects and tasks select their team's shard and get an ID from it
+    if not sharded():
+        return
+    from app.models.models import Project, Task
+    new = {}
+    for obj in session.new:
+        if isinstance(obj, Project):
+            shard = shard_for_team(obj.team_id)
+        elif isinstance(obj, Task):
+            shard = shard_of(obj.project_id)
+        else:
+            continue
+        current = session.info.get(SHARD_KEY)
+        if current is not None and current != shard:
+            raise ShardNotSelected('Cannot write to two shards in one transaction')
+        session.info[SHARD_KEY] = shard
+        if obj.id is None:
+            new.setdefault(obj.__table__.name, []).append(obj)
+    with session.no_autoflush:
+        for table_name, objects in new.items():
+            for obj, row_id in zip(objects, allocate_ids(table_name, len(objects), session)):
+                obj.id = row_id
+
+def record_write(session, flush_context):
+    session.info[WROTE_KEY] = True
+    if has_request_context():
+        g.database_wrote = True
+
+def forget_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(WROTE_KEY, None)
+
+def token_subject():
+    from app.auth import current_identity
+    identity = current_identity()
+    return identity.user_id if identity else None
+
+def route_request(router):
+    """
+    Select the shard of the addressed row, and the replicas for reads of
+    clients that did not write recently (after authentication)
+    """
+    from app.models import db
+    info = db.session.info
+    if (router.replica_keys and request.method in ('GET', 'HEAD') and STICKY_COOKIE not in request.cookies
+            and not router.wrote_recently(token_subject())):
+        info[REPLICA_KEY] = True
+    args = request.view_args or {}
+    if router.shard_keys:
+        if 'task_id' in args:
+            info[SHARD_KEY] = args['task_id'] % router.shard_count
+        elif 'project_id' in args:
+            info[SHARD_KEY] = args['project_id'] % router.shard_count
+        elif 'team_id' in args:
+            info[SHARD_KEY] = args['team_id'] % router.shard_count
+
+def shard_engines(app):
+    """
+    Engines holding project data: the shards, or the primary database
+    without sharding (call in an app context)
+    """
+    from app.models import db
+    router = app.extensions.get('router')
+    if router is None or not router.shard_keys:
+        return [db.engine]
+    return [db.engines[key] for key in router.shard_keys]
+
+def writable_engines(app):
+    """
+    Engines of the primary database and the shards, which all have the full
+    schema (call in an app context)
+    """
+    from app.models import db
+    engines = shard_engines(app)
+    return engines if engines[0] is db.engine else [db.engine, *engines]
+
+def init_routing(app, db):
+    """
+    Add the replicas and shards as binds; call before db.init_app(app)
+    """
+    replicas = list(app.config.get('SQLALCHEMY_REPLICA_URIS', []))
+    shards = list(app.config.get('SQLALCHEMY_SHARD_URIS', []))
+    if not replicas and not shards:
+        return None
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    replica_keys = [f'replica-{index}' for index in range(len(replicas))]
+    shard_keys = [f'shard-{index}' for index in range(len(shards))]
+    binds.update(zip(replica_keys, replicas))
+    binds.update(zip(shard_keys, shards))
+    app.config['SQLALCHEMY_BINDS'] = binds
+
+    router = Router(replica_keys, shard_keys, app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 2.0))
+    app.extensions['router'] = router
+
+    @app.before_request
+    def before_request():
+        route_request(router)
+
+    @app.after_request
+    def after_request(response):
+        if router.replica_keys and g.get('database_wrote'):
+            subject = token_subject()
+            if subject is not None:
+                router.record_write(subject)
+            response.set_cookie(STICKY_COOKIE, '1', max_age=math.ceil(router.sticky_seconds), httponly=True,
+                                samesite='Lax')
+        return response
+
+    # db.session is shared by every app, so the listeners are installed once
+    if not event.contains(db.session, 'before_flush', prepare_shard_writes):
+        event.listen(db.session, 'before_flush', prepare_shard_writes)
+        event.listen(db.session, 'after_flush', record_write)
+        event.listen(db.session, 'after_transaction_end', forget_write)
+    return router
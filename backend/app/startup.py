@@ -0,0 +1,122 @@
+"""
+Cold-start timing, deferred background services and warm-up.
+
+The time each start-up stage takes in this process is exported as the
+`app_startup_seconds` gauge at /metrics:
+
+- import: from the first import of the `app` package to create_app()
+- create_app: building the application
+- schema: checking the schema version, and migrating if it is behind
+- warm_up: warm_up(), when WARM_UP is set
+
+create_app() never starts the outbox workers and the reminder scheduler, so
+that `flask db ...` commands and scripts building the app do not start them
+either. The serving entry points (run.py, serve.py and gunicorn.conf.py) call
+serve_background_services() once the schema check is done, as the workers
+poll tables it may create. With LAZY_STARTUP they are started (and the SMTP
+and email modules imported) on the first request instead. Threads do not
+survive fork(), so gunicorn starts them in each worker after forking, which
+is what allows the app to be preloaded in the master (WEB_PRELOAD).
+"""
+import os
+import threading
+import time
+
+# Set when the `app` package is first imported (app/__init__.py imports this module first)
+IMPORT_STARTED = time.perf_counter()
+
+lock = threading.Lock()
+
+# (feature flag, backend setting, backend that keeps its state in the process)
+PER_PROCESS_BACKENDS = [
+    ('CACHE_ENABLED', 'CACHE_BACKEND', 'local'),
+    ('EVENTS_ENABLED', 'EVENTS_BACKEND', 'memory'),
+    ('IDEMPOTENCY_ENABLED', 'IDEMPOTENCY_BACKEND', 'local'),
+]
+
+def per_process_backends(config):
+    """
+    Enabled backends whose state other worker processes would not see
+
+    Returns:
+        list: 'SETTING=value' strings, empty when the app can run several workers
+    """
+    return [f'{setting}={backend}' for flag, setting, backend in PER_PROCESS_BACKENDS
+            if config.get(flag, False) and config.get(setting) == backend]
+
+def record_stage(stage, started):
+    """
+    Record the time since `started` (a perf_counter() value) for `stage`
+
+    Returns:
+        float: The elapsed seconds
+    """
+    from app.metrics import STARTUP_SECONDS
+    elapsed = time.perf_counter() - started
+    STARTUP_SECONDS.set(elapsed, stage=stage)
+    return elapsed
+
+def record_import():
+    from app.metrics import STARTUP_SECONDS
+    if not STARTUP_SECONDS.has(stage='import'):
+        record_stage('import', IMPORT_STARTED)
+
+def start_background_services(app):
+    """
+    Start the outbox workers and the reminder scheduler of `app`, once per
+    process
+    """
+    with lock:
+        if app.extensions.get('background_services') == os.getpid():
+            return
+        app.extensions['background_services'] = os.getpid()
+
+    # Background delivery of queued email notifications
+    if app.config.get('OUTBOX_WORKERS', 0) > 0:
+        from app.api.outbox import start_outbox_worker
+        start_outbox_worker(app)
+
+    # Periodic due-date reminders
+    if app.config.get('REMINDERS_ENABLED', False):
+        from app.api.reminders import start_reminder_scheduler
+        start_reminder_scheduler(app)
+
+def defer_background_services(app):
+    # The PID check also covers workers forked from a preloaded master
+    @app.before_request
+    def start_background_services_on_first_request():
+        if app.extensions.get('background_services') != os.getpid():
+            start_background_services(app)
+
+def serve_background_services(app):
+    """
+    Start the background services of a serving process, after its schema
+    check: now, or on the first request with LAZY_STARTUP
+    """
+    if app.config.get('LAZY_STARTUP', False):
+        defer_background_services(app)
+    else:
+        start_background_services(app)
+
+def warm_up(app):
+    """
+    Do the one-off work the first requests of a process would otherwise pay
+    for: configure the ORM mappers, compile the response serializers, build
+    the URL matcher and the password hasher's dummy hash, and open a
+    database connection
+    """
+    from sqlalchemy import text
+    from sqlalchemy.orm import configure_mappers
+    from app.models.models import db
+    from app.api.serializers import SCHEMAS
+
+    started = time.perf_counter()
+    configure_mappers()
+    for schema in SCHEMAS.values():
+        schema.compile()
+    app.url_map.update()
+    with app.app_context():
+        app.extensions['password_hasher'].dummy_hash
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    record_stage('warm_up', started)
@@ -0,0 +1,126 @@
+"""
+Time to delete a large project, and how long it blocks other writers.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.deletion
+    python -m benchmarks.deletion --tasks 500000 --chunks 1000 10000 0
+
+Creates a database with one project of `--tasks` tasks (and a small second
+project), then deletes the large project with app.api.deletion for each
+chunk size (0 deletes every task in one transaction), with and without
+archiving, pausing `--pause` ms between chunks. Meanwhile a second connection updates a task of the other
+project in a loop, as concurrent requests would, and the 99th percentile and
+longest time one of its updates waited for the write lock are reported.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+def create_database(path, tasks):
+    from sqlalchemy import create_engine
+    from app.models.models import db
+    from app.migrations import upgrade
+    from app.api.stats import rebuild_stats
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    upgrade(engine)
+    engine.dispose()
+
+    now = datetime.utcnow().isoformat(sep=' ')
+    with sqlite3.connect(path) as connection:
+        # Persistent, and set before the app and the other writer connect, as in production
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute("INSERT INTO user (id, name, email, password) VALUES (1, 'bench', 'bench@example.com', '')")
+        connection.execute("INSERT INTO team (id, name, leader_id) VALUES (1, 'bench', 1)")
+        connection.executemany("INSERT INTO project (id, name, description, created_at, team_id) "
+                               "VALUES (?, ?, '', ?, 1)", [(1, 'large', now), (2, 'other', now)])
+        connection.executemany(
+            "INSERT INTO task (title, description, status, created_at, project_id, assignee_id) "
+            "VALUES (?, 'benchmark task', 'TO-DO', ?, ?, 1)",
+            [(f'task {index}', now, 1 if index else 2) for index in range(tasks + 1)]
+        )
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as connection:
+        rebuild_stats(connection)
+    engine.dispose()
+
+def other_writer(path, ready, stop, results):
+    # Short write transactions on the other project, as concurrent requests would make.
+    # A process of its own, so that it does not wait for the GIL of the deleting one
+    connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+    waits = []
+    ready.set()
+    while not stop.is_set():
+        started = time.perf_counter()
+        connection.execute('BEGIN IMMEDIATE')
+        waits.append(time.perf_counter() - started)
+        connection.execute("UPDATE task SET status = 'DONE' WHERE project_id = 2")
+        connection.execute('COMMIT')
+        time.sleep(0.005)
+    connection.close()
+    results.put(waits)
+
+def delete_large_project(path, chunk_size, pause_ms, archive, tasks):
+    """
+    Returns:
+        tuple: (seconds to delete the project, sorted write lock waits of the other writer)
+    """
+    from app import create_app
+    from app.models.models import db
+    from app.api.deletion import delete_project
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'OUTBOX_WORKERS': 0, 'MAIL_ENABLED': False,
+                      'CACHE_ENABLED': False, 'EVENTS_ENABLED': False, 'SECRET_KEY': 'benchmark',
+                      'DELETE_CHUNK_SIZE': chunk_size or tasks, 'DELETE_CHUNK_PAUSE_MS': pause_ms})
+    context = multiprocessing.get_context('spawn')
+    ready, stop, results = context.Event(), context.Event(), context.Queue()
+    writer = context.Process(target=other_writer, args=(path, ready, stop, results))
+    writer.start()
+    ready.wait()
+    try:
+        with app.test_request_context():
+            started = time.perf_counter()
+            deleted = delete_project(1, archive)
+            elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        waits = sorted(results.get())
+        writer.join()
+        with app.app_context():
+            db.engine.dispose()
+    if deleted != tasks:
+        raise RuntimeError(f'Deleted {deleted} tasks instead of {tasks}')
+    return elapsed, waits
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=200000, help='Tasks in the project deleted.')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[0, 10000, 1000],
+                        help='DELETE_CHUNK_SIZE values to compare; 0 for a single transaction.')
+    parser.add_argument('--pause', type=int, default=20, help='DELETE_CHUNK_PAUSE_MS.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        template = os.path.join(directory, 'template.db')
+        create_database(template, args.tasks)
+        print(f"{'chunk':>8}{'archive':>9}{'seconds':>9}{'p99 wait ms':>13}{'max wait ms':>13}")
+        for chunk_size in args.chunks:
+            for archive in (False, True):
+                # A new file per run: the WAL files of the previous one stay behind
+                path = os.path.join(directory, f'deletion-{chunk_size}-{archive:d}.db')
+                shutil.copyfile(template, path)
+                elapsed, waits = delete_large_project(path, chunk_size, args.pause, archive, args.tasks)
+                p99 = waits[int(len(waits) * 0.99)] if waits else 0
+                print(f"{chunk_size or 'all':>8}{'yes' if archive else 'no':>9}{elapsed:>9.2f}"
+                      f"{p99 * 1000:>13.1f}{(waits[-1] if waits else 0) * 1000:>13.1f}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+"""
+Mixed read/write load test for the REST API.
+
+Runs a weighted mix of operations covering every /api route, either
+in-process through the Flask test client or over HTTP against a running
+server, and reports p50/p95/p99 latency per operation, throughput and peak
+RSS. Results can be saved as JSON and compared against a previous run.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.seed --db /tmp/bench.db --tasks 100000
+    python -m benchmarks.loadtest --db /tmp/bench.db --duration 30 --output run.json
+    python -m benchmarks.loadtest --url http://localhost:5000 --db /tmp/bench.db --server-pid 1234
+    python -m benchmarks.loadtest --db /tmp/bench.db --compare run.json
+
+--db is always needed so the generator knows which IDs exist. The random
+seed is fixed, so runs with the same arguments issue the same requests.
+"""
+import argparse
+import http.client
+import json
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+class Operation:
+    def __init__(self, name, weight, method, rule, build):
+        self.name = name
+        self.weight = weight
+        self.method = method
+        # URL rule as registered in app/api/resources.py, used for coverage checks
+        self.rule = rule
+        self.build = build
+
+def random_task(rng, state):
+    return rng.randint(1, state['max_task_id'])
+
+def search_term(rng):
+    from benchmarks.seed import WORDS
+    # Mostly selective words, as typed by users, plus some prefixes
+    word = WORDS[rng.randint(len(WORDS) // 20, len(WORDS) - 1)]
+    return word[:3] + '*' if rng.random() < 0.2 else word
+
+def authorized(worker):
+    # Bearer header from the worker's latest login or refresh
+    return {'Authorization': f"Bearer {worker['tokens']['access_token']}"}
+
+def created(worker, kind):
+    # Delete operations only remove rows created by the same worker
+    items = worker.setdefault(kind, [])
+    return items.pop() if items else None
+
+def idempotent(worker, path, body, rng):
+    # A new Idempotency-Key, remembered with the request for retry_create_task
+    key = f"load-{worker['id']}-{rng.getrandbits(64):x}"
+    worker['last_create'] = (path, body, {'Idempotency-Key': key})
+    return worker['last_create']
+
+OPERATIONS = [
+    Operation('list_projects', 10, 'GET', '/api/projects',
+              lambda rng, state, worker: ('/api/projects?limit=50', None)),
+    Operation('get_project', 10, 'GET', '/api/projects/<int:project_id>',
+              lambda rng, state, worker: (f"/api/projects/{rng.randint(1, state['max_project_id'])}", None)),
+    Operation('list_tasks', 20, 'GET', '/api/projects/<int:project_id>/tasks',
+              lambda rng, state, worker: (f"/api/projects/{rng.randint(1, state['max_project_id'])}/tasks", None)),
+    Operation('get_task', 20, 'GET', '/api/tasks/<int:task_id>',
+              lambda rng, state, worker: (f"/api/tasks/{random_task(rng, state)}", None)),
+    Operation('project_stats', 8, 'GET', '/api/projects/<int:project_id>/stats',
+              lambda rng, state, worker: (f"/api/projects/{rng.randint(1, state['max_project_id'])}/stats", None)),
+    Operation('user_stats', 4, 'GET', '/api/users/<int:user_id>/stats',
+              lambda rng, state, worker: (f"/api/users/{rng.randint(1, state['max_user_id'])}/stats", None)),
+    Operation('my_tasks', 6, 'GET', '/api/users/<int:user_id>/tasks',
+              lambda rng, state, worker: (f"/api/users/{rng.randint(1, state['max_user_id'])}/tasks?limit=50", None)),
+    Operation('search_tasks', 6, 'GET', '/api/search',
+              lambda rng, state, worker: (f"/api/search?q={search_term(rng)}&limit=20", None)),
+    # A short-lived stream: replays the recent events of a project, then ends
+    Operation('events', 1, 'GET', '/api/events',
+              lambda rng, state, worker: (
+                  f"/api/events?projects={rng.randint(1, state['max_project_id'])}&timeout=0.1&last_event_id=0", None)),
+    # Each worker follows one team, syncing from its previous revision
+    Operation('sync', 4, 'GET', '/api/sync',
+              lambda rng, state, worker: (
+                  f"/api/sync?teams={worker.setdefault('sync_team', rng.randint(1, state['max_team_id']))}"
+                  f"&since={worker.get('sync_revision', 0)}", None)),
+    Operation('team_activity', 4, 'GET', '/api/teams/<int:team_id>/activity',
+              lambda rng, state, worker: (f"/api/teams/{rng.randint(1, state['max_team_id'])}/activity?limit=50", None)),
+    Operation('project_activity', 4, 'GET', '/api/projects/<int:project_id>/activity',
+              lambda rng, state, worker: (
+                  f"/api/projects/{rng.randint(1, state['max_project_id'])}/activity?limit=50", None)),
+    Operation('list_teams', 5, 'GET', '/api/teams',
+              lambda rng, state, worker: ('/api/teams?limit=50', None)),
+    Operation('get_team', 8, 'GET', '/api/teams/<int:team_id>',
+              lambda rng, state, worker: (f"/api/teams/{rng.randint(1, state['max_team_id'])}", None)),
+    Operation('export_tasks', 1, 'GET', '/api/export/<string:entity>',
+              lambda rng, state, worker: (f"/api/export/tasks?project_id={rng.randint(1, state['max_project_id'])}", None)),
+    Operation('login', 3, 'POST', '/api/login',
+              lambda rng, state, worker: ('/api/login', {
+                  'email': f"user{rng.randint(1, state['max_user_id'])}@example.com", 'password': 'password'})),
+    Operation('me', 5, 'GET', '/api/me',
+              lambda rng, state, worker: ('/api/me', None, authorized(worker)) if worker.get('tokens') else None),
+    Operation('refresh_token', 1, 'POST', '/api/token/refresh',
+              lambda rng, state, worker: ('/api/token/refresh', {
+                  'refresh_token': worker['tokens']['refresh_token']}) if worker.get('tokens') else None),
+    Operation('logout', 1, 'POST', '/api/logout',
+              lambda rng, state, worker: ('/api/logout', {
+                  'refresh_token': worker['tokens']['refresh_token']}, authorized(worker))
+              if worker.get('tokens') else None),
+    Operation('register', 1, 'POST', '/api/register',
+              lambda rng, state, worker: ('/api/register', {
+                  'email': f"load-{worker['id']}-{rng.getrandbits(48)}@example.com", 'password': 'password',
+                  'name': 'Load Test'})),
+    Operation('create_task', 6, 'POST', '/api/projects/<int:project_id>/tasks',
+              lambda rng, state, worker: idempotent(
+                  worker, f"/api/projects/{rng.randint(1, state['max_project_id'])}/tasks", {
+                      'title': 'Load test task', 'description': 'Created by the load test',
+                      'assignee_id': rng.randint(1, state['max_user_id']), 'due_date': '2026-06-01T12:00:00'},
+                  rng)),
+    # A client retrying its last task creation: the stored response is replayed
+    Operation('retry_create_task', 2, 'POST', '/api/projects/<int:project_id>/tasks',
+              lambda rng, state, worker: worker.get('last_create')),
+    Operation('update_task', 6, 'PUT', '/api/tasks/<int:task_id>',
+              lambda rng, state, worker: (f"/api/tasks/{random_task(rng, state)}", {
+                  'status': rng.choice(('TO-DO', 'IN_PROGRESS', 'DONE'))})),
+    Operation('delete_task', 2, 'DELETE', '/api/tasks/<int:task_id>',
+              lambda rng, state, worker: (f"/api/tasks/{created(worker, 'tasks')}", None)
+              if worker.get('tasks') else None),
+    Operation('bulk_tasks', 1, 'POST', '/api/tasks/bulk',
+              lambda rng, state, worker: ('/api/tasks/bulk', {'operations': [
+                  {'op': 'update', 'id': task_id, 'status': rng.choice(('TO-DO', 'IN_PROGRESS', 'DONE'))}
+                  for task_id in rng.sample(range(1, state['max_task_id'] + 1), min(20, state['max_task_id']))]})),
+    Operation('create_project', 1, 'POST', '/api/projects',
+              lambda rng, state, worker: ('/api/projects', {
+                  'name': 'Load test project', 'team_id': rng.randint(1, state['max_team_id'])})),
+    Operation('update_project', 1, 'PUT', '/api/projects/<int:project_id>',
+              lambda rng, state, worker: (f"/api/projects/{rng.randint(1, state['max_project_id'])}", {
+                  'description': f'Updated {rng.getrandbits(32)}'})),
+    Operation('delete_project', 1, 'DELETE', '/api/projects/<int:project_id>',
+              lambda rng, state, worker: (f"/api/projects/{created(worker, 'projects')}", None)
+              if worker.get('projects') else None),
+    Operation('create_team', 1, 'POST', '/api/teams',
+              lambda rng, state, worker: ('/api/teams', {
+                  'name': 'Load test team', 'leader_id': rng.randint(1, state['max_user_id'])})),
+    # In the background, so that the job endpoint has something to report
+    Operation('delete_team', 1, 'DELETE', '/api/teams/<int:team_id>',
+              lambda rng, state, worker: (f"/api/teams/{created(worker, 'teams')}?background=true", None)
+              if worker.get('teams') else None),
+    Operation('get_job', 2, 'GET', '/api/jobs/<int:job_id>',
+              lambda rng, state, worker: (f"/api/jobs/{worker['jobs'][-1]}", None) if worker.get('jobs') else None),
+    Operation('add_member', 2, 'POST', '/api/teams/<int:team_id>/members',
+              lambda rng, state, worker: (f"/api/teams/{rng.randint(1, state['max_team_id'])}/members", {
+                  'user_id': rng.randint(1, state['max_user_id'])})),
+    Operation('remove_member', 1, 'DELETE', '/api/teams/<int:team_id>/members/<int:user_id>',
+              lambda rng, state, worker: (
+                  f"/api/teams/{rng.randint(1, state['max_team_id'])}/members/{rng.randint(1, state['max_user_id'])}",
+                  None)),
+]
+
+# Create operations whose new IDs feed the matching delete operations
+CREATES = {'create_task': 'tasks', 'create_project': 'projects', 'create_team': 'teams'}
+# Operations returning a token pair for the authenticated operations
+TOKENS = ('login', 'refresh_token')
+
+def load_state(path):
+    connection = sqlite3.connect(path)
+    state = {}
+    for key, table in (('max_user_id', 'user'), ('max_team_id', 'team'),
+                       ('max_project_id', 'project'), ('max_task_id', 'task')):
+        state[key] = connection.execute(f'SELECT MAX(id) FROM {table}').fetchone()[0] or 0
+    connection.close()
+    if not all(state.values()):
+        sys.exit(f'{path} is empty; seed it first with python -m benchmarks.seed')
+    return state
+
+def app_config(path):
+    from app.config import Config
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    config.update({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'OUTBOX_WORKERS': 0,
+        'REMINDERS_ENABLED': False,
+        'MAIL_ENABLED': False,
+        'METRICS_ENABLED': False,
+        'PROFILER_SAMPLE_RATE': 0,
+    })
+    return config
+
+class InProcessTransport:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+
+class HTTPTransport:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+
+    def request(self, method, path, body, headers=None):
+        payload = json.dumps(body) if body is not None else None
+        headers = dict(headers or {})
+        if payload is not None:
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=payload, headers=headers)
+        response = self.connection.getresponse()
+        return response.status, response.read()
+
+def pick(rng, operations, weights):
+    return rng.choices(operations, weights=weights)[0]
+
+def run_worker(index, transport, state, operations, weights, deadline, max_requests, seed_value, results):
+    rng = random.Random(seed_value * 1000 + index)
+    worker = {'id': index}
+    latencies = {}
+    errors = {}
+    done = 0
+    while time.perf_counter() < deadline and (not max_requests or done < max_requests):
+        operation = pick(rng, operations, weights)
+        request = operation.build(rng, state, worker)
+        if request is None:
+            continue
+        path, body = request[:2]
+        headers = request[2] if len(request) > 2 else None
+        started = time.perf_counter()
+        try:
+            status, data = transport.request(operation.method, path, body, headers)
+        except Exception:
+            status, data = 599, b''
+        latencies.setdefault(operation.name, []).append(time.perf_counter() - started)
+        done += 1
+        if status >= 500:
+            errors[operation.name] = errors.get(operation.name, 0) + 1
+        elif status == 201 and operation.name in CREATES:
+            # Remember created rows so delete operations have something to remove
+            worker.setdefault(CREATES[operation.name], []).append(json.loads(data)['id'])
+        elif status == 202 and operation.name == 'delete_team':
+            worker.setdefault('jobs', []).append(json.loads(data)['id'])
+        elif status == 200 and operation.name in TOKENS:
+            worker['tokens'] = json.loads(data)
+        elif status == 200 and operation.name == 'sync':
+            worker['sync_revision'] = json.loads(data)['revision']
+        elif operation.name == 'logout':
+            worker.pop('tokens', None)
+    results[index] = (latencies, errors)
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[position]
+
+def peak_rss_mb(server_pid=None):
+    if server_pid:
+        with open(f'/proc/{server_pid}/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return usage / (1024 * 1024) if platform.system() == 'Darwin' else usage / 1024
+
+def summarize(results, elapsed):
+    merged = {}
+    errors = {}
+    for latencies, worker_errors in results:
+        for name, values in latencies.items():
+            merged.setdefault(name, []).extend(values)
+        for name, count in worker_errors.items():
+            errors[name] = errors.get(name, 0) + count
+    operations = {}
+    for name, values in sorted(merged.items()):
+        operations[name] = {
+            'requests': len(values),
+            'errors': errors.get(name, 0),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'mean_ms': statistics.fmean(values) * 1000,
+        }
+    total = sum(len(values) for values in merged.values())
+    everything = [value for values in merged.values() for value in values]
+    return {
+        'total_requests': total,
+        'elapsed_s': elapsed,
+        'throughput_rps': total / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(everything, 0.50) * 1000,
+        'p95_ms': percentile(everything, 0.95) * 1000,
+        'p99_ms': percentile(everything, 0.99) * 1000,
+        'operations': operations,
+    }
+
+def print_report(summary):
+    print(f"{'operation':<16}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in summary['operations'].items():
+        print(f"{name:<16}{stats['requests']:>10}{stats['errors']:>8}"
+              f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+    print(f"\n{summary['total_requests']} requests in {summary['elapsed_s']:.1f}s: "
+          f"{summary['throughput_rps']:.1f} req/s, p50 {summary['p50_ms']:.2f} ms, "
+          f"p95 {summary['p95_ms']:.2f} ms, p99 {summary['p99_ms']:.2f} ms, peak RSS {summary['peak_rss_mb']:.1f} MB")
+
+def compare(summary, baseline, threshold):
+    """
+    Print p95 changes against a baseline run
+
+    Returns:
+        bool: True if no operation's p95 regressed by more than `threshold`
+    """
+    ok = True
+    print(f"\n{'operation':<16}{'base p95':>10}{'p95':>10}{'change':>9}")
+    for name, stats in summary['operations'].items():
+        base = baseline['operations'].get(name)
+        if not base or not base['p95_ms']:
+            continue
+        change = stats['p95_ms'] / base['p95_ms'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            ok = False
+        print(f"{name:<16}{base['p95_ms']:>10.2f}{stats['p95_ms']:>10.2f}{change:>+9.1%}{flag}")
+    return ok
+
+def check_coverage(app):
+    # Every /api route should be exercised by at least one operation
+    covered = {operation.rule for operation in OPERATIONS}
+    missing = sorted(rule.rule for rule in app.url_map.iter_rules()
+                     if rule.rule.startswith('/api') and rule.rule not in covered)
+    if missing:
+        print(f"Warning: routes not covered by the workload: {', '.join(missing)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='seeded SQLite database')
+    parser.add_argument('--url', help='base URL of a running server (default: in-process test client)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=0, help='stop each worker after this many requests')
+    parser.add_argument('--write-ratio', type=float, default=1.0, help='multiplier for write operation weights')
+    parser.add_argument('--only', help='comma-separated operation names to run')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--server-pid', type=int, help='report the peak RSS of this process (Linux)')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--compare', help='baseline JSON to compare p95 latencies against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed p95 regression (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    state = load_state(args.db)
+    operations = OPERATIONS
+    if args.only:
+        names = set(args.only.split(','))
+        operations = [operation for operation in OPERATIONS if operation.name in names]
+    weights = [operation.weight * (1 if operation.method == 'GET' else args.write_ratio) for operation in operations]
+
+    if args.url:
+        transports = [HTTPTransport(args.url) for _ in range(args.concurrency)]
+    else:
+        from app import create_app
+        app = create_app(app_config(args.db))
+        check_coverage(app)
+        transports = [InProcessTransport(app) for _ in range(args.concurrency)]
+
+    results = [None] * args.concurrency
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=run_worker, args=(index, transports[index], state, operations, weights,
+                                                        deadline, args.requests, args.seed, results))
+               for index in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(results, elapsed)
+    summary['peak_rss_mb'] = peak_rss_mb(args.server_pid)
+    summary['arguments'] = {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+    print_report(summary)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(summary, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            if not compare(summary, json.load(baseline_file), args.threshold):
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
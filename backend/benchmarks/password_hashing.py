@@ -0,0 +1,50 @@
+"""
+Measure password verifications (logins) per second for bcrypt work factors
+and hashing pool sizes.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.password_hashing
+    python -m benchmarks.password_hashing --rounds 10 12 --workers 1 2 4 --logins 200
+
+Each run submits `--logins` verifications from `--clients` threads through
+the same PasswordHasher the login endpoint uses, and reports throughput in
+total and per pool thread (i.e. per core when the pool is not larger than
+the number of CPUs).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.passwords import PasswordHasher, hash_password
+
+def run(rounds, workers, logins, clients):
+    hasher = PasswordHasher(rounds=rounds, workers=workers, queue_size=clients, timeout=60)
+    password_hash = hash_password('password', rounds)
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(lambda _: hasher.verify(password_hash, 'password')[0], range(logins)))
+        elapsed = time.perf_counter() - started
+    finally:
+        hasher.shutdown()
+    assert all(results)
+    return logins / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[10, 11, 12])
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument('--logins', type=int, default=100)
+    parser.add_argument('--clients', type=int, default=32, help='concurrent login requests')
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.logins} logins from {args.clients} clients per run")
+    print(f"{'rounds':>6} {'workers':>7} {'logins/s':>10} {'per worker':>11} {'ms/login':>9}")
+    for rounds in args.rounds:
+        for workers in args.workers:
+            rate = run(rounds, workers, args.logins, args.clients)
+            print(f"{rounds:>6} {workers:>7} {rate:>10.1f} {rate / workers:>11.1f} {1000 * workers / rate:>9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare SQLite query plans and timings for the hot task/project queries
+with and without the indexes added by the migrations (2 and 8).
+
+Usage (from the backend directory):
+
+    python -m benchmarks.query_plans --tasks 200000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from sqlalchemy import create_engine
+from app.migrations import upgrade
+from benchmarks.seed import seed
+
+QUERIES = [
+    ('Tasks page for a project',
+     'SELECT id, title, status FROM task WHERE project_id = :project_id ORDER BY id LIMIT 101'),
+    ('Tasks by project and status',
+     "SELECT id, title FROM task WHERE project_id = :project_id AND status = 'IN_PROGRESS'"),
+    ('Upcoming tasks for an assignee',
+     'SELECT id, title, due_date FROM task WHERE assignee_id = :user_id '
+     'AND due_date BETWEEN :start AND :end ORDER BY due_date'),
+    ('My tasks page (covering index, migration 8)',
+     'SELECT task.id, task.title, task.status, task.due_date, task.project_id, project.name, team.name '
+     'FROM task JOIN project ON project.id = task.project_id JOIN team ON team.id = project.team_id '
+     'WHERE task.assignee_id = :user_id AND task.due_date IS NOT NULL ORDER BY task.due_date, task.id LIMIT 101'),
+    ('Projects of a team', 'SELECT id, name FROM project WHERE team_id = :team_id'),
+    ('Teams led by a user', 'SELECT id, name FROM team WHERE leader_id = :user_id'),
+    ('Teams of a member', 'SELECT team_id FROM team_members WHERE user_id = :user_id'),
+]
+
+def drop_indexes(connection):
+    names = [row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'")]
+    for name in names:
+        connection.execute(f'DROP INDEX {name}')
+    # Make the database look like one created before the index migration
+    connection.execute('DELETE FROM schema_version')
+    connection.commit()
+
+def measure(connection, params, repeat):
+    results = []
+    for label, sql in QUERIES:
+        plan = ' | '.join(row[3] for row in connection.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            connection.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - start)
+        results.append((label, plan, statistics.median(timings) * 1000))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--projects', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'bench.db'
+        print(f"Seeding {args.tasks} tasks...")
+        connection = seed(path, args.tasks, args.users, args.teams, args.projects)
+        params = {'project_id': args.projects // 2, 'user_id': args.users // 2, 'team_id': args.teams // 2,
+                  'start': '2026-03-01', 'end': '2026-04-01'}
+
+        drop_indexes(connection)
+        connection.execute('ANALYZE')
+        before = measure(connection, params, args.repeat)
+
+        upgrade(create_engine(f'sqlite:///{path}'))
+        connection.execute('ANALYZE')
+        after = measure(connection, params, args.repeat)
+        connection.close()
+
+    for (label, plan_before, ms_before), (_, plan_after, ms_after) in zip(before, after):
+        print(f"\n{label}")
+        print(f"  before: {ms_before:9.3f} ms  {plan_before}")
+        print(f"  after:  {ms_after:9.3f} ms  {plan_after}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Write throughput with the project data sharded over several SQLite files, and
+a check of where reads and writes are routed.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.routing
+    python -m benchmarks.routing --shards 1 2 4 --writers 8 --tasks 400
+
+For each shard count (0 is a single database, without sharding) it creates
+the primary database and the shard files in a temporary directory, and one
+team and project per writer. Then every writer, a process of its own (as a
+gunicorn worker would be), creates tasks in its team's project through the
+API, and the tasks created per second are reported. Each SQLite file has its
+own write lock, so writers to projects of different teams only wait for each
+other when their teams share a shard. The routing check then adds a copy of
+the primary as read replica and reports which databases served a few
+requests.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from sqlalchemy import event
+
+PASSWORD = 'benchmark-password'
+
+def app_config(directory, shards, synchronous='NORMAL'):
+    return {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'primary.db')}",
+        'SQLALCHEMY_SHARD_URIS': [f"sqlite:///{os.path.join(directory, f'shard-{index}.db')}"
+                                  for index in range(shards)],
+        'OUTBOX_WORKERS': 0, 'MAIL_ENABLED': False, 'CACHE_ENABLED': False, 'EVENTS_ENABLED': False,
+        'REMINDERS_ENABLED': False, 'BCRYPT_LOG_ROUNDS': 4, 'SECRET_KEY': 'benchmark',
+        'SQLITE_SYNCHRONOUS': synchronous,
+    }
+
+def make_app(config):
+    from app import create_app
+    from app.migrations import ensure_schema
+    from app.routing import writable_engines
+    app = create_app(config)
+    with app.app_context():
+        for engine in writable_engines(app):
+            ensure_schema(engine)
+    return app
+
+def request(client, method, path, body=None, token=None):
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    response = client.open(path, method=method, json=body, headers=headers)
+    if response.status_code >= 400:
+        raise RuntimeError(f'{method} {path}: {response.status_code} {response.get_data(as_text=True)}')
+    return response.get_json()
+
+def login(client, email):
+    return request(client, 'POST', '/api/login', {'email': email, 'password': PASSWORD})['access_token']
+
+def seed(app, teams):
+    """
+    One user leading `teams` teams, with one project each
+
+    Returns:
+        tuple: (email, project IDs)
+    """
+    client = app.test_client()
+    email = 'bench@example.com'
+    request(client, 'POST', '/api/register', {'name': 'bench', 'email': email, 'password': PASSWORD})
+    user = request(client, 'GET', '/api/me', token=login(client, email))
+    team_ids = []
+    for index in range(teams):
+        # Membership changes revoke the leader's tokens, so log in again for each team
+        team = request(client, 'POST', '/api/teams', {'name': f'team {index}', 'leader_id': user['id']},
+                       login(client, email))
+        team_ids.append(team['id'])
+    token = login(client, email)
+    project_ids = [request(client, 'POST', '/api/projects', {'name': f'project {team_id}', 'team_id': team_id},
+                           token)['id'] for team_id in team_ids]
+    return email, project_ids
+
+def create_tasks(config, email, project_id, count, start):
+    # Runs in a writer process, with an app of its own
+    from app import create_app
+    client = create_app(config).test_client()
+    token = login(client, email)
+    start.wait()
+    for index in range(count):
+        request(client, 'POST', f'/api/projects/{project_id}/tasks', {'title': f'task {index}'}, token)
+
+def write_throughput(config, email, project_ids, tasks_per_writer):
+    context = multiprocessing.get_context('spawn')
+    start = context.Barrier(len(project_ids) + 1)
+    writers = [context.Process(target=create_tasks,
+                               args=(config, email, project_id, tasks_per_writer, start))
+               for project_id in project_ids]
+    for writer in writers:
+        writer.start()
+    start.wait()
+    started = time.perf_counter()
+    for writer in writers:
+        writer.join()
+    if any(writer.exitcode for writer in writers):
+        raise RuntimeError('A writer process failed')
+    return len(project_ids) * tasks_per_writer / (time.perf_counter() - started)
+
+def copy_database(source, target):
+    # The backup API includes what is still in the WAL file
+    with sqlite3.connect(source) as connection, sqlite3.connect(target) as copy:
+        connection.backup(copy)
+
+def routing_check(directory, shards):
+    """
+    Returns:
+        list: (request, {bind key or 'primary': statements}) per request
+    """
+    from app import create_app
+    from app.models import db
+    config = app_config(directory, shards)
+    email, project_ids = seed(make_app(config), 2)
+    replica = os.path.join(directory, 'replica.db')
+    copy_database(os.path.join(directory, 'primary.db'), replica)
+    app = create_app(dict(config, SQLALCHEMY_REPLICA_URIS=[f'sqlite:///{replica}'], DATABASE_REPLICA_STICKY_SECONDS=1))
+    client = app.test_client()
+    token = login(client, email)
+
+    counts = {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *args, key=key or 'primary': counts.__setitem__(key, counts.get(key, 0) + 1))
+    checks = []
+    for name, method, path, body in (
+        ('GET /api/teams', 'GET', '/api/teams', None),
+        ('GET /api/projects (all shards)', 'GET', '/api/projects', None),
+        ('POST task', 'POST', f'/api/projects/{project_ids[0]}/tasks', {'title': 'routed'}),
+        ('GET /api/teams after a write', 'GET', '/api/teams', None),
+    ):
+        counts.clear()
+        request(client, method, path, body, token)
+        checks.append((name, dict(counts)))
+    return checks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, nargs='+', default=[0, 2, 4], help='Shard counts to compare.')
+    parser.add_argument('--writers', type=int, default=8, help='Concurrent writer processes, one team each.')
+    parser.add_argument('--tasks', type=int, default=200, help='Tasks created per writer.')
+    parser.add_argument('--synchronous', default='NORMAL',
+                        help='SQLite synchronous mode; FULL syncs every commit, holding the write lock longer.')
+    args = parser.parse_args()
+
+    print(f"{'shards':>6}{'tasks/s':>10}")
+    for shards in args.shards:
+        directory = tempfile.mkdtemp()
+        try:
+            config = app_config(directory, shards, args.synchronous)
+            email, project_ids = seed(make_app(config), args.writers)
+            rate = write_throughput(config, email, project_ids, args.tasks)
+            print(f'{shards:>6}{rate:>10.0f}')
+        finally:
+            shutil.rmtree(directory)
+
+    directory = tempfile.mkdtemp()
+    try:
+        print('\nstatements per database (primary, replica-0, shard-N):')
+        for name, counts in routing_check(directory, 2):
+            print(f'  {name:<32}{counts}')
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
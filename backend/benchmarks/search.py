@@ -0,0 +1,77 @@
+"""
+Latency of GET /api/search on a seeded database.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.seed --db /tmp/search.db --tasks 1000000
+    python -m benchmarks.search --db /tmp/search.db
+
+Runs a set of queries from rare to very common words, with prefixes,
+filters and a second page, through the Flask test client and reports
+p50/p95 per query against the --target latency.
+"""
+import argparse
+import sys
+import time
+from urllib.parse import urlencode
+from benchmarks.loadtest import app_config, load_state, percentile
+from benchmarks.seed import WORDS
+
+def queries(state):
+    rare, uncommon, common = WORDS[-1], WORDS[len(WORDS) // 10], WORDS[5]
+    return [
+        ('rare word', {'q': rare}),
+        ('uncommon word', {'q': uncommon}),
+        ('common word', {'q': common}),
+        ('common, recent', {'q': common, 'sort': 'recent'}),
+        ('two words', {'q': f'{uncommon} {common}'}),
+        ('prefix', {'q': uncommon[:3] + '*'}),
+        ('prefix, recent', {'q': uncommon[:3] + '*', 'sort': 'recent'}),
+        ('common + project', {'q': common, 'project_id': state['max_project_id'] // 2}),
+        ('common + team', {'q': common, 'team_id': state['max_team_id'] // 2}),
+        ('uncommon + status', {'q': uncommon, 'status': 'IN_PROGRESS'}),
+        ('projects', {'q': uncommon, 'type': 'projects'}),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--target', type=float, default=50.0, help='p95 target in ms')
+    args = parser.parse_args()
+
+    from app import create_app
+    config = app_config(args.db)
+    config['CACHE_ENABLED'] = False
+    client = create_app(config).test_client()
+    state = load_state(args.db)
+
+    slow = False
+    print(f"{'query':<20}{'results':>8}{'p50 ms':>10}{'p95 ms':>10}{'page 2 ms':>11}")
+    for name, params in queries(state):
+        params = dict(params, limit=args.limit)
+        path = f'/api/search?{urlencode(params)}'
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                sys.exit(f'{path}: {response.status_code} {response.get_data(as_text=True)}')
+        cursor = response.headers.get('X-Next-Cursor')
+        page_two = 0.0
+        if cursor:
+            started = time.perf_counter()
+            client.get(f"/api/search?{urlencode(dict(params, cursor=cursor))}")
+            page_two = time.perf_counter() - started
+        p95 = percentile(timings, 0.95) * 1000
+        slow = slow or p95 > args.target
+        flag = '  SLOW' if p95 > args.target else ''
+        print(f"{name:<20}{len(response.get_json()):>8}{percentile(timings, 0.5) * 1000:>10.2f}"
+              f"{p95:>10.2f}{page_two * 1000:>11.2f}{flag}")
+    if slow:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
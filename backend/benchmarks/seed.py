@@ -0,0 +1,158 @@
+"""
+Seed a database with synthetic users, teams, projects and tasks.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.seed --tasks 100000              # seeds data/app.db
+    python -m benchmarks.seed --db /tmp/bench.db --tasks 1000000 --reset
+
+The generator is seeded, so the same arguments always produce the same data.
+"""
+import argparse
+import itertools
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from app.config import Config
+from app.models.models import db
+from app.migrations import upgrade
+from app.passwords import hash_password
+from app.api.stats import rebuild_stats
+
+STATUSES = ('TO-DO', 'IN_PROGRESS', 'DONE')
+CHUNK_SIZE = 50000
+
+# Made-up vocabulary for titles and descriptions, drawn with Zipf-like
+# frequencies so search terms range from very common to rare
+SYLLABLES = ('ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'da', 'fi', 'go', 'ha', 'ju', 'pe', 'qui',
+             'ba', 'co', 'ly', 'wen')
+WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in ('', 'n', 'r')]
+WORD_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(WORDS) + 1)))
+
+def words(rng, count):
+    return ' '.join(rng.choices(WORDS, cum_weights=WORD_WEIGHTS, k=count))
+
+def scale_for(tasks):
+    # Keep the shape of the data roughly constant as the task count grows
+    return {
+        'users': max(tasks // 100, 20),
+        'teams': max(tasks // 1000, 5),
+        'projects': max(tasks // 200, 10),
+    }
+
+def seed(path, tasks, users, teams, projects, members_per_team=10, seed_value=42,
+         rounds=Config.BCRYPT_LOG_ROUNDS):
+    """
+    Create the schema at `path` and insert synthetic rows
+
+    Every user gets the password 'password', hashed once with `rounds`.
+
+    Returns:
+        sqlite3.Connection: Open connection to the seeded database
+    """
+    engine = create_engine(f'sqlite:///{path}')
+    db.metadata.create_all(engine)
+    upgrade(engine)
+    engine.dispose()
+
+    rng = random.Random(seed_value)
+    start = datetime(2026, 1, 1)
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=OFF')
+
+    password_hash = hash_password('password', rounds)
+    connection.executemany('INSERT INTO user (id, email, password, name) VALUES (?, ?, ?, ?)',
+                           [(i, f'user{i}@example.com', password_hash, f'User {i}') for i in range(1, users + 1)])
+    leaders = [rng.randint(1, users) for _ in range(teams)]
+    connection.executemany('INSERT INTO team (id, name, leader_id) VALUES (?, ?, ?)',
+                           [(i, f'Team {i}', leaders[i - 1]) for i in range(1, teams + 1)])
+    memberships = set()
+    for team_id, leader_id in enumerate(leaders, start=1):
+        memberships.add((team_id, leader_id))
+        for user_id in rng.sample(range(1, users + 1), min(members_per_team, users)):
+            memberships.add((team_id, user_id))
+    connection.executemany('INSERT INTO team_members (team_id, user_id) VALUES (?, ?)', sorted(memberships))
+    connection.executemany(
+        'INSERT INTO project (id, name, description, created_at, team_id) VALUES (?, ?, ?, ?, ?)',
+        [(i, f'Project {i} {words(rng, 2)}', words(rng, 8), (start + timedelta(minutes=i)).isoformat(' '),
+          rng.randint(1, teams)) for i in range(1, projects + 1)]
+    )
+
+    def task_rows():
+        for i in range(1, tasks + 1):
+            due = start + timedelta(hours=rng.randint(0, 24 * 365)) if rng.random() < 0.8 else None
+            assignee = rng.randint(1, users) if rng.random() < 0.9 else None
+            yield (f'{words(rng, 3).capitalize()} {i}', words(rng, 12), rng.choice(STATUSES),
+                   due.isoformat(' ') if due else None, (start + timedelta(seconds=i)).isoformat(' '),
+                   rng.randint(1, projects), assignee)
+
+    rows = task_rows()
+    while True:
+        chunk = [row for _, row in zip(range(CHUNK_SIZE), rows)]
+        if not chunk:
+            break
+        connection.executemany(
+            'INSERT INTO task (title, description, status, due_date, created_at, project_id, assignee_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', chunk)
+    connection.commit()
+
+    # Rows were inserted behind the application's back, so backfill the summary tables
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as stats_connection:
+        rebuild_stats(stats_connection)
+    engine.dispose()
+
+    connection.execute('ANALYZE')
+    return connection
+
+def reset(path):
+    connection = sqlite3.connect(path)
+    tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    for table in ('task', 'project', 'team_members', 'team', 'user', 'notification_outbox',
+                  'task_stat', 'task_due_stat', 'tombstone',
+                  'reminder_log'):
+        if table in tables:
+            connection.execute(f'DELETE FROM {table}')
+    connection.commit()
+    connection.close()
+
+def existing_tasks(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('SELECT COUNT(*) FROM task').fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=str(Config.DB_PATH))
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--teams', type=int)
+    parser.add_argument('--projects', type=int)
+    parser.add_argument('--bcrypt-rounds', type=int, default=Config.BCRYPT_LOG_ROUNDS)
+    parser.add_argument('--reset', action='store_true', help='delete existing rows first')
+    args = parser.parse_args()
+
+    if existing_tasks(args.db) and not args.reset:
+        parser.error(f'{args.db} already contains tasks; pass --reset to replace them')
+    if args.reset:
+        reset(args.db)
+
+    scale = scale_for(args.tasks)
+    users = args.users or scale['users']
+    teams = args.teams or scale['teams']
+    projects = args.projects or scale['projects']
+
+    started = time.perf_counter()
+    seed(args.db, args.tasks, users, teams, projects, rounds=args.bcrypt_rounds).close()
+    print(f"Seeded {args.db}: {users} users, {teams} teams, {projects} projects, {args.tasks} tasks "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
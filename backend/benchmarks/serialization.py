@@ -0,0 +1,101 @@
+"""
+Cost of turning 10k tasks into a JSON response body.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --tasks 50000 --repeat 10
+
+Compares the hand-built dicts the handlers used to return, encoded with the
+standard library `json` as Flask-RESTful does by default, with the compiled
+schemas of app/api/serializers.py encoded with orjson, for ORM instances and
+for rows loaded as tuples. Times are reported per 10k tasks, split into
+loading from SQLite, building dicts and encoding.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def hand_built(task):
+    return {
+        'id': task.id,
+        'title': task.title,
+        'description': task.description,
+        'status': task.status,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'created_at': task.created_at.isoformat(),
+        'project_id': task.project_id,
+        'assignee_id': task.assignee_id
+    }
+
+def best_of(repeat, function):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.models.models import db, Project, Task, Team, User
+    from app.api import serializers
+    from app.api.serializers import dumps, task_schema
+
+    path = os.path.join(tempfile.mkdtemp(), 'serialization.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'OUTBOX_WORKERS': 0, 'MAIL_ENABLED': False,
+    })
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, email='bench@example.com', password='x', name='Bench'))
+        db.session.add(Team(id=1, name='Bench', leader_id=1))
+        db.session.add(Project(id=1, name='Bench', description='', team_id=1))
+        db.session.execute(Task.__table__.insert(), [{
+            'title': f'Task {i}', 'description': 'Benchmark task ' * 4, 'status': 'TO-DO',
+            'due_date': start + timedelta(hours=i) if i % 5 else None, 'created_at': start + timedelta(seconds=i),
+            'project_id': 1, 'assignee_id': 1 if i % 3 else None,
+        } for i in range(args.tasks)])
+        db.session.commit()
+
+        def load_instances():
+            db.session.expunge_all()
+            return Task.query.order_by(Task.id).all()
+
+        def load_tuples():
+            return db.session.execute(task_schema.select().order_by(Task.id)).all()
+
+        stdlib_dumps = lambda data: json.dumps(data).encode()
+        variants = [
+            ('hand-built + json', load_instances, lambda rows: [hand_built(task) for task in rows], stdlib_dumps),
+            ('schema (ORM) + orjson', load_instances, lambda rows: [task_schema.dump(task) for task in rows], dumps),
+            ('schema (tuples) + orjson', load_tuples, task_schema.dump_rows, dumps),
+        ]
+        if serializers.orjson is None:
+            print('orjson is not installed; the schema variants use the standard library')
+
+        scale = 10000 / args.tasks
+        print(f"{'per 10k tasks':<26}{'load ms':>10}{'dicts ms':>10}{'encode ms':>11}{'total ms':>10}")
+        baseline = None
+        for name, load, build, encode in variants:
+            load_time, rows = best_of(args.repeat, load)
+            build_time, items = best_of(args.repeat, lambda: build(rows))
+            encode_time, body = best_of(args.repeat, lambda: encode(items))
+            total = load_time + build_time + encode_time
+            baseline = baseline or body
+            assert json.loads(body) == json.loads(baseline), f'{name} produced a different document'
+            print(f"{name:<26}{load_time * scale * 1000:>10.2f}{build_time * scale * 1000:>10.2f}"
+                  f"{encode_time * scale * 1000:>11.2f}{total * scale * 1000:>10.2f}")
+
+if __name__ == '__main__':
+    main()
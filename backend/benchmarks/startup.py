@@ -0,0 +1,120 @@
+"""
+Cold-start time of the WSGI app, with an import-time profile.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --top 30
+
+Starts a fresh interpreter per run for each mode (default settings,
+LAZY_STARTUP, and LAZY_STARTUP with WARM_UP) and reports, as medians, the
+wall time until `wsgi.app` is ready, the app_startup_seconds stages and the
+latency of the first request. It then compares `create_all()` plus
+`upgrade()` with `ensure_schema()` on an up-to-date database, and lists the
+modules with the largest cumulative import time (`python -X importtime`).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+MODES = [
+    ('default', {}),
+    ('lazy', {'LAZY_STARTUP': 'True'}),
+    ('lazy + warm-up', {'LAZY_STARTUP': 'True', 'WARM_UP': 'True'}),
+]
+
+# Run in the child interpreter: time the import of the WSGI app, then a first request
+CHILD = '''
+import json, time
+started = time.perf_counter()
+import wsgi
+ready = time.perf_counter() - started
+from app.metrics import STARTUP_SECONDS
+client = wsgi.app.test_client()
+started = time.perf_counter()
+client.get('/api/projects')
+first_request = time.perf_counter() - started
+stages = {key[0]: value for key, value in STARTUP_SECONDS.values.items()}
+print(json.dumps({'ready': ready, 'first_request': first_request, 'stages': stages}))
+import os
+os._exit(0)
+'''
+
+SCHEMA = '''
+import json, time
+from app import create_app
+from app.models.models import db
+from app.migrations import ensure_schema, upgrade
+app = create_app({'SQLALCHEMY_DATABASE_URI': %r, 'OUTBOX_WORKERS': 0})
+with app.app_context():
+    ensure_schema()
+    started = time.perf_counter()
+    db.create_all()
+    upgrade()
+    full = time.perf_counter() - started
+    started = time.perf_counter()
+    ensure_schema()
+    check = time.perf_counter() - started
+print(json.dumps({'full': full, 'check': check}))
+'''
+
+def child_env(database_url, overrides):
+    env = dict(os.environ, DATABASE_URL=database_url, MAIL_ENABLED='False', METRICS_ENABLED='True',
+               LAZY_STARTUP='False', WARM_UP='False', PYTHONPATH=os.getcwd())
+    env.update(overrides)
+    return env
+
+def run_child(code, env, *flags):
+    result = subprocess.run([sys.executable, *flags, '-c', code], env=env, capture_output=True, text=True,
+                            check=True)
+    return result
+
+def import_profile(env, top):
+    """
+    Returns:
+        list: (cumulative_us, self_us, module) for the `top` slowest imports
+    """
+    stderr = run_child('import wsgi, os; os._exit(0)', env, '-X', 'importtime').stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Interpreters started per mode.')
+    parser.add_argument('--top', type=int, default=20, help='Slowest imports listed.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database_url = f"sqlite:///{os.path.join(directory, 'startup.db')}"
+    # Create the schema once, so every run starts against a current database
+    run_child(SCHEMA % database_url, child_env(database_url, {}))
+
+    stage_names = ('import', 'create_app', 'warm_up')
+    print(f"{'median ms':<16}{'ready':>8}" + ''.join(f'{name:>12}' for name in stage_names) + f"{'1st req':>9}")
+    for name, overrides in MODES:
+        env = child_env(database_url, overrides)
+        runs = [json.loads(run_child(CHILD, env).stdout.splitlines()[-1]) for _ in range(args.repeat)]
+        ready = statistics.median(run['ready'] for run in runs) * 1000
+        first = statistics.median(run['first_request'] for run in runs) * 1000
+        stages = [statistics.median(run['stages'].get(stage, 0) for run in runs) * 1000 for stage in stage_names]
+        print(f'{name:<16}{ready:>8.1f}' + ''.join(f'{value:>12.1f}' for value in stages) + f'{first:>9.1f}')
+
+    schema = json.loads(run_child(SCHEMA % database_url, child_env(database_url, {})).stdout.splitlines()[-1])
+    print(f"\nschema on a current database: create_all() + upgrade() {schema['full'] * 1000:.1f} ms, "
+          f"ensure_schema() {schema['check'] * 1000:.1f} ms")
+
+    print('\nslowest imports (LAZY_STARTUP), cumulative ms:')
+    for cumulative_us, self_us, module in import_profile(child_env(database_url, MODES[1][1]), args.top):
+        print(f'{cumulative_us / 1000:>9.1f}  {module}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import multiprocessing
+import os
+import time
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Threaded workers: requests mostly wait on SQLite/network I/O
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+keepalive = 5
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = 500
+
+accesslog = '-'
+
+# Import and warm up the app once in the master, and fork workers that are
+# ready to serve. Threads do not survive fork(), so each worker starts its
+# own background services (post_worker_init) and drops the master's database
+# connections; preloading implies LAZY_STARTUP for the Swagger UI.
+preload_app = os.environ.get('WEB_PRELOAD', 'False').lower() == 'true'
+if preload_app:
+    os.environ['LAZY_STARTUP'] = 'True'
+    os.environ.setdefault('WARM_UP', 'True')
+
+def on_starting(server):
+    # Apply migrations once in the master process, before any worker is forked,
+    # on the primary database and every shard
+    from sqlalchemy import create_engine
+    from app.config import Config
+    from app.migrations import ensure_schema
+    from app.startup import per_process_backends
+
+    # Each worker would have its own cache versions, event feed or idempotency records
+    settings = per_process_backends(vars(Config))
+    if server.cfg.workers > 1 and settings:
+        server.log.error(f"{', '.join(settings)} only works with one worker process (WEB_CONCURRENCY=1)")
+        raise SystemExit(1)
+
+    for url in [Config.SQLALCHEMY_DATABASE_URI, *Config.SQLALCHEMY_SHARD_URIS]:
+        engine = create_engine(url)
+        version = ensure_schema(engine)
+        engine.dispose()
+        server.log.info(f"Database {engine.url!r} is at schema version {version}")
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app.models.models import db
+        with server.app.wsgi().app_context():
+            # Pooled connections opened by the master's warm-up belong to the master
+            db.engine.dispose(close=False)
+    else:
+        # The master imported the app package for on_starting(); the worker's
+        # import stage starts now
+        from app import startup
+        startup.IMPORT_STARTED = time.perf_counter()
+
+def post_worker_init(worker):
+    # The outbox workers and reminder scheduler of this worker, now that
+    # on_starting() has checked the schema
+    from app.startup import serve_background_services
+    serve_background_services(worker.wsgi)
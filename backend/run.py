@@ -1,10 +1,7 @@
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
-from datetime import datetime, timedelta
 import os
-from app import create_app, db
-from flask_swagger_ui import get_swaggerui_blueprint
+from app import create_app
+from app.docs import init_swagger_ui
+from flask_cors import CORS
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,17 +13,19 @@ CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 SWAGGER_URL = ''  # Swagger UI served at localhost:5000
 API_URL = '/static/openapi.yaml'  # the static folder is backend/docs folder
 
-swaggerui_blueprint = get_swaggerui_blueprint(
-    SWAGGER_URL,
-    API_URL,
-    config={'app_name': "Team 315 Odoo Hackathon"}
-)
-app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
+# Built on the first request with LAZY_STARTUP
+init_swagger_ui(app, SWAGGER_URL, API_URL, config={'app_name': "Team 315 Odoo Hackathon"})
 
 if __name__ == '__main__':
     with app.app_context():
-        from app.models import models
-        db.create_all()
+        from app.migrations import ensure_schema
+        from app.routing import writable_engines
+        for engine in writable_engines(app):
+            ensure_schema(engine, logger=app.logger)
     port = int(os.environ.get("PORT", 5000))
     debug_mode = os.getenv("FLASK_DEBUG", "false").strip().lower() == "true"
-    app.run(host='0.0.0.0', debug=debug_mode, port=port)
\ No newline at end of file
+    # With the debugger, the reloader's parent process only watches files
+    if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        from app.startup import serve_background_services
+        serve_background_services(app)
+    app.run(host='0.0.0.0', debug=debug_mode, port=port)
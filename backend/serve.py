@@ -0,0 +1,24 @@
+"""
+Production server using waitress (multi-threaded, pure Python).
+
+Use gunicorn (see gunicorn.conf.py) for multi-process serving on Linux.
+"""
+import os
+from waitress import serve
+from run import app
+from app.migrations import ensure_schema
+from app.routing import writable_engines
+from app.startup import serve_background_services
+
+if __name__ == '__main__':
+    with app.app_context():
+        for engine in writable_engines(app):
+            ensure_schema(engine, logger=app.logger)
+    serve_background_services(app)
+    serve(
+        app,
+        host='0.0.0.0',
+        port=int(os.environ.get("PORT", 5000)),
+        threads=int(os.environ.get('WEB_THREADS', 8)),
+        connection_limit=int(os.environ.get('WEB_CONNECTION_LIMIT', 200))
+    )
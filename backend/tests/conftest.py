@@ -0,0 +1,96 @@
+"""
+Shared fixtures: an app on a fresh SQLite database per test, migrated the
+way the servers do it, with every optional feature off unless a test turns
+it on.
+"""
+import pytest
+from app import create_app
+from app.migrations import ensure_schema
+from app.models.models import db
+from app.routing import writable_engines
+
+BASE_CONFIG = {
+    'SECRET_KEY': 'test',
+    'OUTBOX_WORKERS': 0,
+    'MAIL_ENABLED': False,
+    'METRICS_ENABLED': False,
+    'BCRYPT_LOG_ROUNDS': 4,
+    'PASSWORD_HASH_WORKERS': 2,
+    'QUERY_BUDGET_ENFORCE': True,
+    # Revocations of other apps on the database are read on every request
+    'REVOCATION_SYNC_SECONDS': 0,
+}
+
+@pytest.fixture
+def make_app(tmp_path):
+    """
+    Build an app on tmp_path/app.db (plus tmp_path/shard-<n>.db for `shards`)
+    """
+    apps = []
+
+    def make(shards=0, **config):
+        config = dict(BASE_CONFIG, SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path}/app.db', **config)
+        if shards:
+            config['SQLALCHEMY_SHARD_URIS'] = [f'sqlite:///{tmp_path}/shard-{index}.db' for index in range(shards)]
+        app = create_app(config)
+        with app.app_context():
+            for engine in writable_engines(app):
+                ensure_schema(engine)
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        if 'events' in app.extensions:
+            app.extensions['events'].close()
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def register(client, name='alice'):
+    """
+    Register a user and log in
+
+    Returns:
+        tuple: (user ID, Authorization headers)
+    """
+    response = client.post('/api/register', json={'name': name, 'email': f'{name}@example.com',
+                                                  'password': 'secret123'})
+    assert response.status_code == 201, response.get_json()
+    headers = login(client, name)
+    return client.get('/api/me', headers=headers).get_json()['id'], headers
+
+def login(client, name='alice'):
+    response = client.post('/api/login', json={'email': f'{name}@example.com', 'password': 'secret123'})
+    assert response.status_code == 200, response.get_json()
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+def create_team(client, headers, leader_id, name='team', user='alice'):
+    """
+    Create a team led by `leader_id`; `headers` are replaced by a new login
+    of `user`, as joining a team revokes the leader's tokens
+    """
+    response = client.post('/api/teams', json={'name': name, 'leader_id': leader_id}, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    headers.update(login(client, user))
+    return response.get_json()['id']
+
+def create_project(client, headers, team_id, name='project'):
+    response = client.post('/api/projects', json={'name': name, 'team_id': team_id}, headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['id']
+
+def create_task(client, headers, project_id, **fields):
+    response = client.post(f'/api/projects/{project_id}/tasks', json=dict({'title': 'task'}, **fields),
+                           headers=headers)
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()
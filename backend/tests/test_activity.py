@@ -0,0 +1,74 @@
+from datetime import timedelta
+from sqlalchemy import select, update
+from app.api.activity import compact_activity, record_activity
+from app.models.models import db, Activity, utcnow
+from conftest import create_project, create_task, create_team, login, register
+
+def feed(client, headers, path, **args):
+    response = client.get(path, query_string=args, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response
+
+def actions(response):
+    return [entry['action'] for entry in response.get_json()]
+
+def test_team_and_project_feeds(make_app):
+    app = make_app(ACTIVITY_ENABLED=True)
+    client = app.test_client()
+    user_id, headers = register(client)
+    team_id = create_team(client, headers, user_id)
+    project_id = create_project(client, headers, team_id)
+    task_id = create_task(client, headers, project_id)['id']
+    client.put(f'/api/tasks/{task_id}', json={'status': 'DONE'}, headers=headers)
+    client.delete(f'/api/tasks/{task_id}', headers=headers)
+
+    response = feed(client, headers, f'/api/projects/{project_id}/activity')
+    assert actions(response) == ['task.deleted', 'task.updated', 'task.created', 'project.created']
+    update_entry = response.get_json()[1]
+    assert update_entry['changes'] == {'status': ['TO-DO', 'DONE']}
+    assert (update_entry['actor_id'], update_entry['task_id'], update_entry['team_id']) == (user_id, task_id, team_id)
+    assert actions(feed(client, headers, f'/api/teams/{team_id}/activity'))[-1] == 'team.created'
+
+    seen, cursor = [], None
+    while True:
+        args = {'limit': 2, 'action': 'task.created,task.updated,task.deleted'}
+        if cursor:
+            args['cursor'] = cursor
+        response = feed(client, headers, f'/api/teams/{team_id}/activity', **args)
+        seen += actions(response)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == ['task.deleted', 'task.updated', 'task.created']
+    assert feed(client, headers, f'/api/teams/{team_id}/activity', actor_id=user_id + 1).get_json() == []
+
+    register(client, 'bob')
+    assert client.get(f'/api/teams/{team_id}/activity', headers=login(client, 'bob')).status_code == 403
+
+def test_entries_are_dropped_with_a_rollback(make_app):
+    app = make_app(ACTIVITY_ENABLED=True)
+    with app.app_context():
+        # In a transaction, as in a handler that has read rows
+        db.session.execute(select(Activity.id)).all()
+        record_activity('team.created', 1)
+        db.session.rollback()
+        db.session.commit()
+        assert Activity.query.count() == 0
+
+def test_compaction_merges_old_runs_of_updates(make_app):
+    app = make_app(ACTIVITY_ENABLED=True)
+    client = app.test_client()
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    task_id = create_task(client, headers, project_id, title='first')['id']
+    for changes in ({'status': 'IN_PROGRESS'}, {'title': 'second'}, {'status': 'DONE', 'title': 'first'}):
+        client.put(f'/api/tasks/{task_id}', json=changes, headers=headers)
+    with app.app_context():
+        db.session.execute(update(Activity).values(created_at=utcnow() - timedelta(days=2)))
+        db.session.commit()
+        assert compact_activity(db.engine, 1, 10, 0) == (2, 0)
+        updates = Activity.query.filter_by(action='task.updated').all()
+        # Fields changed back are dropped
+        assert [entry.changes for entry in updates] == ['{"status":["TO-DO","DONE"]}']
+        remaining = Activity.query.count()
+        assert compact_activity(db.engine, 0, 10, 1) == (0, remaining)
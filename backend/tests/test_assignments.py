@@ -0,0 +1,56 @@
+from conftest import create_project, create_task, create_team, login, register
+
+def my_tasks(client, headers, user_id, **args):
+    response = client.get(f'/api/users/{user_id}/tasks', query_string=args, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response
+
+def task_ids(response):
+    return [task['id'] for group in response.get_json() for task in group['tasks']]
+
+def test_pages_in_due_date_order_then_undated(client):
+    user_id, headers = register(client)
+    team_id = create_team(client, headers, user_id)
+    first = create_project(client, headers, team_id, 'first')
+    second = create_project(client, headers, team_id, 'second')
+    late = create_task(client, headers, first, assignee_id=user_id, due_date='2025-03-01T00:00:00')['id']
+    undated = create_task(client, headers, first, assignee_id=user_id)['id']
+    early = create_task(client, headers, second, assignee_id=user_id, due_date='2025-01-01T00:00:00')['id']
+    same_day = create_task(client, headers, first, assignee_id=user_id, due_date='2025-01-01T00:00:00')['id']
+    create_task(client, headers, first)
+
+    response = my_tasks(client, headers, user_id)
+    # Groups ordered by their earliest due date on the page
+    assert [group['project_name'] for group in response.get_json()] == ['second', 'first']
+    assert response.get_json()[0]['team_name'] == 'team'
+
+    seen, cursor = [], None
+    while True:
+        args = {'limit': 1}
+        if cursor:
+            args['cursor'] = cursor
+        response = my_tasks(client, headers, user_id, **args)
+        seen += task_ids(response)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == [early, same_day, late, undated]
+
+    assert task_ids(my_tasks(client, headers, user_id, due_before='2025-02-01T00:00:00')) == [early, same_day]
+    client.put(f'/api/tasks/{late}', json={'status': 'DONE'}, headers=headers)
+    assert task_ids(my_tasks(client, headers, user_id, status='DONE')) == [late]
+
+def test_other_users_tasks_are_limited_to_shared_teams(client):
+    alice_id, alice = register(client, 'alice')
+    bob_id, bob = register(client, 'bob')
+    shared = create_team(client, alice, alice_id, 'shared')
+    client.post(f'/api/teams/{shared}/members', json={'user_id': bob_id}, headers=alice)
+    bob = login(client, 'bob')
+    private = create_team(client, bob, bob_id, 'private', user='bob')
+    visible = create_task(client, alice, create_project(client, alice, shared), assignee_id=bob_id)['id']
+    create_task(client, bob, create_project(client, bob, private), assignee_id=bob_id)
+
+    assert task_ids(my_tasks(client, alice, bob_id)) == [visible]
+    assert len(task_ids(my_tasks(client, bob, bob_id))) == 2
+    assert client.get('/api/users/999/tasks', headers=alice).status_code == 404
+    assert client.get(f'/api/users/{bob_id}/tasks?cursor=x', headers=alice).status_code == 400
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import func, select
+from app.auth import get_tokens
+from app.models.models import db, TokenRevocation
+from conftest import create_project, create_task, create_team, login, register
+
+@pytest.fixture
+def workers(make_app):
+    # Two apps on one database stand for two worker processes
+    return make_app().test_client(), make_app().test_client()
+
+def test_logout_reaches_other_workers(workers):
+    first, second = workers
+    register(first)
+    tokens = first.post('/api/login', json={'email': 'alice@example.com', 'password': 'secret123'}).get_json()
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+    assert second.get('/api/me', headers=headers).status_code == 200
+
+    first.post('/api/logout', json={'refresh_token': tokens['refresh_token']}, headers=headers)
+    response = second.get('/api/me', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Token has been revoked'
+    assert second.post('/api/token/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 401
+
+def test_refresh_tokens_are_single_use_across_workers(workers):
+    first, second = workers
+    register(first)
+    refresh_token = first.post('/api/login', json={'email': 'alice@example.com',
+                                                   'password': 'secret123'}).get_json()['refresh_token']
+    assert first.post('/api/token/refresh', json={'refresh_token': refresh_token}).status_code == 200
+    assert second.post('/api/token/refresh', json={'refresh_token': refresh_token}).status_code == 401
+
+def test_membership_change_revokes_tokens_on_other_workers(workers):
+    first, second = workers
+    leader_id, headers = register(first)
+    team_id = create_team(first, headers, leader_id)
+    bob_id, bob_headers = register(first, 'bob')
+
+    first.post(f'/api/teams/{team_id}/members', json={'user_id': bob_id}, headers=headers)
+    assert second.get('/api/me', headers=bob_headers).status_code == 401
+    # A new login carries the new team
+    project_id = create_project(second, headers, team_id)
+    assert second.post(f'/api/projects/{project_id}/tasks', json={'title': 'x'},
+                       headers=login(second, 'bob')).status_code == 201
+
+def test_user_revocations_commit_with_the_change(app):
+    with app.app_context():
+        db.session.execute(select(TokenRevocation.id)).all()
+        get_tokens().revoke_user(1, db.session)
+        db.session.rollback()
+        assert db.session.scalar(select(func.count(TokenRevocation.id))) == 0
+        get_tokens().revoke_user(1, db.session)
+        db.session.commit()
+        assert db.session.scalar(select(func.count(TokenRevocation.id))) == 1
+
+def test_team_scoped_mutations_need_membership(client):
+    leader_id, headers = register(client)
+    team_id = create_team(client, headers, leader_id)
+    project_id = create_project(client, headers, team_id)
+    task_id = create_task(client, headers, project_id)['id']
+    outsider_id, outsider = register(client, 'mallory')
+    other_team_id = create_team(client, outsider, outsider_id, name='other', user='mallory')
+
+    requests = [
+        ('post', '/api/projects', {'name': 'x', 'team_id': team_id}),
+        ('put', f'/api/projects/{project_id}', {'name': 'x'}),
+        ('delete', f'/api/projects/{project_id}', None),
+        ('post', f'/api/projects/{project_id}/tasks', {'title': 'x'}),
+        ('put', f'/api/tasks/{task_id}', {'title': 'x'}),
+        ('delete', f'/api/tasks/{task_id}', None),
+    ]
+    for method, path, body in requests:
+        response = getattr(client, method)(path, json=body, headers=outsider)
+        assert response.status_code == 403, (method, path)
+        assert response.get_json()['message'] == 'Not a member of this team'
+
+    # Moving a project needs membership of the team it leaves
+    response = client.put(f'/api/projects/{project_id}', json={'team_id': other_team_id}, headers=outsider)
+    assert response.status_code == 403
+    response = client.put(f'/api/projects/{project_id}', json={'team_id': other_team_id}, headers=headers)
+    assert response.status_code == 403
+
+    response = client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'create', 'project_id': project_id, 'title': 'x'},
+        {'op': 'update', 'id': task_id, 'status': 'DONE'},
+    ]}, headers=outsider)
+    assert response.status_code == 400
+    assert [result['error'] for result in response.get_json()['results']] == ['Not a member of this team'] * 2
+
+    assert client.get(f'/api/tasks/{task_id}', headers=headers).get_json()['title'] == 'task'
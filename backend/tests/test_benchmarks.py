@@ -0,0 +1,40 @@
+"""
+The seeder and load test behind the performance numbers: seeding is
+deterministic and a short in-process run of every operation gets no errors.
+"""
+import sqlite3
+from benchmarks import loadtest
+from benchmarks.seed import seed
+
+SCALE = {'tasks': 300, 'users': 20, 'teams': 4, 'projects': 8, 'rounds': 4}
+
+def rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return [connection.execute(f'SELECT * FROM {table} ORDER BY 1').fetchall()
+                for table in ('team', 'team_members', 'project', 'task')]
+    finally:
+        connection.close()
+
+def test_seeding_is_deterministic(tmp_path):
+    for name in ('first.db', 'second.db'):
+        seed(tmp_path / name, **SCALE).close()
+    first = rows(tmp_path / 'first.db')
+    assert len(first[3]) == SCALE['tasks']
+    assert first == rows(tmp_path / 'second.db')
+
+def test_loadtest_covers_every_route_without_errors(tmp_path, capsys):
+    from app import create_app
+    path = tmp_path / 'bench.db'
+    seed(path, **SCALE).close()
+    app = create_app(dict(loadtest.app_config(path), BCRYPT_LOG_ROUNDS=4))
+
+    loadtest.check_coverage(app)
+    assert 'not covered' not in capsys.readouterr().out
+
+    results = [None]
+    loadtest.run_worker(0, loadtest.InProcessTransport(app), loadtest.load_state(path), loadtest.OPERATIONS,
+                        [operation.weight for operation in loadtest.OPERATIONS], float('inf'), 300, 42, results)
+    summary = loadtest.summarize(results, 1.0)
+    assert summary['total_requests'] == 300
+    assert {name: stats['errors'] for name, stats in summary['operations'].items() if stats['errors']} == {}
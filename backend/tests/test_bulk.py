@@ -0,0 +1,58 @@
+from app.models.models import db, ReminderLog, utcnow
+from conftest import create_project, create_task, create_team, register
+
+def test_bulk_creates_updates_and_deletes_in_one_request(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    first, second = create_task(client, headers, project_id), create_task(client, headers, project_id)
+    response = client.post('/api/tasks/bulk', headers=headers, json={'operations': [
+        {'op': 'create', 'project_id': project_id, 'title': 'new', 'assignee_id': user_id},
+        {'op': 'update', 'id': first['id'], 'status': 'DONE'},
+        {'op': 'delete', 'id': second['id']},
+    ]})
+    assert response.status_code == 200, response.get_json()
+    results = response.get_json()['results']
+    assert [(result['op'], result['status']) for result in results] == [
+        ('create', 'created'), ('update', 'updated'), ('delete', 'deleted')]
+    tasks = {task['id']: task for task in client.get(f'/api/projects/{project_id}/tasks', headers=headers).get_json()}
+    assert set(tasks) == {first['id'], results[0]['id']}
+    assert tasks[first['id']]['status'] == 'DONE'
+    assert tasks[results[0]['id']]['assignee_id'] == user_id
+    stats = client.get(f'/api/projects/{project_id}/stats', headers=headers).get_json()
+    assert stats['total'] == 2
+
+def test_invalid_operation_rejects_the_whole_request(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    task = create_task(client, headers, project_id)
+    response = client.post('/api/tasks/bulk', headers=headers, json={'operations': [
+        {'op': 'update', 'id': task['id'], 'status': 'DONE'},
+        {'op': 'update', 'id': 999999, 'status': 'DONE'},
+        {'op': 'create', 'project_id': project_id},
+        {'op': 'update', 'id': task['id'], 'status': 'LATER'},
+    ]})
+    assert response.status_code == 400
+    errors = [result.get('error') for result in response.get_json()['results']]
+    assert errors == [None, 'Task not found', "'title' is required", 'Invalid status: LATER']
+    assert client.get(f"/api/tasks/{task['id']}", headers=headers).get_json()['status'] == 'TO-DO'
+
+def test_bulk_request_size_is_limited(make_app):
+    client = make_app(BULK_MAX_OPERATIONS=2).test_client()
+    operations = [{'op': 'delete', 'id': index} for index in range(3)]
+    assert client.post('/api/tasks/bulk', json={'operations': operations}).status_code == 413
+    assert client.post('/api/tasks/bulk', json={'operations': []}).status_code == 400
+
+def test_deleted_tasks_lose_their_reminder_logs(app, client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    first, second = create_task(client, headers, project_id), create_task(client, headers, project_id)
+    with app.app_context():
+        db.session.add_all([ReminderLog(task_id=task['id'], kind='due_soon', due_date=utcnow(), assignee_id=user_id)
+                            for task in (first, second)])
+        db.session.commit()
+    response = client.post('/api/tasks/bulk', headers=headers, json={'operations': [
+        {'op': 'delete', 'id': first['id']}]})
+    assert response.status_code == 200, response.get_json()
+    assert client.delete(f"/api/tasks/{second['id']}", headers=headers).status_code == 200
+    with app.app_context():
+        assert ReminderLog.query.count() == 0
@@ -0,0 +1,93 @@
+from sqlalchemy import event, select
+from app.api.cache import LRUCache
+from app.models.models import db, CacheTag
+from conftest import create_project, create_team, register
+
+def cached_app(make_app, backend='database', **config):
+    return make_app(CACHE_ENABLED=True, CACHE_BACKEND=backend, **config)
+
+def test_etag_revalidation_and_invalidation(make_app):
+    client = cached_app(make_app).test_client()
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+
+    first = client.get(f'/api/projects/{project_id}', headers=headers)
+    etag = first.headers['ETag']
+    assert client.get(f'/api/projects/{project_id}', headers=dict(headers, **{'If-None-Match': etag})).status_code == 304
+
+    client.put(f'/api/projects/{project_id}', json={'name': 'renamed'}, headers=headers)
+    response = client.get(f'/api/projects/{project_id}', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.get_json()['name'] == 'renamed'
+    assert response.headers['ETag'] != etag
+
+def test_invalidations_reach_other_workers(make_app):
+    # Two apps on one database stand for two worker processes
+    first, second = [cached_app(make_app, CACHE_VERSION_TTL=0).test_client() for _ in range(2)]
+    user_id, headers = register(first)
+    project_id = create_project(first, headers, create_team(first, headers, user_id))
+
+    etag = first.get(f'/api/projects/{project_id}/tasks', headers=headers).headers['ETag']
+    assert second.get(f'/api/projects/{project_id}/tasks', headers=headers).headers['ETag'] == etag
+
+    second.post(f'/api/projects/{project_id}/tasks', json={'title': 'new'}, headers=headers)
+    response = first.get(f'/api/projects/{project_id}/tasks', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert [task['title'] for task in response.get_json()] == ['new']
+
+def test_versions_are_bumped_in_the_writing_transaction(make_app):
+    app = cached_app(make_app, CACHE_VERSION_TTL=60)
+    client = app.test_client()
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    path = f'/api/projects/{project_id}'
+    etag = client.get(path, headers=headers).headers['ETag']
+
+    with app.app_context():
+        engine = db.engine
+    statements, commits = [], []
+    listeners = (('before_cursor_execute', lambda *args: statements.append(args[2])),
+                 ('commit', lambda *args: commits.append(args)))
+    for name, listener in listeners:
+        event.listen(engine, name, listener)
+    try:
+        # Versions the worker read are reused
+        assert client.get(path, headers=dict(headers, **{'If-None-Match': etag})).status_code == 304
+        assert not [sql for sql in statements if 'cache_tag' in sql]
+        client.put(path, json={'name': 'renamed'}, headers=headers)
+        assert len(commits) == 1
+    finally:
+        for name, listener in listeners:
+            event.remove(engine, name, listener)
+    # ... except after the worker's own writes
+    assert client.get(path, headers=dict(headers, **{'If-None-Match': etag})).get_json()['name'] == 'renamed'
+
+def test_stale_tag_rows_are_pruned(make_app):
+    app = cached_app(make_app, CACHE_TTL=0)
+    backend = app.extensions['response_cache'].shared
+    with app.app_context():
+        backend.incr_many(['tag:project:1'])
+        version = backend.get_counters(['tag:project:1'])[0]
+        backend.incr_many(['tag:project:1'])
+        assert backend.get_counters(['tag:project:1'])[0] > version
+        backend.writes = backend.PRUNE_INTERVAL - 1
+        backend.incr_many(['tag:project:2'])
+        assert db.session.scalars(select(CacheTag.tag)).all() == []
+
+def test_local_backend_invalidates_in_process(make_app):
+    client = cached_app(make_app, 'local').test_client()
+    user_id, headers = register(client)
+    create_team(client, headers, user_id)
+    assert [team['name'] for team in client.get('/api/teams', headers=headers).get_json()] == ['team']
+    create_team(client, headers, user_id, name='second')
+    assert len(client.get('/api/teams', headers=headers).get_json()) == 2
+
+def test_lru_eviction_and_ttl():
+    cache = LRUCache(max_entries=2, ttl=30)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    cache.set('d', 4, ttl=-1)
+    assert cache.get('d') is None
@@ -0,0 +1,90 @@
+import threading
+from sqlalchemy import text
+from app.database import count_queries, sqlite_pragmas
+from app.models.models import db
+from conftest import create_project, create_task, create_team, register
+
+def pragma(app, name):
+    with app.app_context():
+        return db.session.execute(text(f'PRAGMA {name}')).scalar()
+
+def test_sqlite_connections_are_tuned(make_app):
+    app = make_app(SQLITE_BUSY_TIMEOUT_MS=1234)
+    assert pragma(app, 'journal_mode') == 'wal'
+    assert pragma(app, 'busy_timeout') == 1234
+    # NORMAL
+    assert pragma(app, 'synchronous') == 1
+    assert pragma(app, 'foreign_keys') == 0
+
+def test_foreign_keys_only_without_shards():
+    assert 'PRAGMA foreign_keys=ON' in sqlite_pragmas({'SQLITE_FOREIGN_KEYS': True})
+    assert 'PRAGMA foreign_keys=ON' not in sqlite_pragmas({'SQLITE_FOREIGN_KEYS': True,
+                                                           'SQLALCHEMY_SHARD_URIS': ['sqlite://']})
+
+def add_member(client, headers, team_id, user_id):
+    with count_queries() as counter:
+        response = client.post(f'/api/teams/{team_id}/members', json={'user_id': user_id}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return counter['count']
+
+def test_adding_a_member_does_not_load_the_team(app):
+    client = app.test_client()
+    leader_id, headers = register(client)
+    team_id = create_team(client, headers, leader_id)
+    user_ids = [register(client, f'user{index}')[0] for index in range(6)]
+
+    first = add_member(client, headers, team_id, user_ids[0])
+    for user_id in user_ids[1:-1]:
+        add_member(client, headers, team_id, user_id)
+    # The membership check is one EXISTS query, whatever the size of the team
+    assert add_member(client, headers, team_id, user_ids[-1]) == first
+
+def put_task(client, headers, task_id, data):
+    with count_queries() as counter:
+        response = client.put(f'/api/tasks/{task_id}', json=data, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return counter['count']
+
+def test_task_update_loads_the_project_and_assignee_with_the_task(app):
+    client = app.test_client()
+    user_id, headers = register(client)
+    other_id = register(client, 'bob')[0]
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    task_id = create_task(client, headers, project_id, assignee_id=user_id)['id']
+
+    renamed = put_task(client, headers, task_id, {'title': 'renamed'})
+    # Plus the stats upsert and the outbox row; the notification's project and
+    # assignee were eagerly loaded with the task
+    assert put_task(client, headers, task_id, {'status': 'DONE'}) == renamed + 2
+    # Plus one lookup of the new assignee
+    assert put_task(client, headers, task_id, {'assignee_id': other_id}) == renamed + 3
+
+def test_team_members_are_loaded_with_one_query(app):
+    client = app.test_client()
+    leader_id, headers = register(client)
+    team_id = create_team(client, headers, leader_id)
+
+    def get_team():
+        with count_queries() as counter:
+            response = client.get(f'/api/teams/{team_id}', headers=headers)
+        assert response.status_code == 200, response.get_json()
+        return counter['count'], len(response.get_json()['members'])
+
+    count, members = get_team()
+    for index in range(4):
+        add_member(client, headers, team_id, register(client, f'user{index}')[0])
+    assert get_team() == (count, members + 4)
+
+def test_count_queries_ignores_other_threads(app):
+    def query():
+        with app.app_context():
+            db.session.execute(text('SELECT 1'))
+            db.session.remove()
+
+    with count_queries() as counter:
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+        with app.app_context():
+            db.session.execute(text('SELECT 1'))
+    assert counter['count'] == 1
@@ -0,0 +1,61 @@
+import time
+from sqlalchemy import func, select
+from app.models.models import db, ArchivedProject, ArchivedTask, Project, Task, TaskStat, team_members
+from conftest import create_project, create_task, create_team, login, register
+
+def count(app, model, *conditions):
+    with app.app_context():
+        table = getattr(model, '__table__', model)
+        return db.session.scalar(select(func.count()).select_from(table).where(*conditions))
+
+def test_project_tasks_are_deleted_in_chunks_and_archived(make_app):
+    app = make_app(DELETE_CHUNK_SIZE=2, DELETE_CHUNK_PAUSE_MS=0)
+    client = app.test_client()
+    user_id, headers = register(client)
+    team_id = create_team(client, headers, user_id)
+    project_id = create_project(client, headers, team_id)
+    kept = create_project(client, headers, team_id, 'kept')
+    for index in range(5):
+        create_task(client, headers, project_id, title=f'task {index}')
+    create_task(client, headers, kept)
+
+    response = client.delete(f'/api/projects/{project_id}?archive=true', headers=headers)
+    assert response.status_code == 200 and response.get_json()['tasks_deleted'] == 5
+    assert count(app, Task, Task.project_id == project_id) == 0
+    assert count(app, TaskStat, TaskStat.project_id == project_id) == 0
+    assert count(app, Task) == 1
+    assert count(app, ArchivedTask, ArchivedTask.project_id == project_id) == 5
+    assert count(app, ArchivedProject, ArchivedProject.id == project_id) == 1
+    assert client.get(f'/api/projects/{project_id}', headers=headers).status_code == 404
+
+def test_background_deletion_job(client, app):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    for _ in range(3):
+        create_task(client, headers, project_id)
+
+    response = client.delete(f'/api/projects/{project_id}?background=true', headers=headers)
+    assert response.status_code == 202
+    job = response.get_json()
+    assert job['total'] == 3 and response.headers['Location'] == f"/api/jobs/{job['id']}"
+    deadline = time.monotonic() + 10
+    while job['status'] not in ('DONE', 'FAILED') and time.monotonic() < deadline:
+        time.sleep(0.02)
+        job = client.get(f"/api/jobs/{job['id']}", headers=headers).get_json()
+    assert (job['status'], job['done'], job['error']) == ('DONE', 3, None)
+    assert count(app, Project, Project.id == project_id) == 0
+    assert client.get('/api/jobs/999', headers=headers).status_code == 404
+
+def test_team_deletion_is_for_the_leader(client, app):
+    alice_id, alice = register(client, 'alice')
+    bob_id, _ = register(client, 'bob')
+    team_id = create_team(client, alice, alice_id)
+    client.post(f'/api/teams/{team_id}/members', json={'user_id': bob_id}, headers=alice)
+    create_task(client, alice, create_project(client, alice, team_id))
+
+    bob = login(client, 'bob')
+    assert client.delete(f'/api/teams/{team_id}', headers=bob).status_code == 403
+    response = client.delete(f'/api/teams/{team_id}', headers=alice)
+    assert response.status_code == 200 and response.get_json()['tasks_deleted'] == 1
+    assert count(app, team_members, team_members.c.team_id == team_id) == 0
+    assert count(app, Project) == 0 and count(app, Task) == 0
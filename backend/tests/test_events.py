@@ -0,0 +1,122 @@
+import json
+import pytest
+from flask import Flask
+from sqlalchemy import func, select
+from app.api.events import init_events, publish_event
+from app.models.models import db, ChangeEvent
+from app.startup import per_process_backends
+from conftest import create_project, create_task, create_team, register
+
+EVENTS_CONFIG = {'EVENTS_ENABLED': True, 'EVENTS_BACKEND': 'database', 'EVENTS_POLL_SECONDS': 0.02,
+                 'EVENTS_HEARTBEAT_SECONDS': 0.1}
+
+def parse_stream(response):
+    """
+    The (id, type, data) of the events in an SSE response, and whether it
+    contained a reset
+    """
+    events, reset = [], False
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if ': ' in line and not line.startswith(':'))
+        if fields.get('event') == 'reset':
+            reset = True
+        elif 'id' in fields:
+            events.append((fields['id'], fields['event'], json.loads(fields['data'])['data']))
+    response.close()
+    return events, reset
+
+@pytest.fixture
+def workers(make_app):
+    # Two apps on one database stand for two worker processes
+    first, second = make_app(**EVENTS_CONFIG).test_client(), make_app(**EVENTS_CONFIG).test_client()
+    user_id, headers = register(first)
+    project_id = create_project(first, headers, create_team(first, headers, user_id))
+    return first, second, headers, project_id
+
+def test_backlog_resume_on_another_worker(workers):
+    first, second, headers, project_id = workers
+    tasks = [create_task(first, headers, project_id, title=f'task {index}') for index in range(3)]
+
+    everything, reset = parse_stream(second.get(f'/api/events?projects={project_id}&timeout=0.1&last_event_id=0',
+                                                headers=headers))
+    assert not reset
+    created = [event for event in everything if event[1] == 'task.created']
+    assert [data['id'] for _, _, data in created] == [task['id'] for task in tasks]
+
+    # A client that saw the first task resumes after it
+    response = second.get(f'/api/events?projects={project_id}&timeout=0.1',
+                          headers=dict(headers, **{'Last-Event-ID': created[0][0]}))
+    assert [data['id'] for _, _, data in parse_stream(response)[0]] == [task['id'] for task in tasks[1:]]
+
+def test_live_events_from_another_worker(workers):
+    first, second, headers, project_id = workers
+    # The subscription is made when the request is handled, before the body is read
+    response = second.get(f'/api/events?projects={project_id}&timeout=0.5', headers=headers)
+    task = create_task(first, headers, project_id)
+    events, _ = parse_stream(response)
+    assert [(kind, data['id']) for _, kind, data in events] == [('task.created', task['id'])]
+
+def test_unknown_last_event_id_resets(workers):
+    _, second, headers, project_id = workers
+    response = second.get(f'/api/events?projects={project_id}&timeout=0.1',
+                          headers=dict(headers, **{'Last-Event-ID': '999999'}))
+    assert parse_stream(response) == ([], True)
+
+def test_open_streams_are_capped(make_app):
+    client = make_app(EVENTS_MAX_STREAMS=1, EVENTS_RETRY_MS=2500, **EVENTS_CONFIG).test_client()
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    url = f'/api/events?projects={project_id}&timeout=0.1'
+
+    first = client.get(url, headers=headers)
+    busy = client.get(url, headers=headers)
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After'] == '2'
+    # Closing the first stream frees its slot, even though it was never read
+    first.close()
+    assert client.get(url, headers=headers).status_code == 200
+
+def test_per_process_backends_need_one_worker():
+    config = {'CACHE_ENABLED': True, 'CACHE_BACKEND': 'local', 'EVENTS_ENABLED': True, 'EVENTS_BACKEND': 'memory'}
+    assert per_process_backends(config) == ['CACHE_BACKEND=local', 'EVENTS_BACKEND=memory']
+    assert per_process_backends(dict(config, CACHE_BACKEND='database', EVENTS_ENABLED=False)) == []
+
+def test_bulk_request_publishes_one_event_per_project(workers):
+    first, second, headers, project_id = workers
+    task = create_task(first, headers, project_id)
+    response = first.post('/api/tasks/bulk', headers=headers, json={'operations': [
+        {'op': 'create', 'project_id': project_id, 'title': 'one'},
+        {'op': 'create', 'project_id': project_id, 'title': 'two'},
+        {'op': 'update', 'id': task['id'], 'status': 'DONE'},
+    ]})
+    assert response.status_code == 200
+    created_ids = [result['id'] for result in response.get_json()['results'][:2]]
+
+    response = second.get(f'/api/events?projects={project_id}&timeout=0.1&last_event_id=0', headers=headers)
+    bulk = [data for _, kind, data in parse_stream(response)[0] if kind == 'task.bulk']
+    assert len(bulk) == 1
+    assert [data['id'] for data in bulk[0]['created']] == created_ids
+    assert bulk[0]['updated'] == [{'id': task['id'], 'project_id': project_id, 'status': 'DONE'}]
+    assert bulk[0]['deleted'] == []
+
+def test_events_commit_and_roll_back_with_the_change(make_app):
+    app = make_app(**EVENTS_CONFIG)
+    with app.app_context():
+        db.session.execute(select(ChangeEvent.id))
+        publish_event('team.deleted', {'id': 1}, team_ids=[1])
+        db.session.rollback()
+        assert db.session.scalar(select(func.count()).select_from(ChangeEvent)) == 0
+
+        db.session.execute(select(ChangeEvent.id))
+        publish_event('team.deleted', {'id': 2}, team_ids=[2])
+        publish_event('team.deleted', {'id': 3}, team_ids=[3])
+        db.session.commit()
+        rows = db.session.execute(select(ChangeEvent.type, ChangeEvent.channels)).all()
+        assert [tuple(row) for row in rows] == [('team.deleted', '["team:2"]'), ('team.deleted', '["team:3"]')]
+
+def test_database_backend_needs_sqlite():
+    app = Flask(__name__)
+    app.config.update(EVENTS_ENABLED=True, EVENTS_BACKEND='database',
+                      SQLALCHEMY_DATABASE_URI='postgresql://localhost/synergysphere')
+    with pytest.raises(RuntimeError, match='EVENTS_BACKEND=redis'):
+        init_events(app)
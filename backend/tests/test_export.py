@@ -0,0 +1,38 @@
+import gzip
+import json
+from conftest import create_project, create_task, create_team, register
+
+def setup_tasks(client, count=5):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    other_id = create_project(client, headers, create_team(client, headers, user_id, 'other'), 'other')
+    tasks = [create_task(client, headers, project_id, title=f'task {index}', status='DONE' if index % 2 else 'TO-DO')
+             for index in range(count)]
+    create_task(client, headers, other_id)
+    return headers, project_id, tasks
+
+def test_ndjson_export_streams_one_task_per_line(make_app):
+    client = make_app(EXPORT_BATCH_SIZE=2).test_client()
+    headers, project_id, tasks = setup_tasks(client)
+    response = client.get(f'/api/export/tasks?project_id={project_id}', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in rows] == [task['id'] for task in tasks]
+
+def test_json_export_with_gzip_filters_and_fields(client):
+    headers, project_id, tasks = setup_tasks(client)
+    response = client.get(f'/api/export/tasks?project_id={project_id}&status=DONE&fields=id,status&format=json'
+                          '&gzip=true', headers=headers)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    rows = json.loads(gzip.decompress(response.get_data()))
+    assert rows == [{'id': task['id'], 'status': 'DONE'} for task in tasks if task['status'] == 'DONE']
+
+def test_export_of_an_empty_selection_is_valid_json(client):
+    headers, project_id, _ = setup_tasks(client, 0)
+    assert client.get(f'/api/export/tasks?project_id={project_id}&format=json', headers=headers).get_json() == []
+
+def test_export_arguments_are_checked(client):
+    assert client.get('/api/export/tasks?format=csv').status_code == 400
+    assert client.get('/api/export/users').status_code == 404
+    assert client.get('/api/export/projects?fields=secret').status_code == 400
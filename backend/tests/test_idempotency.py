@@ -0,0 +1,86 @@
+import threading
+import time
+import pytest
+from sqlalchemy import func, select
+from app.api.coalescing import UpdateCoalescer
+from app.api.idempotency import PENDING, DatabaseStore
+from app.models.models import db, Task
+from conftest import create_project, create_team, login, register
+
+@pytest.fixture
+def workers(make_app):
+    # Two apps on one database, as two worker processes
+    return [make_app(IDEMPOTENCY_ENABLED=True).test_client() for _ in range(2)]
+
+def post_task(client, headers, project_id, key, title='task'):
+    return client.post(f'/api/projects/{project_id}/tasks', json={'title': title},
+                       headers=dict(headers, **{'Idempotency-Key': key}))
+
+def test_retry_on_another_worker_is_replayed(workers):
+    first, second = workers
+    user_id, headers = register(first)
+    team_id = create_team(first, headers, user_id)
+    project_id = create_project(first, headers, team_id)
+
+    created = post_task(first, headers, project_id, 'retry-1')
+    assert created.status_code == 201 and 'Idempotent-Replayed' not in created.headers
+    replayed = post_task(second, headers, project_id, 'retry-1')
+    assert replayed.status_code == 201 and replayed.headers['Idempotent-Replayed'] == 'true'
+    assert replayed.get_json() == created.get_json()
+    assert post_task(second, headers, project_id, 'retry-1', title='other').status_code == 422
+    with first.application.app_context():
+        assert db.session.scalar(select(func.count(Task.id))) == 1
+
+    # Keys are scoped to the caller
+    bob_id, _ = register(first, 'bob')
+    first.post(f'/api/teams/{team_id}/members', json={'user_id': bob_id}, headers=headers)
+    response = post_task(first, login(first, 'bob'), project_id, 'retry-1')
+    assert response.status_code == 201 and 'Idempotent-Replayed' not in response.headers
+
+def test_database_store_reservations(app):
+    store = DatabaseStore()
+    with app.app_context():
+        assert store.reserve('key', (PENDING, b'a'), 60) is None
+        assert store.reserve('key', (PENDING, b'b'), 60) == (PENDING, b'a')
+        done = (1, b'a', 201, b'{}', {'Content-Type': 'application/json'})
+        store.set('key', done, 60)
+        assert store.reserve('key', (PENDING, b'a'), 60) == done
+        store.delete('key')
+        # Expired records are taken over
+        assert store.reserve('key', (PENDING, b'a'), -1) is None
+        assert store.reserve('key', (PENDING, b'b'), 60) is None
+
+def test_concurrent_retry_gets_409(workers):
+    first, _ = workers
+    user_id, headers = register(first)
+    project_id = create_project(first, headers, create_team(first, headers, user_id))
+    store = first.application.extensions['idempotency']
+    original, retries = store.set, []
+
+    def set_after_retry(*args):
+        # The first attempt is still running when the retry arrives
+        retries.append(post_task(first, headers, project_id, 'slow'))
+        original(*args)
+
+    store.set = set_after_retry
+    assert post_task(first, headers, project_id, 'slow').status_code == 201
+    assert [response.status_code for response in retries] == [409]
+
+def test_coalescing_only_merges_one_callers_updates():
+    coalescer = UpdateCoalescer(window=0.2)
+    applied = []
+
+    def apply(changes):
+        applied.append(dict(changes))
+        return changes
+
+    threads = []
+    for key, changes in ((('task', 1, 1), {'title': 'a'}), (('task', 1, 1), {'status': 'DONE'}),
+                         (('task', 1, 2), {'title': 'b'})):
+        thread = threading.Thread(target=coalescer.submit, args=(key, changes, apply))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    assert sorted(applied, key=len) == [{'title': 'b'}, {'title': 'a', 'status': 'DONE'}]
@@ -0,0 +1,36 @@
+from app.metrics import Counter, Histogram
+from conftest import register
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency', 'Latency.', ('endpoint',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, endpoint='x')
+    lines = histogram.render()
+    assert 'latency_bucket{endpoint="x",le="0.1"} 1' in lines
+    assert 'latency_bucket{endpoint="x",le="1"} 2' in lines
+    assert 'latency_bucket{endpoint="x",le="+Inf"} 3' in lines
+    assert 'latency_count{endpoint="x"} 3' in lines
+    assert 'latency_sum{endpoint="x"} 5.55' in lines
+
+def test_counter_labels():
+    counter = Counter('requests_total', 'Requests.', ('method', 'status'))
+    counter.inc(method='GET', status=200)
+    counter.inc(2, method='GET', status=200)
+    assert counter.render()[-1] == 'requests_total{method="GET",status="200"} 3'
+
+def test_requests_are_recorded_and_exposed(make_app):
+    client = make_app(METRICS_ENABLED=True, SERVER_TIMING=True).test_client()
+    _, headers = register(client)
+    response = client.get('/api/projects', headers=headers)
+    assert response.headers['Server-Timing'].startswith('app;dur=')
+    assert 'queries"' in response.headers['Server-Timing']
+
+    metrics = client.get('/metrics')
+    assert metrics.mimetype == 'text/plain'
+    body = metrics.get_data(as_text=True)
+    assert 'http_requests_total{endpoint="projectresource",method="GET",status="200"}' in body
+    assert 'http_request_db_queries_count{endpoint="projectresource",method="GET"}' in body
+    assert '# TYPE db_query_duration_seconds histogram' in body
+
+def test_metrics_disabled(app):
+    assert app.test_client().get('/metrics').status_code == 404
@@ -0,0 +1,56 @@
+import shutil
+import sqlite3
+from pathlib import Path
+from sqlalchemy import create_engine, inspect
+from app.migrations import LATEST_VERSION, current_version, ensure_schema, upgrade
+from conftest import login
+
+# The database shipped before versioned migrations existed
+BASELINE_DB = Path(__file__).resolve().parent.parent / 'data' / 'app.db'
+
+def seed_baseline(path):
+    shutil.copyfile(BASELINE_DB, path)
+    with sqlite3.connect(path) as connection:
+        connection.execute("INSERT INTO user (id, email, password, name) VALUES (1, 'alice@example.com', "
+                           "'secret123', 'alice')")
+        connection.execute("INSERT INTO team (id, name, leader_id) VALUES (1, 'team', 1)")
+        connection.execute("INSERT INTO team_members (team_id, user_id) VALUES (1, 1)")
+        connection.execute("INSERT INTO project (id, name, description, created_at, team_id) "
+                           "VALUES (7, 'legacy', '', '2024-01-01 00:00:00', 1)")
+        connection.executemany("INSERT INTO task (id, title, description, status, created_at, project_id, assignee_id) "
+                               "VALUES (?, ?, '', ?, '2024-01-01 00:00:00', 7, 1)",
+                               [(10, 'legacy alpha', 'DONE'), (11, 'legacy beta', 'TO-DO')])
+
+def test_existing_database_is_upgraded_to_the_latest_version(tmp_path, make_app):
+    seed_baseline(tmp_path / 'app.db')
+    client = make_app().test_client()
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.connect() as connection:
+        assert current_version(connection) == LATEST_VERSION
+        tables = set(inspect(connection).get_table_names())
+        indexes = {index['name'] for index in inspect(connection).get_indexes('task')}
+    engine.dispose()
+    assert {'notification_outbox', 'task_stat', 'tombstone', 'id_sequence', 'activity', 'background_job',
+            'cache_tag', 'token_revocation', 'change_event', 'idempotency_record'} <= tables
+    assert 'ix_task_assignee_id_due_date_covering' in indexes
+
+    # Existing rows are served, counted by the backfilled statistics and found by search
+    headers = login(client)
+    assert [task['id'] for task in client.get('/api/projects/7/tasks', headers=headers).get_json()] == [10, 11]
+    assert client.get('/api/projects/7/stats', headers=headers).get_json()['total'] == 2
+    assert [hit['id'] for hit in client.get('/api/search?q=alpha', headers=headers).get_json()] == [10]
+    # New IDs continue after the existing ones
+    response = client.post('/api/projects/7/tasks', json={'title': 'new'}, headers=headers)
+    assert response.get_json()['id'] > 11
+
+def test_migrations_are_idempotent(tmp_path):
+    seed_baseline(tmp_path / 'app.db')
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    assert upgrade(engine) == LATEST_VERSION
+    with engine.begin() as connection:
+        # As if a crash had lost the version records after the migrations ran
+        connection.exec_driver_sql('DELETE FROM schema_version')
+    assert upgrade(engine) == LATEST_VERSION
+    assert ensure_schema(engine) == LATEST_VERSION
+    engine.dispose()
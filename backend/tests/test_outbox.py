@@ -0,0 +1,168 @@
+import socket
+from datetime import timedelta
+import pytest
+from app.api.notifications import send_email
+from app.api.outbox import OutboxWorker, SMTPConnection, retry_delay
+from app.models.models import db, NotificationOutbox, utcnow
+from app.startup import serve_background_services
+
+class FakeConnection:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, recipient, subject, body):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('connection refused')
+        self.sent.append((recipient, subject))
+
+    def close(self):
+        pass
+
+def queue(app, count=1):
+    with app.app_context():
+        for index in range(count):
+            send_email(f'user{index}@example.com', 'Subject', 'Body')
+        db.session.commit()
+
+def statuses(app):
+    with app.app_context():
+        return [(message.status, message.attempts) for message in NotificationOutbox.query.order_by('id')]
+
+def test_drain_sends_queued_messages_in_batches(make_app):
+    app = make_app(MAIL_ENABLED=True, OUTBOX_BATCH_SIZE=2)
+    queue(app, 3)
+    worker, connection = OutboxWorker(app), FakeConnection()
+    assert worker.drain_once(connection) == 2
+    assert worker.drain_once(connection) == 1
+    assert worker.drain_once(connection) == 0
+    assert [recipient for recipient, _ in connection.sent] == ['user0@example.com', 'user1@example.com',
+                                                               'user2@example.com']
+    assert statuses(app) == [('SENT', 1)] * 3
+
+def test_failed_message_is_retried_with_backoff_then_marked_failed(make_app):
+    app = make_app(MAIL_ENABLED=True, OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_BASE_SECONDS=30)
+    queue(app)
+    worker = OutboxWorker(app)
+    assert worker.drain_once(FakeConnection(failures=1)) == 1
+    assert statuses(app) == [('PENDING', 1)]
+    with app.app_context():
+        message = NotificationOutbox.query.one()
+        assert message.next_attempt_at > utcnow() + timedelta(seconds=25)
+        assert message.last_error == 'connection refused'
+        # Not due yet
+        assert worker.drain_once(FakeConnection()) == 0
+        message.next_attempt_at = utcnow()
+        db.session.commit()
+    assert worker.drain_once(FakeConnection(failures=1)) == 1
+    assert statuses(app) == [('FAILED', 2)]
+
+def test_message_stuck_in_sending_is_claimed_again_after_the_lease(make_app):
+    app = make_app(OUTBOX_LEASE_SECONDS=60)
+    queue(app)
+    with app.app_context():
+        message = NotificationOutbox.query.one()
+        message.status, message.claimed_at = 'SENDING', utcnow() - timedelta(seconds=120)
+        message.attempts = 1
+        db.session.commit()
+    assert OutboxWorker(app).drain_once(FakeConnection()) == 1
+    assert statuses(app) == [('SENT', 2)]
+
+def test_message_crashing_its_worker_is_marked_failed_at_the_cap(make_app):
+    app = make_app(MAIL_ENABLED=True, OUTBOX_LEASE_SECONDS=60, OUTBOX_MAX_ATTEMPTS=2)
+    queue(app)
+    with app.app_context():
+        message = NotificationOutbox.query.one()
+        # Claimed twice, and both workers died before recording the outcome
+        message.status, message.attempts = 'SENDING', 2
+        message.claimed_at = utcnow() - timedelta(seconds=120)
+        db.session.commit()
+    connection = FakeConnection()
+    assert OutboxWorker(app).drain_once(connection) == 1
+    assert connection.sent == []
+    assert statuses(app) == [('FAILED', 3)]
+
+def test_retry_delay_doubles_up_to_the_maximum():
+    assert [retry_delay(attempts, 30, 100) for attempts in (1, 2, 3, 4)] == [30, 60, 100, 100]
+
+def test_create_app_does_not_start_background_services(make_app):
+    app = make_app(OUTBOX_WORKERS=1, OUTBOX_POLL_INTERVAL=0.01)
+    assert 'outbox_worker' not in app.extensions
+    serve_background_services(app)
+    try:
+        assert len(app.extensions['outbox_worker'].threads) == 1
+    finally:
+        app.extensions['outbox_worker'].stop()
+
+class RecordingHandler:
+    """
+    aiosmtpd handler keeping the recipients and client address of each message
+    """
+
+    def __init__(self):
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.append((envelope.rcpt_tos[0], session.peer))
+        return '250 OK'
+
+def authenticate(server, session, envelope, mechanism, auth_data):
+    from aiosmtpd.smtp import AuthResult
+    return AuthResult(success=(auth_data.login, auth_data.password) == (b'outbox', b'secret'))
+
+class SMTPServer:
+    """
+    Local SMTP server on a fixed port; start() replaces the running one,
+    dropping its connections
+    """
+
+    def __init__(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        self.controller = None
+
+    def start(self):
+        from aiosmtpd.controller import Controller
+        self.stop()
+        self.controller = Controller(RecordingHandler(), hostname='127.0.0.1', port=self.port,
+                                     authenticator=authenticate, auth_require_tls=False)
+        self.controller.start()
+        return self.controller.handler
+
+    def stop(self):
+        if self.controller is not None:
+            self.controller.stop()
+            self.controller = None
+
+@pytest.fixture
+def smtp_server():
+    # aiosmtpd is in requirements-dev.txt; without it the test fails rather than skipping the SMTP path
+    server = SMTPServer()
+    yield server
+    server.stop()
+
+def test_smtp_connection_sends_batches_and_reconnects(make_app, smtp_server):
+    first = smtp_server.start()
+    app = make_app(MAIL_ENABLED=True, OUTBOX_BATCH_SIZE=2, SMTP_HOST='127.0.0.1', SMTP_PORT=smtp_server.port,
+                   SMTP_USE_TLS=False, SMTP_USERNAME='outbox', SMTP_PASSWORD='secret',
+                   MAIL_DEFAULT_SENDER='noreply@example.com')
+    worker, connection = OutboxWorker(app), SMTPConnection(app.config)
+    queue(app, 3)
+    try:
+        assert worker.drain_once(connection) == 2
+        assert worker.drain_once(connection) == 1
+        # Every message went over the one connection
+        assert [recipient for recipient, _ in first.received] == [
+            'user0@example.com', 'user1@example.com', 'user2@example.com']
+        assert len({peer for _, peer in first.received}) == 1
+
+        # The server goes away and comes back: the next message reconnects and is sent once
+        second = smtp_server.start()
+        queue(app, 1)
+        assert worker.drain_once(connection) == 1
+        assert [recipient for recipient, _ in second.received] == ['user0@example.com']
+        assert statuses(app) == [('SENT', 1)] * 4
+    finally:
+        connection.close()
@@ -0,0 +1,68 @@
+from app.api.pagination import encode_cursor
+from conftest import create_project, create_task, create_team, register
+
+def pages(client, url, headers):
+    items, cursor = [], None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''), headers=headers)
+        assert response.status_code == 200, response.get_json()
+        items += response.get_json()
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return items
+
+def test_cursor_walks_every_task_once(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    created = [create_task(client, headers, project_id, title=f'task {index}')['id'] for index in range(7)]
+    items = pages(client, f'/api/projects/{project_id}/tasks?limit=3', headers)
+    assert [item['id'] for item in items] == created
+
+def test_sort_by_created_at_follows_creation_order(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    tasks = [create_task(client, headers, project_id) for _ in range(4)]
+    # Each row gets its own timestamp, not the one of the first import
+    assert len({task['created_at'] for task in tasks}) == 4
+    items = pages(client, f'/api/projects/{project_id}/tasks?limit=3&sort=created_at', headers)
+    assert [item['id'] for item in items] == [task['id'] for task in tasks]
+
+def test_limit_is_capped_and_fields_are_projected(make_app):
+    client = make_app(PAGE_SIZE_MAX=2).test_client()
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    for _ in range(3):
+        create_task(client, headers, project_id)
+    response = client.get(f'/api/projects/{project_id}/tasks?limit=50&fields=id,title', headers=headers)
+    assert len(response.get_json()) == 2
+    assert set(response.get_json()[0]) == {'id', 'title'}
+    assert response.headers['X-Next-Cursor']
+
+def test_filters(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    create_task(client, headers, project_id, status='DONE', assignee_id=user_id)
+    create_task(client, headers, project_id, status='TO-DO')
+    url = f'/api/projects/{project_id}/tasks'
+    assert [task['status'] for task in client.get(url + '?status=DONE', headers=headers).get_json()] == ['DONE']
+    assert len(client.get(url + '?assignee_id=none', headers=headers).get_json()) == 1
+
+def test_invalid_arguments_are_rejected(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    url = f'/api/projects/{project_id}/tasks'
+    for query in ('limit=0', 'limit=x', 'cursor=garbage', 'sort=title', 'fields=password'):
+        assert client.get(f'{url}?{query}', headers=headers).status_code == 400, query
+
+def test_cursor_values_are_type_checked(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    cursors = [{'id': None}, {'id': [1]}, {'id': 'abc'}, {'id': True}, {'id': 1, 'created_at': 5},
+               {'id': 1, 'created_at': 'yesterday'}]
+    for url in ('/api/projects', f'/api/projects/{project_id}/tasks'):
+        for values in cursors:
+            response = client.get(url, query_string={'cursor': encode_cursor(values), 'sort': 'created_at'},
+                                  headers=headers)
+            assert response.status_code == 400, (url, values)
+        assert client.get(url, query_string={'cursor': encode_cursor({'id': 'abc'})},
+                          headers=headers).status_code == 400
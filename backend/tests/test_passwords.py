@@ -0,0 +1,77 @@
+import threading
+import pytest
+from sqlalchemy import select, update
+from app.models.models import db, User
+from app.passwords import PasswordHasher, PasswordHasherBusy, hash_rounds
+from conftest import login, register
+
+def stored_password(app, email='alice@example.com'):
+    with app.app_context():
+        return db.session.scalar(select(User.password).where(User.email == email))
+
+def set_password(app, value, email='alice@example.com'):
+    with app.app_context():
+        db.session.execute(update(User).where(User.email == email).values(password=value))
+        db.session.commit()
+
+def test_registration_stores_a_bcrypt_hash(app):
+    register(app.test_client())
+    stored = stored_password(app)
+    assert stored != 'secret123'
+    assert hash_rounds(stored) == 4
+
+def test_login_rehashes_plain_and_outdated_passwords(app):
+    client = app.test_client()
+    register(client)
+    # Rows from before passwords were hashed
+    set_password(app, 'secret123')
+    login(client)
+    assert hash_rounds(stored_password(app)) == 4
+
+    set_password(app, PasswordHasher(rounds=5).hash('secret123'))
+    login(client)
+    assert hash_rounds(stored_password(app)) == 4
+
+def test_wrong_and_unknown_credentials(app):
+    client = app.test_client()
+    register(client)
+    for email in ('alice@example.com', 'nobody@example.com'):
+        response = client.post('/api/login', json={'email': email, 'password': 'wrong'})
+        assert response.status_code == 401
+
+def test_full_pool_is_busy():
+    hasher = PasswordHasher(rounds=4, workers=1, queue_size=0, timeout=0.01)
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    thread = threading.Thread(target=hasher.run, args=(block,))
+    thread.start()
+    started.wait()
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('secret123')
+    finally:
+        release.set()
+        thread.join()
+    assert hasher.verify(hasher.hash('secret123'), 'secret123') == (True, False)
+    hasher.shutdown()
+
+def test_busy_login_gets_503(app):
+    client = app.test_client()
+    register(client)
+    hasher = app.extensions['password_hasher']
+    hasher.timeout = 0.01
+    # Take every slot
+    slots = 0
+    while hasher.slots.acquire(blocking=False):
+        slots += 1
+    try:
+        response = client.post('/api/login', json={'email': 'alice@example.com', 'password': 'secret123'})
+    finally:
+        for _ in range(slots):
+            hasher.slots.release()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from app.api.reminders import pending_select, reminder_window, send_due_reminders
+from app.models.models import db, NotificationOutbox, ReminderLog, utcnow
+from conftest import create_project, create_task, create_team, register
+
+def reminders(app):
+    with app.app_context():
+        return [(message.recipient, message.subject, message.body) for message in
+                NotificationOutbox.query.filter(NotificationOutbox.subject.startswith('Task Reminder'))
+                .order_by(NotificationOutbox.id)]
+
+def test_digests_span_pages(make_app):
+    app = make_app(REMINDER_BATCH_SIZE=2, REMINDER_MAX_TASKS_PER_EMAIL=2)
+    client = app.test_client()
+    alice_id, headers = register(client, 'alice')
+    bob_id, _ = register(client, 'bob')
+    team_id = create_team(client, headers, alice_id)
+    client.post(f'/api/teams/{team_id}/members', json={'user_id': bob_id}, headers=headers)
+    project_id = create_project(client, headers, team_id)
+    now = utcnow()
+    for hours, assignee_id in ((1, alice_id), (2, alice_id), (3, alice_id), (4, bob_id), (-2, bob_id)):
+        create_task(client, headers, project_id, title=f'due in {hours}h', assignee_id=assignee_id,
+                    due_date=(now + timedelta(hours=hours)).isoformat())
+    # Outside the window, and done
+    create_task(client, headers, project_id, assignee_id=alice_id, due_date=(now + timedelta(days=3)).isoformat())
+    create_task(client, headers, project_id, assignee_id=alice_id, status='DONE',
+                due_date=(now + timedelta(hours=1)).isoformat())
+
+    with app.app_context():
+        assert send_due_reminders(app.config, now) == {'assignees': 2, 'emails': 2, 'tasks': 5}
+        assert ReminderLog.query.count() == 5
+    sent = reminders(app)
+    assert [(recipient, subject) for recipient, subject, _ in sent] == [
+        ('alice@example.com', 'Task Reminder (3)'), ('bob@example.com', 'Task Reminder (2)')
+    ]
+    assert 'due in 1h' in sent[0][2] and 'due in 3h' not in sent[0][2] and '... and 1 more.' in sent[0][2]
+    assert 'Overdue:' in sent[1][2] and 'due in -2h' in sent[1][2]
+
+    # Each task is reminded about once per kind
+    with app.app_context():
+        assert send_due_reminders(app.config, now)['emails'] == 0
+        assert send_due_reminders(app.config, now + timedelta(hours=2))['tasks'] == 1
+        db.session.remove()
+    assert reminders(app)[-1][1] == 'Task Reminder (1)'
+
+def test_pages_seek_the_covering_index(make_app):
+    app = make_app()
+    now = utcnow()
+    start, end = reminder_window(now, 24, 7)
+    with app.app_context():
+        for after in (None, (1, now, 1)):
+            compiled = pending_select(start, end, now, after).limit(500).compile(db.engine)
+            # The plan does not depend on the values
+            params = (None,) * len(compiled.positiontup)
+            plan = ' | '.join(row[3] for row in db.session.connection().exec_driver_sql(
+                f'EXPLAIN QUERY PLAN {compiled}', params))
+            assert 'USING COVERING INDEX ix_task_assignee_id_due_date_covering' in plan
+            assert 'TEMP B-TREE' not in plan
@@ -0,0 +1,62 @@
+from app.api.search import match_expression
+from conftest import create_project, create_task, create_team, register
+
+def search(client, headers, **args):
+    response = client.get('/api/search', query_string=args, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response
+
+def ids(response):
+    return [item['id'] for item in response.get_json()]
+
+def test_match_expression_quotes_user_input():
+    assert match_expression('deploy "prod" OR x*', ('title',)) == \
+        '{title} : ("deploy" AND "prod" AND "OR" AND "x"*)'
+    assert match_expression('a', ('name',), ['t1', 't2']) == '{name} : ("a") AND scope : ("t1" OR "t2")'
+
+def test_search_tasks_and_projects(client):
+    user_id, headers = register(client)
+    team_id = create_team(client, headers, user_id)
+    first = create_project(client, headers, team_id, 'Website launch')
+    second = create_project(client, headers, team_id, 'Mobile app')
+    title = create_task(client, headers, first, title='Deploy website', status='DONE')
+    described = create_task(client, headers, second, title='Release', description='deploy to the store')
+    create_task(client, headers, second, title='Unrelated')
+
+    # Titles weigh more than descriptions
+    assert ids(search(client, headers, q='deploy')) == [title['id'], described['id']]
+    assert ids(search(client, headers, q='depl*', project_id=second)) == [described['id']]
+    assert ids(search(client, headers, q='deploy', team_id=team_id, status='DONE')) == [title['id']]
+    assert ids(search(client, headers, q='deploy', sort='recent')) == [described['id'], title['id']]
+    assert ids(search(client, headers, q='website', type='projects')) == [first]
+
+    # Index kept in sync with updates and deletes
+    client.put(f"/api/tasks/{title['id']}", json={'title': 'Ship website'}, headers=headers)
+    client.delete(f"/api/tasks/{described['id']}", headers=headers)
+    assert ids(search(client, headers, q='deploy')) == []
+    assert ids(search(client, headers, q='ship')) == [title['id']]
+
+def test_search_pages_by_rank(client):
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    created = [create_task(client, headers, project_id, title=f'report {"report " * index}')['id']
+               for index in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        args = {'q': 'report', 'limit': 2}
+        if cursor:
+            args['cursor'] = cursor
+        response = search(client, headers, **args)
+        seen += ids(response)
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(created)
+    assert len(seen) == len(set(seen))
+
+def test_search_argument_errors(client):
+    _, headers = register(client)
+    for args in ({'q': '***'}, {'q': 'x', 'type': 'users'}, {'q': 'x', 'sort': 'oldest'},
+                 {'q': 'x', 'project_id': 'abc'}):
+        assert client.get('/api/search', query_string=args, headers=headers).status_code == 400, args
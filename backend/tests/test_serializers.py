@@ -0,0 +1,40 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+from app.api import serializers
+from app.api.serializers import dumps, task_schema
+from app.models.models import Task
+
+DUE = datetime(2025, 5, 1, 12, 30)
+
+def test_schema_dumps_rows_and_instances_alike():
+    fields = ('id', 'title', 'due_date', 'created_at')
+    task = Task(id=1, title='Write', due_date=DUE, created_at=None)
+    assert task_schema.dump(task, fields) == task_schema.dump_row((1, 'Write', DUE, None, 'extra'), fields) == {
+        'id': 1, 'title': 'Write', 'due_date': '2025-05-01T12:30:00', 'created_at': None
+    }
+    # Compiled once per field list
+    assert task_schema.compile(fields) is task_schema.compile(list(fields))
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_with_and_without_orjson(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serializers, 'orjson', None)
+    elif serializers.orjson is None:
+        pytest.skip('orjson is not installed')
+    data = {'b': [DUE, date(2025, 5, 2)], 'a': {'y': Decimal('3'), 'x': Decimal('1.5')}}
+    encoded = dumps(data, sort_keys=True)
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded) == {'a': {'y': 3, 'x': 1.5}, 'b': ['2025-05-01T12:30:00', '2025-05-02']}
+    assert encoded.index(b'"a"') < encoded.index(b'"b"') and encoded.index(b'"x"') < encoded.index(b'"y"')
+    # Integer keys, e.g. statistics by assignee
+    assert json.loads(dumps({1: 2})) == {'1': 2}
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+def test_responses_are_compact_json(client):
+    response = client.post('/api/register', json={'name': 'alice', 'email': 'alice@example.com',
+                                                  'password': 'secret123'})
+    assert response.content_type == 'application/json'
+    assert b': ' not in response.data and b', ' not in response.data
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import select
+from app.migrations import ensure_schema
+from app.models.models import db, Project, Task, User
+from app.routing import ShardNotSelected, shard_rows, use_shard
+from conftest import create_project, create_task, create_team, register
+
+def shard_projects(app, shard):
+    with app.app_context(), use_shard(shard):
+        return db.session.scalars(select(Project.id).order_by(Project.id)).all()
+
+@pytest.fixture
+def sharded_client(make_app):
+    app = make_app(shards=2)
+    return app, app.test_client()
+
+def test_projects_and_tasks_live_in_their_teams_shard(sharded_client):
+    app, client = sharded_client
+    user_id, headers = register(client)
+    first = create_team(client, headers, user_id, 'first')
+    second = create_team(client, headers, user_id, 'second')
+    projects = {team_id: create_project(client, headers, team_id) for team_id in (first, second)}
+    tasks = {team_id: create_task(client, headers, project_id, assignee_id=user_id)['id']
+             for team_id, project_id in projects.items()}
+
+    for team_id, project_id in projects.items():
+        shard = team_id % 2
+        assert project_id % 2 == shard and tasks[team_id] % 2 == shard
+        assert shard_projects(app, shard) == [project_id]
+        response = client.get(f'/api/tasks/{tasks[team_id]}', headers=headers)
+        assert response.status_code == 200 and response.get_json()['project_id'] == project_id
+
+    # Lists of several teams read every shard and merge the pages in order
+    groups = client.get(f'/api/users/{user_id}/tasks', headers=headers).get_json()
+    assert sorted(task['id'] for group in groups for task in group['tasks']) == sorted(tasks.values())
+    assert {group['team_name'] for group in groups} == {'first', 'second'}
+    assert client.get(f'/api/users/{user_id}/stats', headers=headers).get_json()['total'] == 2
+
+def test_statements_need_a_shard(sharded_client):
+    app, _ = sharded_client
+    with app.app_context():
+        with pytest.raises(ShardNotSelected):
+            db.session.execute(select(Task.id)).all()
+        # Users are in the primary database
+        assert db.session.execute(select(User.id)).all() == []
+
+def test_shard_rows_only_reads_sharded_tables(sharded_client):
+    app, _ = sharded_client
+    with app.app_context():
+        assert shard_rows(select(Task.id).join(Project, Project.id == Task.project_id)) == []
+        with pytest.raises(AssertionError, match='user'):
+            shard_rows(select(Task.id).join(User, User.id == Task.assignee_id))
+
+def test_reads_stick_to_the_primary_for_the_writing_client_only(make_app, tmp_path):
+    # The replica is never updated here, so a read shows where it was routed
+    app = make_app(SQLALCHEMY_REPLICA_URIS=[f'sqlite:///{tmp_path}/replica.db'], DATABASE_REPLICA_STICKY_SECONDS=60)
+    with app.app_context():
+        ensure_schema(db.engines['replica-0'])
+    writer = app.test_client()
+    user_id, headers = register(writer)
+    project_id = create_project(writer, headers, create_team(writer, headers, user_id))
+
+    # By its cookie, and by its token's subject on a client without cookies
+    for client in (writer, app.test_client()):
+        projects = client.get('/api/projects', headers=headers).get_json()
+        assert [project['id'] for project in projects] == [project_id]
+    assert app.test_client().get('/api/projects').get_json() == []
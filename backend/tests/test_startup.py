@@ -0,0 +1,43 @@
+import os
+from flask import Flask
+from app.docs import init_swagger_ui
+from app.metrics import STARTUP_SECONDS
+from app.migrations import LATEST_VERSION, ensure_schema
+from app.models.models import db
+from app.startup import per_process_backends, serve_background_services
+
+def test_current_schema_skips_create_all(app, monkeypatch):
+    def create_all(*args, **kwargs):
+        raise AssertionError('create_all() ran on a current database')
+
+    monkeypatch.setattr(db.metadata, 'create_all', create_all)
+    with app.app_context():
+        assert ensure_schema() == LATEST_VERSION
+    assert STARTUP_SECONDS.has(stage='schema')
+
+def test_lazy_startup_starts_background_services_on_first_request(make_app):
+    app = make_app(LAZY_STARTUP=True)
+    serve_background_services(app)
+    assert 'background_services' not in app.extensions
+    app.test_client().get('/api/me')
+    assert app.extensions['background_services'] == os.getpid()
+
+def test_warm_up(make_app):
+    app = make_app(WARM_UP=True)
+    # Computed by warm_up(), not on the first login
+    assert app.extensions['password_hasher']._dummy_hash is not None
+    assert STARTUP_SECONDS.has(stage='warm_up') and STARTUP_SECONDS.has(stage='create_app')
+    assert make_app().extensions['password_hasher']._dummy_hash is None
+
+def test_lazy_swagger_ui():
+    app = Flask(__name__)
+    app.config['LAZY_STARTUP'] = True
+    init_swagger_ui(app, '/docs', '/static/openapi.yaml')
+    assert not app.blueprints
+    response = app.test_client().get('/docs/')
+    assert response.status_code == 200 and b'swagger' in response.data.lower()
+
+def test_per_process_backends():
+    assert per_process_backends({'CACHE_ENABLED': True, 'CACHE_BACKEND': 'local', 'EVENTS_ENABLED': False,
+                                 'EVENTS_BACKEND': 'memory'}) == ['CACHE_BACKEND=local']
+    assert per_process_backends({'CACHE_ENABLED': True, 'CACHE_BACKEND': 'database'}) == []
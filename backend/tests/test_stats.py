@@ -0,0 +1,47 @@
+from sqlalchemy import select
+from app.api.stats import rebuild_stats
+from app.models.models import db, TaskDueStat, TaskStat
+from conftest import create_project, create_task, create_team, register
+
+def stat_rows(app):
+    with app.app_context():
+        return (sorted(db.session.execute(select(TaskStat.__table__)).all()),
+                sorted(db.session.execute(select(TaskDueStat.__table__)).all()))
+
+def test_summary_tables_follow_task_changes(app):
+    client = app.test_client()
+    user_id, headers = register(client)
+    project_id = create_project(client, headers, create_team(client, headers, user_id))
+    overdue = create_task(client, headers, project_id, assignee_id=user_id, due_date='2020-01-01T00:00:00')
+    done = create_task(client, headers, project_id, assignee_id=user_id, due_date='2020-01-02T00:00:00')
+    removed = create_task(client, headers, project_id)
+    create_task(client, headers, project_id, due_date='2999-01-01T00:00:00')
+
+    client.put(f"/api/tasks/{done['id']}", json={'status': 'DONE'}, headers=headers)
+    client.delete(f"/api/tasks/{removed['id']}", headers=headers)
+    client.post('/api/tasks/bulk', json={'operations': [
+        {'op': 'create', 'project_id': project_id, 'title': 'bulk', 'status': 'IN_PROGRESS'},
+        {'op': 'update', 'id': overdue['id'], 'assignee_id': None},
+    ]}, headers=headers)
+
+    stats = client.get(f'/api/projects/{project_id}/stats', headers=headers).get_json()
+    assert (stats['total'], stats['overdue']) == (4, 1)
+    assert stats['by_status'] == {'TO-DO': 2, 'IN_PROGRESS': 1, 'DONE': 1}
+    by_assignee = {entry['assignee_id']: entry for entry in stats['by_assignee']}
+    assert by_assignee[user_id]['by_status'] == {'DONE': 1}
+    assert (by_assignee[None]['total'], by_assignee[None]['overdue']) == (3, 1)
+
+    user = client.get(f'/api/users/{user_id}/stats', headers=headers).get_json()
+    assert (user['total'], user['overdue'], user['by_project'][0]['project_id']) == (1, 0, project_id)
+
+    # The incremental upserts agree with a rebuild from the task table
+    incremental = [[row for row in rows if row[-1]] for rows in stat_rows(app)]
+    with app.app_context():
+        with db.engine.begin() as connection:
+            assert rebuild_stats(connection) == 4
+    assert incremental == list(stat_rows(app))
+
+def test_stats_of_unknown_rows(client):
+    _, headers = register(client)
+    assert client.get('/api/projects/99/stats', headers=headers).status_code == 404
+    assert client.get('/api/users/99/stats', headers=headers).status_code == 404
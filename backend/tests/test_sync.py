@@ -0,0 +1,60 @@
+from sqlalchemy import update
+from app.models.models import db, Project, Task, Team
+from conftest import create_project, create_task, create_team, register
+
+def sync(client, headers, **args):
+    response = client.get('/api/sync', query_string=args, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+def test_delta_after_writes_and_deletes(client):
+    user_id, headers = register(client)
+    team_id = create_team(client, headers, user_id)
+    project_id = create_project(client, headers, team_id)
+    kept = create_task(client, headers, project_id, title='kept')
+    dropped = create_task(client, headers, project_id, title='dropped')
+
+    full = sync(client, headers)
+    assert full['reset'] is False and full['has_more'] is False
+    assert [team['id'] for team in full['teams']] == [team_id]
+    assert [project['id'] for project in full['projects']] == [project_id]
+    assert {task['id'] for task in full['tasks']} == {kept['id'], dropped['id']}
+
+    client.put(f"/api/tasks/{kept['id']}", json={'title': 'renamed'}, headers=headers)
+    client.delete(f"/api/tasks/{dropped['id']}", headers=headers)
+    delta = sync(client, headers, since=full['revision'])
+    assert [(task['id'], task['title']) for task in delta['tasks']] == [(kept['id'], 'renamed')]
+    assert delta['deleted'] == {'projects': [], 'tasks': [dropped['id']]}
+    assert delta['projects'] == [] and delta['teams'] == []
+    assert sync(client, headers, since=delta['revision'])['tasks'] == []
+
+def test_legacy_revision_is_paged_by_cursor(make_app):
+    app = make_app(SYNC_MAX_TASKS=2)
+    client = app.test_client()
+    user_id, headers = register(client)
+    team_id = create_team(client, headers, user_id)
+    project_id = create_project(client, headers, team_id)
+    created = [create_task(client, headers, project_id, title=f'task {index}')['id'] for index in range(5)]
+    with app.app_context():
+        # Rows of a database from before delta sync
+        for model in (Team, Project, Task):
+            db.session.execute(update(model).values(revision=0))
+        db.session.commit()
+
+    pages = [sync(client, headers)]
+    while pages[-1]['cursor']:
+        pages.append(sync(client, headers, cursor=pages[-1]['cursor']))
+
+    assert [len(page['tasks']) for page in pages] == [2, 2, 1]
+    assert [task['id'] for page in pages for task in page['tasks']] == created
+    assert all(page['has_more'] for page in pages[:-1]) and not pages[-1]['has_more']
+    # Projects and teams come with the page completing the revision
+    assert all(page['projects'] == [] and page['teams'] == [] for page in pages[:-1])
+    assert [project['id'] for project in pages[-1]['projects']] == [project_id]
+    assert sync(client, headers, since=pages[-1]['revision'])['tasks'] == []
+
+def test_invalid_cursor(client):
+    _, headers = register(client)
+    for cursor in ('nope', 'eyJpZCI6MX0'):
+        response = client.get('/api/sync', query_string={'cursor': cursor}, headers=headers)
+        assert response.status_code == 400
@@ -0,0 +1,7 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app    (Linux / Docker)
+    python serve.py                          (waitress, also works on Windows)
+"""
+from run import app
@@ -1,4 +1,5 @@
 import axios from 'axios'
+import { getPage } from './pagination'
 
 const API_URL = 'http://localhost:5000/api'
 
@@ -18,8 +19,8 @@ const apiService = {
     },
 
     // Projects
-    getProjects() {
-        return axios.get('/projects')
+    getProjects(cursor = null) {
+        return getPage('/projects', {}, cursor)
     },
     getProject(id) {
         return axios.get(`/projects/${id}`)
@@ -35,8 +36,8 @@ const apiService = {
     },
 
     // Tasks
-    getProjectTasks(projectId) {
-        return axios.get(`/projects/${projectId}/tasks`)
+    getProjectTasks(projectId, cursor = null) {
+        return getPage(`/projects/${projectId}/tasks`, {}, cursor)
     },
     getTask(id) {
         return axios.get(`/tasks/${id}`)
@@ -52,8 +53,8 @@ const apiService = {
     },
 
     // Teams
-    getTeams() {
-        return axios.get('/teams')
+    getTeams(cursor = null) {
+        return getPage('/teams', {}, cursor)
     },
     getTeam(id) {
         return axios.get(`/teams/${id}`)
@@ -0,0 +1,11 @@
+import axios from 'axios'
+
+// List endpoints return one page at a time (PAGE_SIZE_DEFAULT rows), with the
+// cursor of the next one in the X-Next-Cursor header; fetch the page at
+// `cursor` (the first one without it) and return its rows and the next cursor,
+// null after the last page
+export async function getPage(url, params = {}, cursor = null) {
+    const pageParams = cursor ? { ...params, cursor } : params
+    const response = await axios.get(url, { params: pageParams })
+    return { data: response.data, nextCursor: response.headers['x-next-cursor'] || null }
+}
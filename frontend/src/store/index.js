@@ -1,25 +1,40 @@
 import { createStore } from 'vuex'
 import axios from 'axios'
+import { getPage } from '../services/pagination'
 
 // API Base URL
 const API_URL = 'http://localhost:5000/api'
 
+// /users/<id>/tasks returns the tasks grouped by project; keep them as one list,
+// each task with its project's name
+function flattenGroups(groups) {
+    return groups.flatMap(group => group.tasks.map(task => ({ ...task, project_name: group.project_name })))
+}
+
 export default createStore({
     state: {
         user: JSON.parse(localStorage.getItem('user')) || null,
         projects: [],
         tasks: [],
-        teams: []
+        teams: [],
+        // Cursors of the next page of each list, null when it is complete
+        projectsCursor: null,
+        tasksCursor: null,
+        // The list the loaded tasks are a page of
+        tasksUrl: null,
+        // The user's tasks across all projects, with their project's name
+        myTasks: [],
+        myTasksCursor: null
     },
     getters: {
         isAuthenticated: state => !!state.user,
         getUserId: state => state.user ? state.user.id : null,
         getProjects: state => state.projects,
         getTasks: state => state.tasks,
-        getMyTasks: state => {
-            if (!state.user) return []
-            return state.tasks.filter(task => task.assignee_id === state.user.id)
-        }
+        hasMoreProjects: state => !!state.projectsCursor,
+        hasMoreTasks: state => !!state.tasksCursor,
+        getMyTasks: state => state.myTasks,
+        hasMoreMyTasks: state => !!state.myTasksCursor
     },
     mutations: {
         setUser(state, user) {
@@ -33,9 +48,22 @@ export default createStore({
         setProjects(state, projects) {
             state.projects = projects
         },
+        appendProjects(state, projects) {
+            state.projects = [...state.projects, ...projects]
+        },
+        setProjectsCursor(state, cursor) {
+            state.projectsCursor = cursor
+        },
         setTasks(state, tasks) {
             state.tasks = tasks
         },
+        appendTasks(state, tasks) {
+            state.tasks = [...state.tasks, ...tasks]
+        },
+        setTasksPage(state, { url, cursor }) {
+            state.tasksUrl = url
+            state.tasksCursor = cursor
+        },
         addProject(state, project) {
             state.projects.push(project)
         },
@@ -56,6 +84,19 @@ export default createStore({
             if (index !== -1) {
                 state.tasks.splice(index, 1, updatedTask)
             }
+            const myIndex = state.myTasks.findIndex(t => t.id === updatedTask.id)
+            if (myIndex !== -1) {
+                state.myTasks.splice(myIndex, 1, { ...state.myTasks[myIndex], ...updatedTask })
+            }
+        },
+        setMyTasks(state, tasks) {
+            state.myTasks = tasks
+        },
+        appendMyTasks(state, tasks) {
+            state.myTasks = [...state.myTasks, ...tasks]
+        },
+        setMyTasksCursor(state, cursor) {
+            state.myTasksCursor = cursor
         },
         deleteTask(state, taskId) {
             state.tasks = state.tasks.filter(t => t.id !== taskId)
@@ -94,11 +135,24 @@ export default createStore({
         },
 
         // Project actions
+        // Loads the first page; fetchMoreProjects appends the next one
         async fetchProjects({ commit }) {
             try {
-                const response = await axios.get(`${API_URL}/projects`)
-                commit('setProjects', response.data)
-                return response.data
+                const page = await getPage(`${API_URL}/projects`)
+                commit('setProjects', page.data)
+                commit('setProjectsCursor', page.nextCursor)
+                return page.data
+            } catch (error) {
+                throw error
+            }
+        },
+        async fetchMoreProjects({ commit, state }) {
+            if (!state.projectsCursor) return []
+            try {
+                const page = await getPage(`${API_URL}/projects`, {}, state.projectsCursor)
+                commit('appendProjects', page.data)
+                commit('setProjectsCursor', page.nextCursor)
+                return page.data
             } catch (error) {
                 throw error
             }
@@ -131,10 +185,58 @@ export default createStore({
         },
 
         // Task actions
-        async fetchProjectTasks({ commit }, projectId) {
+        // fetchProjectTasks loads the first page; fetchMoreTasks appends the next one
+        async fetchProjectTasks({ dispatch }, projectId) {
+            return dispatch('fetchTaskList', `${API_URL}/projects/${projectId}/tasks`)
+        },
+        async fetchTaskList({ commit }, url) {
+            try {
+                const page = await getPage(url)
+                commit('setTasks', page.data)
+                commit('setTasksPage', { url, cursor: page.nextCursor })
+                return page.data
+            } catch (error) {
+                throw error
+            }
+        },
+        async fetchMoreTasks({ commit, state }) {
+            if (!state.tasksCursor) return []
+            try {
+                const page = await getPage(state.tasksUrl, {}, state.tasksCursor)
+                commit('appendTasks', page.data)
+                commit('setTasksPage', { url: state.tasksUrl, cursor: page.nextCursor })
+                return page.data
+            } catch (error) {
+                throw error
+            }
+        },
+        // fetchMyTasks loads the first page; fetchMoreMyTasks appends the next one
+        async fetchMyTasks({ commit, state }) {
+            try {
+                const page = await getPage(`${API_URL}/users/${state.user.id}/tasks`)
+                const tasks = flattenGroups(page.data)
+                commit('setMyTasks', tasks)
+                commit('setMyTasksCursor', page.nextCursor)
+                return tasks
+            } catch (error) {
+                throw error
+            }
+        },
+        async fetchMoreMyTasks({ commit, state }) {
+            if (!state.myTasksCursor) return []
+            try {
+                const page = await getPage(`${API_URL}/users/${state.user.id}/tasks`, {}, state.myTasksCursor)
+                const tasks = flattenGroups(page.data)
+                commit('appendMyTasks', tasks)
+                commit('setMyTasksCursor', page.nextCursor)
+                return tasks
+            } catch (error) {
+                throw error
+            }
+        },
+        async fetchTask(_, id) {
             try {
-                const response = await axios.get(`${API_URL}/projects/${projectId}/tasks`)
-                commit('setTasks', response.data)
+                const response = await axios.get(`${API_URL}/tasks/${id}`)
                 return response.data
             } catch (error) {
                 throw error